@@ -1,6 +1,7 @@
 import numpy as np
 import logging
-from core.frame_selection import compute_elbow_angle
+from utils.angle_utils import elbow_angle_array, vector_angles
+from utils.keypoint_sequence import KeypointSequence
 
 logging.basicConfig(level=logging.INFO)
 
@@ -25,8 +26,16 @@ def analyze_biomechanics(keypoints, key_frames, config=None, pitch_ref=None):
         results["metrics"][f"{frame_type}_elbow_angle"] = 0.0
         results["metrics"][f"{frame_type}_shoulder_angle"] = 0.0
     
+    # Elbow angles for all key frames in one kernel call
+    seq = KeypointSequence.from_frames(keypoints)
+    frame_indices = np.array([key_frames.get(f, 0) for f in ["bfc_frame", "ffc_frame", "uah_frame", "release_frame"]])
+    in_range = (frame_indices >= 0) & (frame_indices < len(seq))
+    elbow_angles = np.zeros(len(frame_indices))
+    if len(seq):
+        elbow_angles, _ = elbow_angle_array(seq.array[np.where(in_range, frame_indices, 0)], config)
+    
     # Analyze each key frame
-    for frame_type in ["bfc_frame", "ffc_frame", "uah_frame", "release_frame"]:
+    for i, frame_type in enumerate(["bfc_frame", "ffc_frame", "uah_frame", "release_frame"]):
         frame_idx = key_frames.get(frame_type, 0)
         if frame_idx >= len(keypoints) or frame_idx < 0 or not keypoints[frame_idx]:
             logging.warning(f"Invalid frame index {frame_idx} for {frame_type}")
@@ -38,8 +47,7 @@ def analyze_biomechanics(keypoints, key_frames, config=None, pitch_ref=None):
             continue
         
         # Elbow angle
-        elbow_angle = compute_elbow_angle({"keypoints": kp}, config)
-        results["metrics"][f"{frame_type}_elbow_angle"] = elbow_angle
+        results["metrics"][f"{frame_type}_elbow_angle"] = float(elbow_angles[i])
         
         # Shoulder angle (relative to horizontal)
         shoulder_idx = config.get("landmarks", {}).get("elbow_angle", {}).get("shoulder", 11)
@@ -50,14 +58,10 @@ def analyze_biomechanics(keypoints, key_frames, config=None, pitch_ref=None):
         elbow_vis = elbow.get("visibility", 0)
         
         if shoulder_vis >= config.get("visibility_threshold", 0.6) and elbow_vis >= config.get("visibility_threshold", 0.6):
-            upper_arm_vec = np.array([elbow["x"] - shoulder["x"], elbow["y"] - shoulder["y"]])
-            horizontal = np.array([1, 0])
-            dot = np.dot(upper_arm_vec, horizontal)
-            norm_vec = np.linalg.norm(upper_arm_vec)
-            if norm_vec > 0:
-                cos_theta = dot / (norm_vec + 1e-6)
-                shoulder_angle = np.degrees(np.arccos(np.clip(cos_theta, -1.0, 1.0)))
-                results["metrics"][f"{frame_type}_shoulder_angle"] = abs(shoulder_angle)
+            upper_arm_vec = [elbow["x"] - shoulder["x"], elbow["y"] - shoulder["y"]]
+            shoulder_angle, valid = vector_angles(upper_arm_vec, [1.0, 0.0])
+            if valid:
+                results["metrics"][f"{frame_type}_shoulder_angle"] = abs(float(shoulder_angle))
             else:
                 logging.warning(f"Zero-length vector for shoulder angle at {frame_type}")
         else:
@@ -76,13 +80,11 @@ def analyze_biomechanics(keypoints, key_frames, config=None, pitch_ref=None):
         if (shoulder.get("visibility", 0) >= config.get("visibility_threshold", 0.6) and
             elbow.get("visibility", 0) >= config.get("visibility_threshold", 0.6) and
             wrist.get("visibility", 0) >= config.get("visibility_threshold", 0.6)):
-            arm_vec = np.array([elbow["x"] - shoulder["x"], elbow["y"] - shoulder["y"]])
-            wrist_vec = np.array([wrist["x"] - elbow["x"], wrist["y"] - elbow["y"]])
-            dot = np.dot(arm_vec, wrist_vec)
-            norm_vec = np.linalg.norm(arm_vec) * np.linalg.norm(wrist_vec)
-            if norm_vec > 0:
-                cos_theta = dot / (norm_vec + 1e-6)
-                alignment_angle = np.degrees(np.arccos(np.clip(cos_theta, -1.0, 1.0)))
+            arm_vec = [elbow["x"] - shoulder["x"], elbow["y"] - shoulder["y"]]
+            wrist_vec = [wrist["x"] - elbow["x"], wrist["y"] - elbow["y"]]
+            alignment_angle, valid = vector_angles(arm_vec, wrist_vec)
+            if valid:
+                alignment_angle = float(alignment_angle)
                 results["alignment"]["arm_wrist_angle"] = abs(alignment_angle)
                 results["alignment"]["is_aligned"] = alignment_angle < config.get("alignment_threshold", 30)
             else:
@@ -1,76 +1,141 @@
-import json
 import numpy as np
 import logging
-from utils.angle_utils import compute_elbow_angle, compute_wrist_fallback_angle
+from utils.keypoint_sequence import NUM_LANDMARKS, KeypointSequence
+from utils.keypoint_store import load_keypoints
+from utils.angle_utils import elbow_angle_array, wrist_fallback_angle_array
+from utils.feature_cache import video_features
 
 logging.basicConfig(level=logging.INFO)
 
+FEATURE_NAMES = (
+    "shoulder_x", "shoulder_y",
+    "elbow_x", "elbow_y",
+    "distal_x", "distal_y",  # Elbow, or wrist when the wrist fallback is used
+)
+# Bump when extract_features output changes so cached features are recomputed
+FEATURE_VERSION = 3
+FEATURE_CONFIG_FIELDS = ("visibility_threshold", "wrist_visibility_threshold", "elbow_angle_min", "elbow_angle_max", "landmarks")
+
+def elbow_landmarks(config=None):
+    """
+    Resolve the shoulder/elbow/wrist landmark indices once.
+    Args:
+        config: Configuration parameters.
+    Returns:
+        Tuple of (shoulder, elbow, wrist) landmark indices.
+    """
+    landmarks = (config or {}).get("landmarks", {}).get("elbow_angle", {})
+    return landmarks.get("shoulder", 11), landmarks.get("elbow", 13), landmarks.get("wrist", 14)
+
+# Per-landmark channels of the flattened model input, in order: x, y, visibility
+LANDMARK_FEATURE_CHANNELS = (0, 1, 3)
+LANDMARK_FEATURE_NAMES = tuple(
+    f"landmark_{i}_{channel}" for i in range(NUM_LANDMARKS) for channel in ("x", "y", "visibility")
+)
+
+def flatten_landmarks(keypoints):
+    """
+    Flatten keypoints into the (frames, 99) model input shared by FrameDetector,
+    AngleAdjuster and prepare_frame_data: [x, y, visibility] for landmarks 0-32.
+    Frames without a detection are all zeros.
+    Args:
+        keypoints: KeypointSequence, list of keypoint frames or (frames, 33, 4) array.
+    Returns:
+        (frames, 99) float32 array laid out as LANDMARK_FEATURE_NAMES.
+    """
+    if isinstance(keypoints, np.ndarray):
+        array, mask = keypoints, None
+    else:
+        keypoints = KeypointSequence.from_frames(keypoints)
+        array, mask = keypoints.array, keypoints.mask
+    flat = array[:, :, LANDMARK_FEATURE_CHANNELS].astype(np.float32).reshape(len(array), len(LANDMARK_FEATURE_NAMES))
+    if mask is not None and not mask.all():
+        flat[~mask] = 0.0
+    return flat
+
 def extract_features(keypoints_data, action_type, pitch_angle=0, config=None):
     """
-    Extract features for HMM training or prediction.
+    Extract features for HMM training or prediction in one vectorized pass.
+    Rows are produced for every frame with a detection, in frame order
+    (np.flatnonzero(keypoints.mask) gives their frame indices). Rows where
+    neither the elbow nor the wrist fallback is usable are all zeros.
     Args:
-        keypoints_data: List of keypoint frames or JSON file path.
+        keypoints_data: KeypointSequence, list of keypoint frames or keypoint file path (.kps or .json).
         action_type: 'fast' or 'spin'.
-        pitch_angle: Pitch angle for adjustment.
+        pitch_angle: Unused; pitch correction is applied when keypoints are loaded.
         config: Configuration parameters.
     Returns:
-        Tuple of (features, feature_labels, elbow_angles, wrist_fallback_frames).
+        Tuple of (features (N, 6) float32 laid out as FEATURE_NAMES, feature_labels (N,) int,
+        elbow_angles (N,) float32, wrist_fallback (N,) bool mask).
     """
     config = config or {}
     visibility_threshold = config.get("visibility_threshold", 0.6)
-    
+
     if isinstance(keypoints_data, str):
         try:
-            with open(keypoints_data, 'r') as f:
-                keypoints = json.load(f)
+            keypoints = load_keypoints(keypoints_data)
         except Exception as e:
             logging.error(f"Failed to load keypoints file {keypoints_data}: {e}")
             return None, None, None, None
     else:
-        keypoints = keypoints_data
+        keypoints = KeypointSequence.from_frames(keypoints_data)
+
+    missing = len(keypoints) - int(np.count_nonzero(keypoints.mask))
+    if missing:
+        logging.warning(f"{missing} of {len(keypoints)} frames have no keypoints")
 
-    features = []
-    feature_labels = []
-    elbow_angles = []
-    wrist_fallback_frames = []
+    shoulder_lm, elbow_lm, wrist_lm = elbow_landmarks(config)
+    detected = keypoints.array[keypoints.mask]
+    shoulder = detected[:, shoulder_lm, :2]
+    elbow = detected[:, elbow_lm, :2]
+    wrist = detected[:, wrist_lm, :2]
+    shoulder_vis = detected[:, shoulder_lm, 3] >= visibility_threshold
+    elbow_vis = detected[:, elbow_lm, 3] >= visibility_threshold
+    wrist_vis = detected[:, wrist_lm, 3] >= visibility_threshold
 
-    for frame_idx, frame in enumerate(keypoints):
-        if not frame.get("keypoints"):
-            logging.warning(f"Frame {frame_idx}: No keypoints")
-            continue
+    use_elbow = shoulder_vis & elbow_vis
+    use_wrist = shoulder_vis & wrist_vis & ~elbow_vis
 
-        kp = frame["keypoints"]
-        feature = []
-        shoulder = kp.get(f"landmark_{config.get('landmarks', {}).get('elbow_angle', {}).get('shoulder', 11)}", {"x": 0, "y": 0, "visibility": 0})
-        elbow = kp.get(f"landmark_{config.get('landmarks', {}).get('elbow_angle', {}).get('elbow', 13)}", {"x": 0, "y": 0, "visibility": 0})
-        wrist = kp.get(f"landmark_{config.get('landmarks', {}).get('elbow_angle', {}).get('wrist', 14)}", {"x": 0, "y": 0, "visibility": 0})
+    # Full shoulder-elbow-wrist angle is 0 unless all three landmarks are visible
+    elbow_angles, _ = elbow_angle_array(detected, config)
+    fallback_angles, _ = wrist_fallback_angle_array(detected, config)
+    elbow_angles = np.where(use_wrist, fallback_angles, np.where(use_elbow, elbow_angles, 0.0))
 
-        if shoulder["visibility"] >= visibility_threshold and elbow["visibility"] >= visibility_threshold:
-            angle = compute_elbow_angle({"keypoints": kp}, config)
-            used_wrist = False
-        elif shoulder["visibility"] >= visibility_threshold and wrist["visibility"] >= visibility_threshold:
-            angle = compute_wrist_fallback_angle({"keypoints": kp}, config)
-            used_wrist = True
-        else:
-            feature.extend([0, 0, 0, 0])
-            elbow_angles.append(0.0)
-            wrist_fallback_frames.append(frame_idx if used_wrist else None)
-            features.append(feature)
-            feature_labels.append(0)
-            continue
+    features = np.zeros((len(detected), len(FEATURE_NAMES)), dtype=np.float32)
+    valid = use_elbow | use_wrist
+    features[:, 0:2] = shoulder
+    features[:, 2:4] = elbow
+    features[:, 4:6] = np.where(use_wrist[:, None], wrist, elbow)
+    features[~valid] = 0.0
 
-        feature.extend([
-            shoulder["x"], shoulder["y"],
-            elbow["x"], elbow["y"]
-        ])
-        if used_wrist:
-            feature.extend([wrist["x"], wrist["y"]])
-        else:
-            feature.extend([elbow["x"], elbow["y"]])
+    feature_labels = np.zeros(len(detected), dtype=int)
+    return features, feature_labels, elbow_angles.astype(np.float32), use_wrist
 
-        features.append(feature)
-        feature_labels.append(0)
-        elbow_angles.append(angle)
-        wrist_fallback_frames.append(frame_idx if used_wrist else None)
+def video_elbow_features(keypoints_dir, video_id, config=None, pitch_ref=None, cache=None, return_frames=False):
+    """
+    extract_features() for one stored video, served from the feature cache when possible.
+    Args:
+        keypoints_dir: Directory with keypoint files.
+        video_id: Video identifier.
+        config: Configuration parameters.
+        pitch_ref: Pitch reference applied on load.
+        cache: Optional utils.feature_cache.FeatureCache.
+        return_frames: Also return the video frame index of each feature row.
+    Returns:
+        Tuple of (features, elbow_angles, wrist_fallback[, frames]) arrays.
+    """
+    def compute(keypoints):
+        features, _, elbow_angles, wrist_fallback = extract_features(keypoints, None, config=config)
+        return {
+            "features": features, "elbow_angles": elbow_angles, "wrist_fallback": wrist_fallback,
+            "frames": np.flatnonzero(keypoints.mask),
+        }
 
-    return features, feature_labels, elbow_angles, wrist_fallback_frames
+    arrays = video_features(
+        keypoints_dir, video_id, compute, "elbow_features", FEATURE_VERSION,
+        config, FEATURE_CONFIG_FIELDS, pitch_ref, cache,
+        (config or {}).get("keypoints_prefix", "bowling_analysis")
+    )
+    if return_frames:
+        return arrays["features"], arrays["elbow_angles"], arrays["wrist_fallback"], arrays["frames"]
+    return arrays["features"], arrays["elbow_angles"], arrays["wrist_fallback"]
@@ -0,0 +1,164 @@
+import numpy as np
+import logging
+from scipy.signal import find_peaks
+from core.kinematics import finite_difference
+from utils.keypoint_sequence import KeypointSequence
+from utils.feature_cache import video_features
+
+logging.basicConfig(level=logging.INFO)
+
+# Bump when candidate detection changes so cached indexes are recomputed
+FOOT_EVENTS_VERSION = 1
+FOOT_EVENTS_CONFIG_FIELDS = (
+    "visibility_threshold", "kinematics_fps", "foot_stationary_speed", "foot_min_stationary",
+    "foot_min_separation", "foot_min_prominence",
+)
+
+# Ankle, heel and foot index (toe) landmarks per foot
+FOOT_LANDMARKS = {"left": (27, 29, 31), "right": (28, 30, 32)}
+FEET = tuple(FOOT_LANDMARKS)
+
+# Candidate kinds (bit flags; a frame can be both)
+HEIGHT_MINIMUM = 1     # Lowest point of the foot (largest image y)
+STATIONARY_ONSET = 2   # First frame of a near-zero-velocity interval
+
+
+def _foot_tracks(keypoints, threshold):
+    """Per-foot lowest visible point (x, y) and its validity, as (feet, frames, 2) and (feet, frames)."""
+    n = len(keypoints)
+    points = np.zeros((len(FEET), n, 2))
+    valid = np.zeros((len(FEET), n), dtype=bool)
+    for f, landmarks in enumerate(FOOT_LANDMARKS.values()):
+        coords = keypoints.array[:, landmarks, :2].astype(np.float64)
+        visible = keypoints.mask[:, None] & (keypoints.visibility[:, landmarks] >= threshold)
+        y = np.where(visible, coords[..., 1], -np.inf)
+        lowest = np.argmax(y, axis=1)
+        points[f] = coords[np.arange(n), lowest]
+        valid[f] = visible.any(axis=1)
+    return points, valid
+
+
+def _run_starts(flags, min_length):
+    """Start indices of runs of True at least min_length long."""
+    padded = np.r_[False, flags, False].astype(np.int8)
+    edges = np.diff(padded)
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    return starts[(ends - starts) >= min_length]
+
+
+def foot_contact_candidates(keypoints, config=None):
+    """
+    Scan ankle/heel/toe trajectories (landmarks 27-32) once and index foot-contact candidates.
+    Candidates are local vertical minima of each foot (largest image y) and the
+    onsets of near-zero-velocity intervals.
+    Args:
+        keypoints: KeypointSequence or list of keypoint frames.
+        config: Configuration parameters ("foot_stationary_speed" in normalized units/s,
+            "foot_min_stationary" frames, "foot_min_separation" frames, "foot_min_prominence").
+    Returns:
+        Dict of arrays sorted by frame: frames (int32), foot (uint8 index into FEET),
+        kind (uint8 HEIGHT_MINIMUM | STATIONARY_ONSET flags).
+    """
+    config = config or {}
+    keypoints = KeypointSequence.from_frames(keypoints)
+    fps = keypoints.fps or config.get("kinematics_fps", 30.0)
+    points, valid = _foot_tracks(keypoints, config.get("visibility_threshold", 0.6))
+
+    frames, feet, kinds = [], [], []
+    for f in range(len(FEET)):
+        if not valid[f].any():
+            continue
+        y = np.where(valid[f], points[f, :, 1], points[f, valid[f], 1].min())
+        peaks, _ = find_peaks(
+            y, distance=config.get("foot_min_separation", 5), prominence=config.get("foot_min_prominence", 0.005)
+        )
+        peaks = peaks[valid[f, peaks]]
+
+        velocity, velocity_valid = finite_difference(points[f], valid[f], 1.0 / fps)
+        stationary = velocity_valid & (np.hypot(velocity[:, 0], velocity[:, 1]) < config.get("foot_stationary_speed", 0.1))
+        onsets = _run_starts(stationary, config.get("foot_min_stationary", 3))
+
+        for found, kind in ((peaks, HEIGHT_MINIMUM), (onsets, STATIONARY_ONSET)):
+            frames.append(found)
+            feet.append(np.full(len(found), f))
+            kinds.append(np.full(len(found), kind))
+
+    if not frames:
+        return {"frames": np.zeros(0, np.int32), "foot": np.zeros(0, np.uint8), "kind": np.zeros(0, np.uint8)}
+    frames = np.concatenate(frames)
+    feet = np.concatenate(feet)
+    kinds = np.concatenate(kinds)
+    # Merge duplicate (frame, foot) entries by OR-ing their kinds
+    keys = frames.astype(np.int64) * len(FEET) + feet
+    unique, inverse = np.unique(keys, return_inverse=True)
+    merged = np.zeros(len(unique), dtype=np.uint8)
+    np.bitwise_or.at(merged, inverse, kinds.astype(np.uint8))
+    return {
+        "frames": (unique // len(FEET)).astype(np.int32),
+        "foot": (unique % len(FEET)).astype(np.uint8),
+        "kind": merged,
+    }
+
+
+def candidate_frames(candidates, start=0, stop=None, foot=None, kind=None):
+    """
+    Query a candidate index.
+    Args:
+        candidates: Dict returned by foot_contact_candidates().
+        start, stop: Frame range [start, stop); stop None means the end.
+        foot: Optional foot name ('left'/'right') filter.
+        kind: Optional HEIGHT_MINIMUM / STATIONARY_ONSET flag filter.
+    Returns:
+        Sorted unique frame indices.
+    """
+    frames = candidates["frames"]
+    lo = np.searchsorted(frames, start, side="left")
+    hi = len(frames) if stop is None else np.searchsorted(frames, stop, side="left")
+    keep = np.ones(hi - lo, dtype=bool)
+    if foot is not None:
+        keep &= candidates["foot"][lo:hi] == FEET.index(foot)
+    if kind is not None:
+        keep &= (candidates["kind"][lo:hi] & kind) != 0
+    return np.unique(frames[lo:hi][keep])
+
+
+def video_foot_candidates(keypoints_dir, video_id, config=None, pitch_ref=None, cache=None):
+    """
+    foot_contact_candidates() for one stored video, persisted in the feature cache.
+    Args:
+        keypoints_dir: Directory with keypoint files.
+        video_id: Video identifier.
+        config: Configuration parameters.
+        pitch_ref: Pitch reference applied on load.
+        cache: Optional utils.feature_cache.FeatureCache.
+    Returns:
+        Candidate index dict.
+    """
+    return video_features(
+        keypoints_dir, video_id, lambda keypoints: foot_contact_candidates(keypoints, config),
+        "foot_events", FOOT_EVENTS_VERSION, config, FOOT_EVENTS_CONFIG_FIELDS, pitch_ref, cache,
+        (config or {}).get("keypoints_prefix", "bowling_analysis")
+    )
+
+
+def corpus_foot_candidates(keypoints_dir, video_ids, config=None, pitch_refs=None, cache=None):
+    """
+    Candidate indexes for many videos, for corpus-wide queries.
+    Args:
+        keypoints_dir: Directory with keypoint files.
+        video_ids: Iterable of video identifiers.
+        config: Configuration parameters.
+        pitch_refs: Dict of video_id to pitch reference.
+        cache: Optional FeatureCache.
+    Returns:
+        Dict of video_id to candidate index (videos that fail to load are skipped).
+    """
+    pitch_refs = pitch_refs or {}
+    index = {}
+    for video_id in video_ids:
+        try:
+            index[video_id] = video_foot_candidates(keypoints_dir, video_id, config, pitch_refs.get(video_id), cache)
+        except Exception as e:
+            logging.error(f"Failed to index foot events for {video_id}: {e}")
+    return index
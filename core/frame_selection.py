@@ -1,6 +1,9 @@
 import logging
 import numpy as np
-from core.keypoints import adjust_keypoints
+from utils.keypoint_sequence import KeypointSequence
+from core.foot_events import foot_contact_candidates
+from core.feature_extraction import extract_features
+from core.hmm_predict import decode_phases, is_phase_model
 
 logging.basicConfig(level=logging.INFO)
 
@@ -16,7 +19,6 @@ def detect_bfc_frame(landmarks_per_frame, frame_detector, config, pitch_ref):
         Frame index or fallback.
     """
     config = config or {}
-    pitch_angle = pitch_ref.get("pitch_angle", 0) if pitch_ref else 0
     visibility_threshold = config.get("visibility_threshold", 0.6)
     fallback_frame = config.get("fallback_frames", {}).get("bfc_frame", 0)
     
@@ -25,33 +27,20 @@ def detect_bfc_frame(landmarks_per_frame, frame_detector, config, pitch_ref):
             logging.warning("No landmarks provided for BFC detection")
             return fallback_frame
         
-        frame_probs = []
-        for i, frame in enumerate(landmarks_per_frame):
-            if not isinstance(frame, dict):
-                logging.warning(f"Frame {i}: Expected dict, got {type(frame)}")
-                frame_probs.append(0.0)
-                continue
-            
-            kp = adjust_keypoints(frame.get("keypoints", {}), pitch_angle) if frame.get("keypoints") else {}
-            if not kp:
-                frame_probs.append(0.0)
-                continue
-            
-            # Check visibility for key landmarks
-            left_ankle = kp.get("landmark_27", {"visibility": 0})
-            right_ankle = kp.get("landmark_28", {"visibility": 0})
-            if left_ankle["visibility"] < visibility_threshold and right_ankle["visibility"] < visibility_threshold:
-                frame_probs.append(0.0)
-                continue
-            
-            # Simplified BFC detection (replace with actual logic)
-            frame_probs.append(1.0 if i == config.get("bfc_frame", 20) else 0.0)
+        seq = KeypointSequence.from_frames(landmarks_per_frame)
+        # Pitch rotation (core.rotation) leaves visibility unchanged, so the ankle
+        # visibility check runs on the stored array directly
+        visibility = seq.visibility
+        visible = seq.mask & ((visibility[:, 27] >= visibility_threshold) | (visibility[:, 28] >= visibility_threshold))
         
-        if not frame_probs or max(frame_probs) == 0:
+        # Simplified BFC detection (replace with actual logic)
+        frame_probs = (visible & (np.arange(len(seq)) == config.get("bfc_frame", 20))).astype(float)
+        
+        if not len(frame_probs) or frame_probs.max() == 0:
             logging.warning("No valid frames for BFC detection; using fallback frame")
             return fallback_frame
         
-        return np.argmax(frame_probs)
+        return int(np.argmax(frame_probs))
     except Exception as e:
         logging.error(f"BFC detection failed: {e}")
         return fallback_frame
@@ -74,28 +63,210 @@ def detect_release_frame(landmarks_per_frame, frame_detector, config, pitch_ref)
     logging.warning("Release detection not implemented; using fallback frame")
     return fallback_frame
 
-def select_key_frames(landmarks_per_frame, frame_detector, action_type, config=None, pitch_ref=None):
+def decode_key_frames(probs, valid=None, min_spacing=1):
+    """
+    Jointly decode BFC < FFC < UAH < release from a per-frame probability matrix.
+    Maximizes the summed log-probability of the four chosen frames subject to
+    consecutive events being at least min_spacing frames apart, by dynamic
+    programming with running prefix maxima (O(frames * events)).
+    Args:
+        probs: (frames, events) probability matrix, columns in delivery order.
+        valid: Optional (frames,) or (frames, events) mask; masked-out frames are never chosen.
+        min_spacing: Minimum frame gap between consecutive events.
+    Returns:
+        Tuple of (event frame indices as an int array, or None when no ordered
+        assignment fits, total log-probability).
+    """
+    probs = np.asarray(probs, dtype=np.float64)
+    n, k = probs.shape
+    log_p = np.log(np.clip(probs, 1e-12, 1.0))
+    if valid is not None:
+        valid = np.asarray(valid, dtype=bool)
+        log_p = np.where(valid if valid.ndim == 2 else valid[:, None], log_p, -np.inf)
+    min_spacing = max(int(min_spacing), 1)
+    if n == 0 or n <= (k - 1) * min_spacing:
+        return None, -np.inf
+
+    idx = np.arange(n)
+    best = log_p[:, 0].copy()
+    back = np.zeros((k, n), dtype=int)
+    for e in range(1, k):
+        prefix = np.maximum.accumulate(best)
+        prefix_arg = np.maximum.accumulate(np.where(best >= prefix, idx, 0))
+        shifted = np.full(n, -np.inf)
+        shifted[min_spacing:] = prefix[:-min_spacing]
+        back[e, min_spacing:] = prefix_arg[:-min_spacing]
+        best = log_p[:, e] + shifted
+
+    last = int(np.argmax(best))
+    score = float(best[last])
+    if not np.isfinite(score):
+        return None, score
+    frames = np.zeros(k, dtype=int)
+    frames[-1] = last
+    for e in range(k - 1, 0, -1):
+        frames[e - 1] = back[e, frames[e]]
+    return frames, score
+
+def candidate_scoring_plan(candidates, n_frames, mask, config=None):
+    """
+    Decide which frames the frame detector scores and where each event may fall.
+    Foot events (BFC, FFC) are restricted to foot-contact candidates; arm
+    events (UAH, release) to the config "event_arm_window" frames after a candidate.
+    Args:
+        candidates: Candidate index from core.foot_events.foot_contact_candidates().
+        n_frames: Sequence length.
+        mask: Per-frame detection mask.
+        config: Configuration parameters.
+    Returns:
+        Tuple of (sorted frame indices to score, (n_frames, 4) event validity mask),
+        or (None, None) when there are no candidates.
+    """
+    config = config or {}
+    frames = np.unique(candidates["frames"])
+    frames = frames[(frames >= 0) & (frames < n_frames)]
+    frames = frames[mask[frames]]
+    if not len(frames):
+        return None, None
+    arm_window = config.get("event_arm_window", 90)
+    # Frames within arm_window after any candidate, via a difference array
+    coverage = np.zeros(n_frames + 1, dtype=int)
+    np.add.at(coverage, frames + 1, 1)
+    np.add.at(coverage, np.minimum(frames + arm_window + 1, n_frames), -1)
+    after = np.cumsum(coverage[:-1]) > 0
+    foot = np.zeros(n_frames, dtype=bool)
+    foot[frames] = True
+    arm = after & mask
+    valid = np.stack([foot, foot, arm, arm], axis=1)
+    return np.flatnonzero(foot | arm), valid
+
+def _fallback_frames(landmarks_per_frame, frame_detector, config, pitch_ref):
+    return {
+        "bfc_frame": lambda: detect_bfc_frame(landmarks_per_frame, frame_detector, config, pitch_ref),
+        "ffc_frame": lambda: detect_ffc_frame(landmarks_per_frame, frame_detector, config, pitch_ref),
+        "uah_frame": lambda: detect_uah_frame(landmarks_per_frame, frame_detector, config, pitch_ref),
+        "release_frame": lambda: detect_release_frame(landmarks_per_frame, frame_detector, config, pitch_ref),
+    }
+
+def _hmm_key_frames(seq, hmm_model, action_type, config):
+    """Key frames from a left-to-right phase HMM; returns (key_frames, reason for missing events)."""
+    if not is_phase_model(hmm_model):
+        return {}, "HMM is not a left-to-right phase model"
+    features, _, _, _ = extract_features(seq, action_type, config=config)
+    if features is None or not len(features):
+        return {}, "no HMM features"
+    result = decode_phases(hmm_model, features, np.flatnonzero(seq.mask))
+    logging.info(f"HMM key frames {result['key_frames']} (log-likelihood {result['log_likelihood']:.2f})")
+    return result["key_frames"], "phase not entered in HMM decoding"
+
+def _detector_key_frames(seq, frame_detector, events, config, foot_candidates, fixed=None):
+    """
+    Key frames from one FrameDetector pass; returns (key_frames, reasons per missing event).
+    Events in fixed (event -> frame, e.g. placed by the HMM) are pinned to their
+    frames in the joint decode, so the other events are placed in order around
+    them; only the other events are returned.
+    """
+    fixed = fixed or {}
+    if frame_detector is None:
+        return {}, dict.fromkeys(events, "no frame detector")
+    if not len(seq):
+        return {}, dict.fromkeys(events, "no frames")
+    
+    scored, valid = None, seq.mask
+    if config.get("use_foot_candidates", True):
+        if foot_candidates is None:
+            foot_candidates = foot_contact_candidates(seq, config)
+        scored, event_valid = candidate_scoring_plan(foot_candidates, len(seq), seq.mask, config)
+        if scored is None:
+            logging.info("No foot-contact candidates; scoring every frame")
+        else:
+            valid = event_valid
+            logging.info(f"Scoring {len(scored)} of {len(seq)} frames around {len(foot_candidates['frames'])} foot-contact candidates")
+    scored_probs = frame_detector.predict_proba(seq, scored)
+    if scored_probs is None:
+        return {}, dict.fromkeys(events, "frame detector prediction failed")
+    if scored is None:
+        probs = np.array(scored_probs, dtype=np.float64)
+    else:
+        probs = np.zeros((len(seq), len(events)))
+        probs[scored] = scored_probs
+    
+    valid = np.asarray(valid, dtype=bool)
+    valid = np.array(np.broadcast_to(valid[:, None] if valid.ndim == 1 else valid, probs.shape))
+    for j, event in enumerate(events):
+        if event in fixed:
+            valid[:, j] = False
+            valid[fixed[event], j] = True
+            probs[fixed[event], j] = 1.0
+    frames, score = decode_key_frames(probs, valid, config.get("event_min_spacing", 3))
+    if frames is None:
+        context = f" around fixed frames {fixed}" if fixed else ""
+        return {}, {event: f"no ordered assignment in {len(seq)} frames{context}" for event in events if event not in fixed}
+    key_frames = {}
+    reasons = {}
+    min_probability = config.get("event_min_probability", 0.05)
+    for j, event in enumerate(events):
+        if event in fixed:
+            continue
+        p = probs[frames[j], j]
+        if p < min_probability:
+            reasons[event] = f"probability {p:.3f} at frame {frames[j]} below {min_probability}"
+        else:
+            key_frames[event] = int(frames[j])
+    logging.info(f"Decoded key frames {key_frames} (log-probability {score:.2f})")
+    return key_frames, reasons
+
+def select_key_frames(landmarks_per_frame, frame_detector, action_type, config=None, pitch_ref=None, foot_candidates=None, hmm_model=None):
     """
     Select key frames for biomechanical analysis.
+    With a left-to-right phase HMM (core.hmm_training.train_phase_hmm) the
+    sequence is segmented by banded Viterbi decoding, the default fast path.
+    Events the HMM does not place come from one FrameDetector pass decoded
+    jointly (decode_key_frames) with the HMM's frames held fixed, so the
+    delivery order is kept; unless config "use_foot_candidates" is false,
+    only foot-contact candidates and the frames following them are scored
+    (candidate_scoring_plan). Events that still cannot be placed, or whose
+    probability is below config "event_min_probability", fall back individually
+    to the per-event detectors with a logged reason.
     Args:
-        landmarks_per_frame: List of frame keypoints.
-        frame_detector: Trained FrameDetector model.
+        landmarks_per_frame: KeypointSequence or list of frame keypoints.
+        frame_detector: Trained FrameDetector model (None uses fallbacks).
         action_type: 'fast' or 'spin'.
-        config: Configuration parameters.
+        config: Configuration parameters ("use_hmm_key_frames", "event_min_spacing", "event_min_probability").
         pitch_ref: Pitch reference data.
+        foot_candidates: Optional precomputed candidate index (core.foot_events).
+        hmm_model: Optional trained HMM.
     Returns:
         Dict of frame types to indices.
     """
     config = config or {}
     pitch_ref = pitch_ref or {}
+    events = ["bfc_frame", "ffc_frame", "uah_frame", "release_frame"]
     
     try:
-        return {
-            "bfc_frame": detect_bfc_frame(landmarks_per_frame, frame_detector, config, pitch_ref),
-            "ffc_frame": detect_ffc_frame(landmarks_per_frame, frame_detector, config, pitch_ref),
-            "uah_frame": detect_uah_frame(landmarks_per_frame, frame_detector, config, pitch_ref),
-            "release_frame": detect_release_frame(landmarks_per_frame, frame_detector, config, pitch_ref)
-        }
+        seq = KeypointSequence.from_frames(landmarks_per_frame)
+        key_frames = {}
+        reasons = {}
+        
+        if hmm_model is not None and config.get("use_hmm_key_frames", True) and len(seq):
+            key_frames, hmm_reason = _hmm_key_frames(seq, hmm_model, action_type, config)
+            reasons = {event: hmm_reason for event in events if event not in key_frames}
+        
+        missing = [event for event in events if event not in key_frames]
+        if missing:
+            detected, detector_reasons = _detector_key_frames(seq, frame_detector, events, config, foot_candidates, key_frames)
+            for event in missing:
+                if event in detected:
+                    key_frames[event] = detected[event]
+                else:
+                    reasons[event] = "; ".join(r for r in (reasons.get(event), detector_reasons.get(event)) if r)
+        
+        fallbacks = _fallback_frames(seq, frame_detector, config, pitch_ref)
+        for event in events:
+            if event not in key_frames:
+                logging.warning(f"{event}: {reasons.get(event) or 'not decoded'}; using fallback")
+                key_frames[event] = fallbacks[event]()
+        return {event: key_frames[event] for event in events}
     except Exception as e:
         logging.error(f"Key frame selection failed: {e}")
         return {
@@ -0,0 +1,207 @@
+import os
+import logging
+import numpy as np
+from scipy.special import logsumexp
+from core.hmm_predict import emission_log_likelihood, is_phase_model
+
+logging.basicConfig(level=logging.INFO)
+
+STAT_KEYS = ("start", "trans", "post", "obs", "obs2")
+
+
+def empty_statistics(n_components, n_features):
+    """
+    Args:
+        n_components: Number of HMM states.
+        n_features: Feature dimension.
+    Returns:
+        Zeroed sufficient statistics dict.
+    """
+    return {
+        "start": np.zeros(n_components),
+        "trans": np.zeros((n_components, n_components)),
+        "post": np.zeros(n_components),
+        "obs": np.zeros((n_components, n_features)),
+        "obs2": np.zeros((n_components, n_features)),
+        "n_frames": 0,
+        "video_ids": [],
+    }
+
+
+def add_statistics(a, b):
+    """Sum two statistics dicts (video ids are concatenated)."""
+    total = {key: a[key] + b[key] for key in STAT_KEYS}
+    total["n_frames"] = a["n_frames"] + b["n_frames"]
+    total["video_ids"] = list(a["video_ids"]) + list(b["video_ids"])
+    return total
+
+
+def _sequences(X, lengths):
+    starts = np.r_[0, np.cumsum(lengths)[:-1]]
+    for start, length in zip(starts, lengths):
+        yield X[start:start + length]
+
+
+def labelled_statistics(X, lengths, states, n_components, video_ids=None):
+    """
+    Exact sufficient statistics from labelled state sequences (phase HMMs).
+    Phases only move forward one at a time, so a labelled step that skips
+    phases is counted as an advance to the next phase.
+    Args:
+        X: (N, D) features.
+        lengths: Sequence lengths.
+        states: (N,) labelled states.
+        n_components: Number of HMM states.
+        video_ids: Optional ids of the sequences, recorded in the statistics.
+    Returns:
+        Statistics dict.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    states = np.asarray(states)
+    stats = empty_statistics(n_components, X.shape[1])
+    np.add.at(stats["post"], states, 1.0)
+    np.add.at(stats["obs"], states, X)
+    np.add.at(stats["obs2"], states, X ** 2)
+    for seq in _sequences(states, lengths):
+        stats["start"][seq[0]] += 1
+        np.add.at(stats["trans"], (seq[:-1], np.minimum(seq[1:], seq[:-1] + 1)), 1.0)
+    stats["n_frames"] = len(X)
+    stats["video_ids"] = list(video_ids or [])
+    return stats
+
+
+def expected_statistics(model, X, lengths, video_ids=None):
+    """
+    Expected sufficient statistics (E-step) of sequences under the current model.
+    Args:
+        model: GaussianHMM with diag covariances.
+        X: (N, D) features.
+        lengths: Sequence lengths.
+        video_ids: Optional ids of the sequences.
+    Returns:
+        Tuple of (statistics dict, total log-likelihood).
+    """
+    X = np.asarray(X, dtype=np.float64)
+    K = model.n_components
+    stats = empty_statistics(K, X.shape[1])
+    with np.errstate(divide="ignore"):
+        log_start = np.log(model.startprob_)
+        log_a = np.log(model.transmat_)
+    total = 0.0
+    for seq in _sequences(X, lengths):
+        log_b = emission_log_likelihood(model, seq)
+        T = len(seq)
+        log_alpha = np.empty((T, K))
+        log_beta = np.zeros((T, K))
+        log_alpha[0] = log_start + log_b[0]
+        for t in range(1, T):
+            log_alpha[t] = logsumexp(log_alpha[t - 1][:, None] + log_a, axis=0) + log_b[t]
+        for t in range(T - 2, -1, -1):
+            log_beta[t] = logsumexp(log_a + (log_b[t + 1] + log_beta[t + 1])[None, :], axis=1)
+        ll = logsumexp(log_alpha[-1])
+        gamma = np.exp(log_alpha + log_beta - ll)
+        if T > 1:
+            log_xi = log_alpha[:-1, :, None] + log_a[None] + (log_b[1:] + log_beta[1:])[:, None, :] - ll
+            stats["trans"] += np.exp(log_xi).sum(axis=0)
+        stats["start"] += gamma[0]
+        stats["post"] += gamma.sum(axis=0)
+        stats["obs"] += gamma.T @ seq
+        stats["obs2"] += gamma.T @ seq ** 2
+        total += ll
+    stats["n_frames"] = len(X)
+    stats["video_ids"] = list(video_ids or [])
+    return stats, float(total)
+
+
+def apply_statistics(model, stats, min_covar=1e-3, transition_prior=None):
+    """
+    M-step: set model parameters from sufficient statistics.
+    Transitions that are zero in the model stay zero, so a left-to-right
+    band is preserved. States without data keep their parameters.
+    Args:
+        model: GaussianHMM to update in place.
+        stats: Statistics dict.
+        min_covar: Variance floor.
+        transition_prior: Pseudo-count added to every allowed transition
+            (default 1 for phase models, 0 otherwise).
+    Returns:
+        The model.
+    """
+    if transition_prior is None:
+        transition_prior = 1.0 if is_phase_model(model) else 0.0
+    allowed = np.asarray(model.transmat_) > 0
+    trans = np.where(allowed, stats["trans"] + transition_prior, 0.0)
+    row_sums = trans.sum(axis=1, keepdims=True)
+    model.transmat_ = np.where(row_sums > 0, trans / np.where(row_sums > 0, row_sums, 1.0), model.transmat_)
+    start = stats["start"] + 1e-3
+    model.startprob_ = start / start.sum()
+
+    occupied = stats["post"] > 1e-10
+    post = np.where(occupied, stats["post"], 1.0)[:, None]
+    means = stats["obs"] / post
+    covars = stats["obs2"] / post - means ** 2 + min_covar
+    old_covars = np.asarray(model.covars_)
+    if old_covars.ndim == 3:
+        old_covars = np.diagonal(old_covars, axis1=1, axis2=2)
+    model.means_ = np.where(occupied[:, None], means, model.means_)
+    model.covars_ = np.where(occupied[:, None], np.maximum(covars, min_covar), old_covars)
+    return model
+
+
+def update_hmm(model, stats, X_new, lengths_new, states_new=None, video_ids=None, n_iter=3, min_covar=1e-3):
+    """
+    Update a trained HMM with new sequences at a cost proportional to the new data.
+    Previous data enters only through its stored sufficient statistics. Labelled
+    sequences (phase HMMs) add exact statistics, giving the same model as a
+    supervised retrain (train_phase_hmm with n_iter=0); unlabelled ones run
+    n_iter warm-started EM iterations that combine the stored statistics with
+    the new sequences' expected statistics.
+    Args:
+        model: Trained GaussianHMM (updated in place).
+        stats: Statistics from previous runs, or None.
+        X_new: (N, D) features of the new sequences.
+        lengths_new: Their lengths.
+        states_new: Optional (N,) labelled states.
+        video_ids: Optional ids of the new sequences.
+        n_iter: EM iterations over the new sequences (unlabelled updates only).
+        min_covar: Variance floor.
+    Returns:
+        Tuple of (model, updated statistics).
+    """
+    X_new = np.asarray(X_new, dtype=np.float64)
+    base = stats or empty_statistics(model.n_components, X_new.shape[1])
+    if states_new is not None:
+        new = labelled_statistics(X_new, lengths_new, states_new, model.n_components, video_ids)
+        apply_statistics(model, add_statistics(base, new), min_covar)
+    else:
+        new, _ = expected_statistics(model, X_new, lengths_new, video_ids)
+        for i in range(n_iter):
+            apply_statistics(model, add_statistics(base, new), min_covar)
+            new, log_likelihood = expected_statistics(model, X_new, lengths_new, video_ids)
+            logging.info(f"Incremental EM iteration {i + 1}: new-data log-likelihood {log_likelihood:.2f}")
+    logging.info(f"HMM updated with {len(lengths_new)} new sequences ({len(X_new)} frames)")
+    return model, add_statistics(base, new)
+
+
+def save_statistics(path, stats):
+    """Write statistics to an .npz file (atomically)."""
+    tmp = f"{path}.tmp.npz"
+    np.savez(tmp, n_frames=stats["n_frames"], video_ids=np.array(stats["video_ids"], dtype=str),
+             **{key: stats[key] for key in STAT_KEYS})
+    os.replace(tmp, path)
+
+
+def load_statistics(path):
+    """
+    Args:
+        path: .npz file written by save_statistics().
+    Returns:
+        Statistics dict, or None if the file does not exist.
+    """
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        stats = {key: data[key] for key in STAT_KEYS}
+        stats["n_frames"] = int(data["n_frames"])
+        stats["video_ids"] = data["video_ids"].tolist()
+    return stats
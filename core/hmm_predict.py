@@ -1,9 +1,13 @@
-
 import numpy as np
 import logging
+from scipy.special import logsumexp
 
 logging.basicConfig(level=logging.INFO)
 
+# Left-to-right phase states; key frames are the entry frames of states 1-4
+PHASES = ("run_up", "bfc", "ffc", "uah", "release", "follow_through")
+PHASE_KEY_FRAMES = {"bfc_frame": 1, "ffc_frame": 2, "uah_frame": 3, "release_frame": 4}
+
 def predict_hmm_sequence(model, X_frame):
     """
     Predict biomechanical frame sequence using a trained HMM.
@@ -20,3 +24,167 @@ def predict_hmm_sequence(model, X_frame):
     except Exception as e:
         logging.error(f"HMM prediction failed: {e}")
         return []
+
+def is_phase_model(model):
+    """True for left-to-right phase HMMs built by core.hmm_training.train_phase_hmm."""
+    return getattr(model, "phase_names", None) is not None
+
+def transition_band(transmat):
+    """
+    Width of a left-to-right transition matrix's band.
+    Args:
+        transmat: (K, K) transition matrix.
+    Returns:
+        Largest forward jump j - i with nonzero probability, or None if any
+        backward transition is allowed (not left-to-right).
+    """
+    i, j = np.nonzero(np.asarray(transmat) > 0)
+    if np.any(j < i):
+        return None
+    return int((j - i).max()) if len(i) else 0
+
+def _diag_covars(model):
+    covars = np.asarray(model.covars_)
+    return np.diagonal(covars, axis1=1, axis2=2) if covars.ndim == 3 else covars
+
+def emission_log_likelihood(model, X):
+    """
+    Diagonal-Gaussian log-likelihood of every frame under every state.
+    Args:
+        model: GaussianHMM with diag covariances.
+        X: (T, D) feature matrix.
+    Returns:
+        (T, K) log-likelihoods.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    means = np.asarray(model.means_, dtype=np.float64)
+    variances = _diag_covars(model)
+    log_norm = -0.5 * (X.shape[1] * np.log(2 * np.pi) + np.log(variances).sum(axis=1))
+    # sum((x - m)^2 / v) expanded so the (T, K) result needs no (T, K, D) temporary
+    precision = 1.0 / variances
+    quad = (X ** 2) @ precision.T - 2 * X @ (means * precision).T + (means ** 2 * precision).sum(axis=1)
+    return log_norm - 0.5 * quad
+
+def _band_log_transitions(transmat, band):
+    """(band + 1, K) log-probabilities of jumping d states forward into state j."""
+    K = len(transmat)
+    with np.errstate(divide="ignore"):
+        log_a = np.log(transmat)
+    log_band = np.full((band + 1, K), -np.inf)
+    for d in range(band + 1):
+        log_band[d, d:] = np.diagonal(log_a, offset=d)
+    return log_band
+
+def banded_viterbi(log_start, transmat, log_b, band):
+    """
+    Viterbi decoding for a left-to-right HMM in O(T * K * (band + 1)).
+    Args:
+        log_start: (K,) log start probabilities.
+        transmat: (K, K) left-to-right transition matrix.
+        log_b: (T, K) emission log-likelihoods.
+        band: Transition band width (transition_band()).
+    Returns:
+        Tuple of ((T,) state path, best path log-probability).
+    """
+    T, K = log_b.shape
+    log_band = _band_log_transitions(transmat, band)
+    back = np.zeros((T, K), dtype=np.int64)
+    delta = log_start + log_b[0]
+    candidates = np.empty((band + 1, K))
+    for t in range(1, T):
+        candidates.fill(-np.inf)
+        for d in range(band + 1):
+            candidates[d, d:] = delta[:K - d] + log_band[d, d:]
+        jump = np.argmax(candidates, axis=0)
+        back[t] = np.arange(K) - jump
+        delta = candidates[jump, np.arange(K)] + log_b[t]
+    path = np.empty(T, dtype=np.int64)
+    path[-1] = int(np.argmax(delta))
+    for t in range(T - 1, 0, -1):
+        path[t - 1] = back[t, path[t]]
+    return path, float(delta[path[-1]])
+
+def banded_posteriors(log_start, transmat, log_b, band):
+    """
+    Forward-backward state posteriors for a left-to-right HMM in O(T * K * (band + 1)).
+    Args:
+        log_start: (K,) log start probabilities.
+        transmat: (K, K) left-to-right transition matrix.
+        log_b: (T, K) emission log-likelihoods.
+        band: Transition band width.
+    Returns:
+        Tuple of ((T, K) posteriors, sequence log-likelihood).
+    """
+    T, K = log_b.shape
+    log_band = _band_log_transitions(transmat, band)
+    terms = np.empty((band + 1, K))
+    log_alpha = np.empty((T, K))
+    log_alpha[0] = log_start + log_b[0]
+    for t in range(1, T):
+        terms.fill(-np.inf)
+        for d in range(band + 1):
+            terms[d, d:] = log_alpha[t - 1, :K - d] + log_band[d, d:]
+        log_alpha[t] = logsumexp(terms, axis=0) + log_b[t]
+    log_beta = np.zeros((T, K))
+    for t in range(T - 2, -1, -1):
+        nxt = log_b[t + 1] + log_beta[t + 1]
+        terms.fill(-np.inf)
+        for d in range(band + 1):
+            terms[d, :K - d] = log_band[d, d:] + nxt[d:]
+        log_beta[t] = logsumexp(terms, axis=0)
+    log_likelihood = float(logsumexp(log_alpha[-1]))
+    with np.errstate(invalid="ignore"):
+        posteriors = np.exp(log_alpha + log_beta - log_likelihood)
+    return np.nan_to_num(posteriors), log_likelihood
+
+def phase_boundaries(path):
+    """
+    Entry frame of every phase in a decoded path.
+    Args:
+        path: (T,) non-decreasing state path.
+    Returns:
+        (K,) array of first row index at or past each state (-1 if never reached).
+    """
+    n_states = int(path.max()) + 1 if len(path) else 0
+    entries = np.searchsorted(path, np.arange(max(n_states, 1)), side="left")
+    return np.where(entries < len(path), entries, -1)
+
+def decode_phases(model, X, frame_index=None):
+    """
+    Segment a sequence into phases with a left-to-right HMM.
+    Uses banded Viterbi and forward-backward when the transition matrix is
+    left-to-right, and hmmlearn's full decoding otherwise.
+    Args:
+        model: GaussianHMM (ideally from core.hmm_training.train_phase_hmm).
+        X: (T, D) feature matrix.
+        frame_index: Optional (T,) video frame index of each row.
+    Returns:
+        Dict with states (T,), posteriors (T, K), boundaries (K,) as video frame
+        indices (-1 for phases never entered), key_frames dict and log_likelihood.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    frame_index = np.arange(len(X)) if frame_index is None else np.asarray(frame_index)
+    band = transition_band(model.transmat_)
+    if band is None:
+        log_likelihood, states = model.decode(X)
+        posteriors = model.predict_proba(X)
+    else:
+        with np.errstate(divide="ignore"):
+            log_start = np.log(model.startprob_)
+        log_b = emission_log_likelihood(model, X)
+        states, _ = banded_viterbi(log_start, model.transmat_, log_b, band)
+        posteriors, log_likelihood = banded_posteriors(log_start, model.transmat_, log_b, band)
+
+    entries = phase_boundaries(states) if band is not None else np.full(model.n_components, -1)
+    boundaries = np.full(model.n_components, -1)
+    boundaries[:len(entries)] = np.where(entries >= 0, frame_index[np.maximum(entries, 0)], -1)
+    key_frames = {}
+    if is_phase_model(model):
+        key_frames = {name: int(boundaries[state]) for name, state in PHASE_KEY_FRAMES.items() if boundaries[state] >= 0}
+    return {
+        "states": states,
+        "posteriors": posteriors,
+        "boundaries": boundaries,
+        "key_frames": key_frames,
+        "log_likelihood": float(log_likelihood),
+    }
@@ -1,17 +1,30 @@
-import numpy as np
+import os
+import time
+import shutil
 import logging
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
 from hmmlearn import hmm
-from core.feature_extraction import extract_features
+from threadpoolctl import threadpool_limits
+from core.feature_extraction import video_elbow_features
+from utils.keypoint_store import keypoints_file
+from utils.feature_cache import keypoints_root
+from core.hmm_predict import PHASES, PHASE_KEY_FRAMES
+from core.hmm_incremental import labelled_statistics, apply_statistics
 
 logging.basicConfig(level=logging.INFO)
 
-def train_hmm(X, n_components=4, n_iter=100):
+def train_hmm(X, n_components=4, n_iter=100, lengths=None, random_state=42):
     """
     Train an HMM model for frame sequence prediction.
     Args:
         X: Feature array (n_samples, n_features).
         n_components: Number of HMM states (e.g., 4 for BFC, FFC, UAH, Release).
         n_iter: Number of iterations for training.
+        lengths: Optional per-video sequence lengths; None treats X as one sequence.
+        random_state: Seed for parameter initialization.
     Returns:
         Trained HMM model.
     """
@@ -20,60 +33,300 @@ def train_hmm(X, n_components=4, n_iter=100):
             n_components=n_components,
             covariance_type="diag",
             n_iter=n_iter,
-            random_state=42
+            random_state=random_state
         )
-        model.fit(X)
+        model.fit(X, lengths)
         logging.info(f"HMM trained with {n_components} components")
         return model
     except Exception as e:
         logging.error(f"Failed to train HMM: {e}")
         return None
 
-def prepare_hmm_data(keypoints_dir, assessments, action_type, config=None, pitch_refs=None):
+def prepare_hmm_data(keypoints_dir, assessments, action_type, config=None, pitch_refs=None, cache=None, return_ids=False):
     """
     Prepare data for HMM training.
     Args:
-        keypoints_dir: Directory with keypoint JSONs.
+        keypoints_dir: Directory with keypoint files.
         assessments: Dict of video assessments.
         action_type: 'fast' or 'spin'.
         config: Configuration parameters.
         pitch_refs: Dict of video_id to pitch reference.
+        cache: Optional FeatureCache.
+        return_ids: Also return the video ids of the sequences.
     Returns:
-        Feature array for HMM training.
+        Tuple of (feature array, per-video sequence lengths[, video ids]), or None.
     """
     config = config or {}
     pitch_refs = pitch_refs or {}
     X = []
+    video_ids = []
     
     for video_id, labels in assessments.items():
-        keypoints_path = os.path.join(keypoints_dir, f"bowling_analysis_{video_id}.json")
+        keypoints_path = keypoints_file(keypoints_root(keypoints_dir), video_id)
         if not os.path.exists(keypoints_path):
             logging.warning(f"Missing keypoints for {video_id}")
             continue
         
         try:
-            with open(keypoints_path, 'r') as f:
-                keypoints = json.load(f)
+            features, _, _ = video_elbow_features(keypoints_dir, video_id, config, pitch_refs.get(video_id), cache)
         except Exception as e:
             logging.error(f"Failed to load keypoints for {video_id}: {e}")
             continue
         
-        pitch_ref = pitch_refs.get(video_id, {"pitch_angle": 0})
-        features, _, _, _ = extract_features(
-            keypoints,
-            action_type,
-            pitch_ref.get("pitch_angle", 0),
-            config
-        )
-        
-        if features:
+        if features is not None and len(features):
             X.append(features)
+            video_ids.append(video_id)
     
     if X:
-        return np.vstack(X)
+        data = (np.concatenate(X), np.array([len(x) for x in X]))
+        return data + (video_ids,) if return_ids else data
     logging.warning("No valid features for HMM training")
     return None
 
+def phase_states(frame_index, labels, release_frames=3):
+    """
+    Ground-truth phase state of every feature row from labelled key frames.
+    Args:
+        frame_index: (T,) video frame index of each row.
+        labels: Dict with bfc_frame, ffc_frame, uah_frame and release_frame.
+        release_frames: Length of the release phase before follow-through.
+    Returns:
+        (T,) int state array indexing core.hmm_predict.PHASES, or None when the
+        labels are missing or out of order.
+    """
+    events = [labels.get(name) for name in PHASE_KEY_FRAMES]
+    if any(e is None for e in events) or np.any(np.diff(events) <= 0):
+        return None
+    boundaries = np.array(events + [events[-1] + release_frames])
+    return np.searchsorted(boundaries, np.asarray(frame_index), side="right")
+
+def prepare_phase_hmm_data(keypoints_dir, assessments, action_type, config=None, pitch_refs=None, cache=None, return_ids=False):
+    """
+    Prepare per-video feature sequences and phase labels for the left-to-right HMM.
+    Args:
+        keypoints_dir: Directory with keypoint files.
+        assessments: Dict of video assessments.
+        action_type: 'fast' or 'spin'.
+        config: Configuration parameters ("hmm_release_frames").
+        pitch_refs: Dict of video_id to pitch reference.
+        cache: Optional FeatureCache.
+        return_ids: Also return the video ids of the sequences.
+    Returns:
+        Tuple of (X, lengths, states[, video ids]), or None when no video is usable.
+    """
+    config = config or {}
+    pitch_refs = pitch_refs or {}
+    X, lengths, states, video_ids = [], [], [], []
+    
+    for video_id, labels in assessments.items():
+        try:
+            features, _, _, frames = video_elbow_features(
+                keypoints_dir, video_id, config, pitch_refs.get(video_id), cache, return_frames=True
+            )
+        except Exception as e:
+            logging.error(f"Failed to load keypoints for {video_id}: {e}")
+            continue
+        video_states = phase_states(frames, labels, config.get("hmm_release_frames", 3))
+        if video_states is None:
+            logging.warning(f"Skipping {video_id}: key frame labels missing or out of order")
+            continue
+        if not len(features):
+            continue
+        X.append(features)
+        lengths.append(len(features))
+        states.append(video_states)
+        video_ids.append(video_id)
+    
+    if X:
+        data = (np.concatenate(X), np.array(lengths), np.concatenate(states))
+        return data + (video_ids,) if return_ids else data
+    logging.warning("No labelled sequences for phase HMM training")
+    return None
+
+def train_phase_hmm(X, lengths, states, n_iter=0, min_covar=1e-3, random_state=42):
+    """
+    Train a left-to-right phase HMM (core.hmm_predict.PHASES).
+    Emissions and transitions are estimated directly from labelled phases
+    (core.hmm_incremental.labelled_statistics); each state may only stay or
+    advance to the next one, so the transition matrix is banded and decoding
+    is O(T * K). Optional EM iterations refine the estimate while keeping the
+    band (zero transitions stay zero).
+    Args:
+        X: (N, D) feature matrix of all sequences.
+        lengths: Sequence lengths summing to N.
+        states: (N,) labelled phase states.
+        n_iter: EM refinement iterations (0 keeps the supervised estimate).
+        min_covar: Variance floor.
+        random_state: Seed passed to hmmlearn.
+    Returns:
+        GaussianHMM with a phase_names attribute, or None on failure.
+    """
+    try:
+        X = np.asarray(X, dtype=np.float64)
+        n_states = len(PHASES)
+        # Each state may only stay or advance; phases without labelled frames
+        # keep the global mean and variance and an even stay/advance split
+        transmat = np.eye(n_states) + np.eye(n_states, k=1)
+        transmat /= transmat.sum(axis=1, keepdims=True)
+        
+        model = hmm.GaussianHMM(
+            n_components=n_states,
+            covariance_type="diag",
+            n_iter=max(n_iter, 1),
+            min_covar=min_covar,
+            init_params="",
+            params="stmc",
+            random_state=random_state
+        )
+        model.n_features = X.shape[1]
+        model.startprob_ = np.full(n_states, 1.0 / n_states)
+        model.transmat_ = transmat
+        model.means_ = np.tile(X.mean(axis=0), (n_states, 1))
+        model.covars_ = np.tile(X.var(axis=0) + min_covar, (n_states, 1))
+        model.phase_names = PHASES
+        # Same estimator as core.hmm_incremental.update_hmm, so incremental updates match a retrain
+        apply_statistics(model, labelled_statistics(X, lengths, states, n_states), min_covar)
+        if n_iter > 0:
+            model.fit(X, lengths)
+        logging.info(f"Phase HMM trained on {len(lengths)} sequences ({len(X)} frames)")
+        return model
+    except Exception as e:
+        logging.error(f"Failed to train phase HMM: {e}")
+        return None
+
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "NUMEXPR_NUM_THREADS")
+
+_restart_X = None
+_restart_limits = None
+
+def split_sequences(lengths, holdout_fraction=0.2, seed=42):
+    """
+    Split sequences (videos) into training and held-out sets.
+    Args:
+        lengths: Per-sequence lengths.
+        holdout_fraction: Fraction of sequences held out (at least one training sequence is kept).
+        seed: Shuffle seed.
+    Returns:
+        Tuple of (train sequence indices, held-out sequence indices).
+    """
+    order = np.random.default_rng(seed).permutation(len(lengths))
+    n_holdout = min(int(round(len(lengths) * holdout_fraction)), len(lengths) - 1)
+    return np.sort(order[n_holdout:]), np.sort(order[:n_holdout])
+
+def _gather(X, lengths, sequences):
+    """Rows and lengths of the selected sequences, preserving sequence boundaries."""
+    starts = np.r_[0, np.cumsum(lengths)[:-1]]
+    if not len(sequences):
+        return X[:0], np.zeros(0, dtype=int)
+    rows = np.concatenate([np.arange(starts[i], starts[i] + lengths[i]) for i in sequences])
+    return np.asarray(X[rows]), np.asarray(lengths)[sequences]
+
+def _init_restart_worker(X_path):
+    """
+    Pool initializer: one BLAS/OpenMP thread per worker so restarts do not
+    oversubscribe cores (set in the worker, never in the parent, which may be
+    running other fits), then open the shared feature matrix read-only
+    (memory-mapped, not copied).
+    """
+    global _restart_X, _restart_limits
+    os.environ.update({var: "1" for var in THREAD_ENV_VARS})
+    # Libraries already loaded by the time the initializer runs ignore the environment
+    _restart_limits = threadpool_limits(limits=1)
+    _restart_X = np.load(X_path, mmap_mode="r")
+
+def _fit_restart(seed, lengths, train_seqs, holdout_seqs, n_components, n_iter, X=None):
+    X = _restart_X if X is None else X
+    start = time.perf_counter()
+    X_train, train_lengths = _gather(X, lengths, train_seqs)
+    model = hmm.GaussianHMM(n_components=n_components, covariance_type="diag", n_iter=n_iter, random_state=seed)
+    model.fit(X_train, train_lengths)
+    X_holdout, holdout_lengths = _gather(X, lengths, holdout_seqs)
+    if len(X_holdout):
+        holdout_score = model.score(X_holdout, holdout_lengths) / len(X_holdout)
+    else:
+        holdout_score = model.score(X_train, train_lengths) / len(X_train)
+    return model, {
+        "seed": int(seed),
+        "train_log_likelihood": float(model.monitor_.history[-1]) if model.monitor_.history else None,
+        "holdout_log_likelihood_per_frame": float(holdout_score),
+        "iterations": int(model.monitor_.iter),
+        "converged": bool(model.monitor_.converged),
+        "seconds": time.perf_counter() - start,
+    }
+
+def train_hmm_restarts(X, lengths, n_restarts=8, workers=None, n_components=4, n_iter=100,
+                       holdout_fraction=0.2, seed=42):
+    """
+    Fit several randomly initialized HMMs in parallel and keep the best one.
+    Each restart trains on the same training videos and is scored by
+    per-frame log-likelihood on held-out videos. Workers read one shared
+    memory-mapped copy of X, and sequence boundaries (lengths) are respected.
+    Args:
+        X: Feature array (n_samples, n_features).
+        lengths: Per-video sequence lengths summing to n_samples.
+        n_restarts: Number of random initializations.
+        workers: Worker processes (default: min(n_restarts, CPU count)); 1 runs in-process.
+        n_components: Number of HMM states.
+        n_iter: EM iterations per restart.
+        holdout_fraction: Fraction of videos held out for scoring.
+        seed: Base seed; restart i uses seed + i.
+    Returns:
+        Tuple of (best model or None, diagnostics dict with the split, per-restart results and best seed).
+    """
+    lengths = np.asarray(lengths, dtype=int)
+    train_seqs, holdout_seqs = split_sequences(lengths, holdout_fraction, seed)
+    seeds = [seed + i for i in range(n_restarts)]
+    workers = min(n_restarts, os.cpu_count() or 1) if workers is None else max(1, workers)
+    args = (lengths, train_seqs, holdout_seqs, n_components, n_iter)
+    results = []
+    start = time.perf_counter()
+
+    if workers == 1:
+        X = np.asarray(X)
+        for s in seeds:
+            try:
+                results.append(_fit_restart(s, *args, X=X))
+            except Exception as e:
+                logging.error(f"HMM restart {s} failed: {e}")
+    else:
+        tmp_dir = tempfile.mkdtemp(prefix="hmm_restarts_")
+        X_path = os.path.join(tmp_dir, "X.npy")
+        np.save(X_path, np.ascontiguousarray(X))
+        try:
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_restart_worker,
+                initargs=(X_path,)
+            ) as pool:
+                futures = {pool.submit(_fit_restart, s, *args): s for s in seeds}
+                for future in as_completed(futures):
+                    try:
+                        results.append(future.result())
+                    except Exception as e:
+                        logging.error(f"HMM restart {futures[future]} failed: {e}")
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    diagnostics = {
+        "train_videos": train_seqs.tolist(),
+        "holdout_videos": holdout_seqs.tolist(),
+        "restarts": sorted((d for _, d in results), key=lambda d: d["seed"]),
+        "workers": workers,
+        "seconds": time.perf_counter() - start,
+    }
+    if not results:
+        logging.error("All HMM restarts failed")
+        diagnostics["best_seed"] = None
+        return None, diagnostics
+    best_model, best = max(results, key=lambda r: r[1]["holdout_log_likelihood_per_frame"])
+    diagnostics["best_seed"] = best["seed"]
+    logging.info(
+        f"HMM restarts: {len(results)}/{n_restarts} fitted in {diagnostics['seconds']:.1f}s with {workers} worker(s); "
+        f"best seed {best['seed']} held-out log-likelihood {best['holdout_log_likelihood_per_frame']:.3f}/frame"
+    )
+    return best_model, diagnostics
+
 if __name__ == "__main__":
     import sys
     if len(sys.argv) != 3:
@@ -85,8 +338,9 @@ if __name__ == "__main__":
     assessments = {}  # Load from database or JSON
     config = {}
     pitch_refs = {}
-    X = prepare_hmm_data(keypoints_dir, assessments, action_type, config, pitch_refs)
-    if X is not None:
-        model = train_hmm(X)
+    data = prepare_hmm_data(keypoints_dir, assessments, action_type, config, pitch_refs)
+    if data is not None:
+        X, lengths = data
+        model = train_hmm(X, lengths=lengths)
         if model:
             logging.info("HMM model trained successfully")
@@ -1,29 +1,41 @@
-import numpy as np
-from scipy.ndimage import uniform_filter1d
 import logging
+from core.smoothing import smooth_array
+from core.rotation import IMAGE_PLANE, adjust_landmark_dict
+from utils.keypoint_sequence import KeypointSequence
 
 logging.basicConfig(level=logging.INFO)
 
-def smooth_keypoints(keypoints):
+def smooth_keypoints(keypoints, window_size=5, method=None, config=None):
     """
-    Smooth keypoint coordinates using uniform filter.
+    Smooth keypoint coordinates across frames (see core.smoothing.smooth_array).
+    Args:
+        keypoints: KeypointSequence or list of keypoint dictionaries.
+        window_size: Smoothing window in frames.
+        method: 'uniform', 'savgol' or 'one_euro'; defaults to config "smoothing_method" or 'uniform'.
+        config: Configuration parameters (smoothing_method, smoothing_visibility_weighted,
+            smoothing_max_gap, smoothing_polyorder, one_euro_min_cutoff, one_euro_beta).
+    Returns:
+        Smoothed KeypointSequence.
     """
-    smoothed = []
-    for frame in keypoints:
-        kp = frame.get("keypoints", {})
-        smoothed_frame = {}
-        for lm in kp:
-            smoothed_frame[lm] = {
-                "x": uniform_filter1d([kp[lm]["x"]], size=5)[0],
-                "y": uniform_filter1d([kp[lm]["y"]], size=5)[0],
-                "visibility": kp[lm]["visibility"]
-            }
-        smoothed.append({"keypoints": smoothed_frame})
-    return smoothed
+    config = config or {}
+    seq = KeypointSequence.from_frames(keypoints)
+    smoothed = smooth_array(
+        seq.array,
+        seq.mask,
+        method=method or config.get("smoothing_method", "uniform"),
+        window_size=window_size,
+        visibility_weighted=config.get("smoothing_visibility_weighted", True),
+        max_gap=config.get("smoothing_max_gap"),
+        polyorder=config.get("smoothing_polyorder", 2),
+        fps=seq.fps or config.get("fps", 30.0),
+        min_cutoff=config.get("one_euro_min_cutoff", 1.0),
+        beta=config.get("one_euro_beta", 0.0)
+    )
+    return KeypointSequence(smoothed, seq.mask, seq.header)
 
 def adjust_keypoints(keypoints, pitch_angle):
     """
-    Adjust keypoints for pitch angle rotation.
+    Adjust keypoints for pitch angle rotation in the image plane (see core.rotation).
     Args:
         keypoints: Dict of landmarks.
         pitch_angle: Angle in degrees.
@@ -34,21 +46,8 @@ def adjust_keypoints(keypoints, pitch_angle):
         logging.warning("No keypoints to adjust")
         return keypoints
     
-    adjusted = {}
     try:
-        angle_rad = np.radians(pitch_angle)
-        cos_a = np.cos(angle_rad)
-        sin_a = np.sin(angle_rad)
-        for lm, data in keypoints.items():
-            x, y = data["x"], data["y"]
-            x_new = x * cos_a + y * sin_a
-            y_new = -x * sin_a + y * cos_a
-            adjusted[lm] = {
-                "x": x_new,
-                "y": y_new,
-                "visibility": data.get("visibility", 0)
-            }
-        return adjusted
+        return adjust_landmark_dict(keypoints, pitch_angle, IMAGE_PLANE, include_z=False)
     except Exception as e:
         logging.error(f"Failed to adjust keypoints: {e}")
         return keypoints
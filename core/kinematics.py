@@ -0,0 +1,158 @@
+import numpy as np
+import logging
+from utils.keypoint_sequence import KeypointSequence
+from utils.feature_cache import video_features
+from utils.angle_utils import joint_angles
+
+logging.basicConfig(level=logging.INFO)
+
+# Bump when kinematics output changes so cached arrays are recomputed
+KINEMATICS_VERSION = 1
+KINEMATICS_CONFIG_FIELDS = ("visibility_threshold", "kinematics_stencil", "kinematics_use_z", "kinematics_fps")
+
+# Finite-difference stencils as {derivative order: (frame offsets, coefficients)}, in units of 1/dt**order.
+# Frames whose footprint leaves the sequence or touches a missing/low-visibility frame are marked invalid.
+STENCILS = {
+    "backward": {1: ((-1, 0), (-1.0, 1.0)), 2: ((-2, -1, 0), (1.0, -2.0, 1.0))},
+    "central": {1: ((-1, 1), (-0.5, 0.5)), 2: ((-1, 0, 1), (1.0, -2.0, 1.0))},
+    "five_point": {
+        1: ((-2, -1, 1, 2), (1 / 12, -8 / 12, 8 / 12, -1 / 12)),
+        2: ((-2, -1, 0, 1, 2), (-1 / 12, 16 / 12, -30 / 12, 16 / 12, -1 / 12)),
+    },
+}
+
+# Three-point joint angles (a-b-c, angle at b) on MediaPipe Pose landmarks
+JOINT_ANGLES = {
+    "left_elbow": (11, 13, 15),
+    "right_elbow": (12, 14, 16),
+    "left_knee": (23, 25, 27),
+    "right_knee": (24, 26, 28),
+}
+# Segment angles: trunk lean from vertical, and hip-shoulder separation in the transverse (x-z) plane
+SEGMENT_ANGLES = ("trunk_lean", "hip_shoulder_separation")
+ANGLE_NAMES = tuple(JOINT_ANGLES) + SEGMENT_ANGLES
+
+LEFT_SHOULDER, RIGHT_SHOULDER, LEFT_HIP, RIGHT_HIP = 11, 12, 23, 24
+
+
+def finite_difference(values, valid, dt, order=1, stencil="central"):
+    """
+    Time derivative of a whole trajectory array with one stencil pass.
+    Args:
+        values: Array (frames, ...) of positions.
+        valid: Boolean array (frames, ...) matching values' leading dims; False samples poison their stencil.
+        dt: Seconds between frames.
+        order: 1 (velocity) or 2 (acceleration).
+        stencil: Name in STENCILS.
+    Returns:
+        Tuple of (derivative array like values, validity mask like valid).
+    """
+    if stencil not in STENCILS:
+        raise ValueError(f"Unknown stencil {stencil!r}; expected one of {tuple(STENCILS)}")
+    offsets, coeffs = STENCILS[stencil][order]
+    n = len(values)
+    lo, hi = max(0, -min(offsets)), min(n, n - max(offsets))
+    out = np.zeros(values.shape, dtype=np.float64)
+    out_valid = np.zeros(valid.shape, dtype=bool)
+    if hi <= lo:
+        return out, out_valid
+    out_valid[lo:hi] = True
+    for offset, coeff in zip(offsets, coeffs):
+        out[lo:hi] += coeff * values[lo + offset:hi + offset]
+        out_valid[lo:hi] &= valid[lo + offset:hi + offset]
+    out /= dt ** order
+    out[~out_valid] = 0.0
+    return out, out_valid
+
+
+def joint_angle_matrix(coords, landmark_valid, use_z=False):
+    """
+    Joint and segment angles for every frame.
+    Args:
+        coords: (frames, 33, 3) x/y/z array.
+        landmark_valid: (frames, 33) visibility/detection mask.
+        use_z: Use x/y/z for the three-point joint angles instead of the image plane.
+    Returns:
+        Tuple of ((frames, len(ANGLE_NAMES)) angles in degrees, matching validity mask).
+    """
+    n = len(coords)
+    angles = np.zeros((n, len(ANGLE_NAMES)))
+    valid = np.zeros((n, len(ANGLE_NAMES)), dtype=bool)
+    for k, (a, b, c) in enumerate(JOINT_ANGLES.values()):
+        angles[:, k], ok = joint_angles(coords[:, a], coords[:, b], coords[:, c], use_z)
+        valid[:, k] = ok & landmark_valid[:, a] & landmark_valid[:, b] & landmark_valid[:, c]
+
+    torso_valid = landmark_valid[:, [LEFT_SHOULDER, RIGHT_SHOULDER, LEFT_HIP, RIGHT_HIP]].all(axis=1)
+    shoulder_mid = (coords[:, LEFT_SHOULDER] + coords[:, RIGHT_SHOULDER]) / 2
+    hip_mid = (coords[:, LEFT_HIP] + coords[:, RIGHT_HIP]) / 2
+    # Image y grows downwards, so "up" is -y; lean is signed towards +x
+    trunk = shoulder_mid - hip_mid
+    k = len(JOINT_ANGLES)
+    angles[:, k] = np.degrees(np.arctan2(trunk[:, 0], -trunk[:, 1]))
+    valid[:, k] = torso_valid & (np.hypot(trunk[:, 0], trunk[:, 1]) > 0)
+
+    shoulder_line = coords[:, RIGHT_SHOULDER] - coords[:, LEFT_SHOULDER]
+    hip_line = coords[:, RIGHT_HIP] - coords[:, LEFT_HIP]
+    separation = np.arctan2(shoulder_line[:, 2], shoulder_line[:, 0]) - np.arctan2(hip_line[:, 2], hip_line[:, 0])
+    angles[:, k + 1] = np.degrees((separation + np.pi) % (2 * np.pi) - np.pi)
+    valid[:, k + 1] = torso_valid
+    angles[~valid] = 0.0
+    return angles, valid
+
+
+def compute_kinematics(keypoints, config=None):
+    """
+    Kinematics feature bank for a whole sequence in one vectorized pass.
+    Args:
+        keypoints: KeypointSequence or list of keypoint frames.
+        config: Configuration parameters ("visibility_threshold", "kinematics_stencil",
+            "kinematics_use_z", "kinematics_fps" used when the keypoints carry no fps).
+    Returns:
+        Dict of arrays:
+            landmark_valid (frames, 33) bool,
+            velocity / acceleration (frames, 33, 3) float32 in normalized units per second (squared),
+            velocity_valid / acceleration_valid (frames, 33) bool,
+            speed (frames, 33) float32,
+            angles (frames, len(ANGLE_NAMES)) float32 degrees, angle_valid matching bool.
+    """
+    config = config or {}
+    keypoints = KeypointSequence.from_frames(keypoints)
+    stencil = config.get("kinematics_stencil", "central")
+    fps = keypoints.fps or config.get("kinematics_fps", 30.0)
+    dt = 1.0 / fps
+
+    coords = keypoints.coords.astype(np.float64)
+    landmark_valid = keypoints.mask[:, None] & (keypoints.visibility >= config.get("visibility_threshold", 0.6))
+    velocity, velocity_valid = finite_difference(coords, landmark_valid, dt, 1, stencil)
+    acceleration, acceleration_valid = finite_difference(coords, landmark_valid, dt, 2, stencil)
+    angles, angle_valid = joint_angle_matrix(coords, landmark_valid, config.get("kinematics_use_z", False))
+
+    return {
+        "landmark_valid": landmark_valid,
+        "velocity": velocity.astype(np.float32),
+        "velocity_valid": velocity_valid,
+        "speed": np.linalg.norm(velocity, axis=-1).astype(np.float32),
+        "acceleration": acceleration.astype(np.float32),
+        "acceleration_valid": acceleration_valid,
+        "angles": angles.astype(np.float32),
+        "angle_valid": angle_valid,
+    }
+
+
+def video_kinematics(keypoints_dir, video_id, config=None, pitch_ref=None, cache=None):
+    """
+    compute_kinematics() for one stored video, cached next to its other features.
+    Args:
+        keypoints_dir: Directory with keypoint files.
+        video_id: Video identifier.
+        config: Configuration parameters.
+        pitch_ref: Pitch reference applied on load.
+        cache: Optional utils.feature_cache.FeatureCache.
+    Returns:
+        Dict of arrays as returned by compute_kinematics().
+    """
+    return video_features(
+        keypoints_dir, video_id, lambda keypoints: compute_kinematics(keypoints, config),
+        "kinematics", KINEMATICS_VERSION, config, KINEMATICS_CONFIG_FIELDS, pitch_ref, cache,
+        (config or {}).get("keypoints_prefix", "bowling_analysis")
+    )
@@ -0,0 +1,77 @@
+import numpy as np
+import logging
+
+logging.basicConfig(level=logging.INFO)
+
+# Axis conventions (MediaPipe normalized coordinates: x right, y down, z towards the camera's depth):
+#   IMAGE_PLANE: rotation about the optical (Z) axis in the X-Y plane, z unchanged.
+#                x' = x*cos + y*sin, y' = -x*sin + y*cos
+#   CAMERA_TILT: rotation about the X axis in the Y-Z plane (camera pitch), x unchanged.
+#                y' = y*cos - z*sin, z' = y*sin + z*cos
+IMAGE_PLANE = "image_plane"
+CAMERA_TILT = "camera_tilt"
+ROTATION_AXES = (IMAGE_PLANE, CAMERA_TILT)
+
+
+def rotation_matrix(pitch_angle, axis=CAMERA_TILT):
+    """
+    Build the 3x3 camera-correction matrix R so that corrected = R @ [x, y, z].
+    Args:
+        pitch_angle: Angle in degrees.
+        axis: IMAGE_PLANE or CAMERA_TILT.
+    Returns:
+        (3, 3) float64 rotation matrix.
+    """
+    theta = np.radians(pitch_angle)
+    c, s = np.cos(theta), np.sin(theta)
+    if axis == IMAGE_PLANE:
+        return np.array([[c, s, 0.0], [-s, c, 0.0], [0.0, 0.0, 1.0]])
+    if axis == CAMERA_TILT:
+        return np.array([[1.0, 0.0, 0.0], [0.0, c, -s], [0.0, s, c]])
+    raise ValueError(f"Unknown rotation axis {axis!r}; expected one of {ROTATION_AXES}")
+
+
+def rotate_keypoints(array, pitch_angle, axis=CAMERA_TILT, in_place=False):
+    """
+    Rotate the x/y/z channels of a whole keypoint array with one matrix multiply.
+    Visibility (and any channel past z) is left untouched; undetected frames
+    stored as zeros stay zero.
+    Args:
+        array: Keypoint array (..., landmarks, 4) or (..., 3).
+        pitch_angle: Angle in degrees, or a precomputed (3, 3) matrix from rotation_matrix().
+        axis: IMAGE_PLANE or CAMERA_TILT (ignored when a matrix is given).
+        in_place: Write into array instead of returning a copy; array must be writable.
+    Returns:
+        Rotated array (the input itself when in_place=True).
+    """
+    matrix = np.asarray(pitch_angle) if np.ndim(pitch_angle) == 2 else rotation_matrix(pitch_angle, axis)
+    out = array if in_place else np.array(array, copy=True)
+    coords = out[..., :3]
+    np.matmul(coords, matrix.T.astype(out.dtype, copy=False), out=coords)
+    return out
+
+
+def adjust_landmark_dict(keypoints, pitch_angle, axis, include_z=True):
+    """
+    Rotate one frame of legacy {"landmark_i": {x, y, z, visibility}} keypoints.
+    Kept for callers that still work on per-frame dicts; whole sequences
+    should use rotate_keypoints().
+    Args:
+        keypoints: Dict of landmarks.
+        pitch_angle: Angle in degrees.
+        axis: IMAGE_PLANE or CAMERA_TILT.
+        include_z: Include z in the returned landmark dicts.
+    Returns:
+        Adjusted keypoints dict.
+    """
+    keys = list(keypoints)
+    values = keypoints.values()
+    coords = np.array([[lm.get("x", 0), lm.get("y", 0), lm.get("z", 0)] for lm in values], dtype=np.float64)
+    rotated = coords @ rotation_matrix(pitch_angle, axis).T
+    adjusted = {}
+    for key, lm, (x, y, z) in zip(keys, values, rotated.tolist()):
+        adjusted[key] = {"x": x, "y": y}
+        if include_z:
+            adjusted[key]["z"] = z
+        adjusted[key]["visibility"] = float(lm.get("visibility", 0))
+    return adjusted
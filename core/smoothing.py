@@ -0,0 +1,142 @@
+import numpy as np
+import logging
+from scipy.signal import savgol_filter
+
+logging.basicConfig(level=logging.INFO)
+
+SMOOTHING_METHODS = ("uniform", "savgol", "one_euro")
+
+
+def detected_segments(mask, max_gap):
+    """
+    Group detected frames into segments, bridging gaps of at most max_gap missing frames.
+    Args:
+        mask: Per-frame detection mask.
+        max_gap: Longest run of missing frames that does not split a segment.
+    Returns:
+        Tuple of (starts, ends) inclusive frame indices per segment.
+    """
+    detected = np.flatnonzero(mask)
+    if not len(detected):
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+    breaks = np.flatnonzero(np.diff(detected) > max_gap + 1)
+    return detected[np.r_[0, breaks + 1]], detected[np.r_[breaks, len(detected) - 1]]
+
+
+def _interpolate_gaps(coords, mask):
+    """Linearly interpolate missing frames between detected neighbours (edges are held)."""
+    n = len(coords)
+    idx = np.arange(n)
+    prev = np.maximum.accumulate(np.where(mask, idx, -1))
+    nxt = np.minimum.accumulate(np.where(mask, idx, n)[::-1])[::-1]
+    prev_c = np.where(prev < 0, nxt, prev).clip(0, n - 1)
+    next_c = np.where(nxt >= n, prev_c, nxt).clip(0, n - 1)
+    span = np.maximum(next_c - prev_c, 1)
+    t = ((idx - prev_c) / span).clip(0, 1)[:, None, None]
+    filled = coords[prev_c] + (coords[next_c] - coords[prev_c]) * t
+    return np.where(mask[:, None, None], coords, filled)
+
+
+def _uniform(coords, weights, mask, window_size, max_gap):
+    n = len(coords)
+    half = window_size // 2
+    starts, ends = detected_segments(mask, max_gap)
+    if not len(starts):
+        return coords
+    seg = np.searchsorted(starts, np.arange(n), side="right") - 1
+    seg = seg.clip(0, len(starts) - 1)
+    lo = np.maximum(np.arange(n) - half, starts[seg])
+    hi = np.minimum(np.arange(n) + half, ends[seg]).clip(min=lo)
+
+    w = weights.astype(np.float64)
+    csum_x = np.zeros((n + 1,) + coords.shape[1:], dtype=np.float64)
+    csum_w = np.zeros((n + 1,) + w.shape[1:], dtype=np.float64)
+    np.cumsum(coords * w[..., None], axis=0, out=csum_x[1:])
+    np.cumsum(w, axis=0, out=csum_w[1:])
+    num = csum_x[hi + 1] - csum_x[lo]
+    den = (csum_w[hi + 1] - csum_w[lo])[..., None]
+    return np.where(den > 0, num / np.where(den > 0, den, 1), coords)
+
+
+def _savgol(coords, mask, window_size, polyorder, max_gap):
+    out = coords.copy()
+    filled = _interpolate_gaps(coords, mask)
+    for start, end in zip(*detected_segments(mask, max_gap)):
+        length = end - start + 1
+        window = min(window_size, length if length % 2 else length - 1)
+        if window <= polyorder:
+            continue
+        out[start:end + 1] = savgol_filter(filled[start:end + 1], window, polyorder, axis=0)
+    return out
+
+
+def _one_euro(coords, mask, fps, min_cutoff, beta, d_cutoff, max_gap):
+    out = coords.copy()
+    filled = _interpolate_gaps(coords, mask)
+    te = 1.0 / fps
+
+    def alpha(cutoff):
+        tau = 1.0 / (2 * np.pi * cutoff)
+        return 1.0 / (1.0 + tau / te)
+
+    a_d = alpha(d_cutoff)
+    x_hat = np.empty(coords.shape[1:])
+    dx_hat = np.empty(coords.shape[1:])
+    for start, end in zip(*detected_segments(mask, max_gap)):
+        x_hat[:] = filled[start]
+        dx_hat[:] = 0.0
+        out[start] = x_hat
+        for t in range(start + 1, end + 1):
+            dx = (filled[t] - x_hat) * fps
+            dx_hat += a_d * (dx - dx_hat)
+            a = alpha(min_cutoff + beta * np.abs(dx_hat))
+            x_hat += a * (filled[t] - x_hat)
+            out[t] = x_hat
+    return out
+
+
+def smooth_array(array, mask=None, method="uniform", window_size=5, visibility_weighted=True,
+                 max_gap=None, polyorder=2, fps=30.0, min_cutoff=1.0, beta=0.0, d_cutoff=1.0,
+                 smooth_visibility=False):
+    """
+    Temporally smooth a whole keypoint sequence in one batched call.
+    Frames without a detection never contribute to, or receive, smoothed
+    values. Gaps of up to max_gap missing frames are bridged; longer gaps
+    split the sequence into independently smoothed segments.
+    Args:
+        array: Keypoint array (frames, landmarks, 4) with x, y, z, visibility.
+        mask: Per-frame detection mask; defaults to all frames detected.
+        method: 'uniform' (moving average), 'savgol' (Savitzky-Golay) or 'one_euro'.
+        window_size: Window length in frames for 'uniform' and 'savgol'.
+        visibility_weighted: Weight 'uniform' averages by landmark visibility.
+        max_gap: Longest bridged gap in frames; defaults to window_size.
+        polyorder: Polynomial order for 'savgol'.
+        fps, min_cutoff, beta, d_cutoff: One-Euro filter parameters.
+        smooth_visibility: Also apply a moving average to the visibility channel.
+    Returns:
+        New float32 array of the same shape.
+    """
+    if method not in SMOOTHING_METHODS:
+        raise ValueError(f"Unknown smoothing method {method!r}; expected one of {SMOOTHING_METHODS}")
+    array = np.asarray(array)
+    mask = np.ones(len(array), dtype=bool) if mask is None else np.asarray(mask, dtype=bool)
+    max_gap = window_size if max_gap is None else max_gap
+    out = np.array(array, dtype=np.float32)
+    if not mask.any():
+        return out
+
+    coords = array[..., :3].astype(np.float64)
+    visibility = array[..., 3].astype(np.float64)
+    if method == "uniform":
+        weights = mask[:, None] * (visibility if visibility_weighted else np.ones_like(visibility))
+        smoothed = _uniform(coords, weights, mask, window_size, max_gap)
+    elif method == "savgol":
+        smoothed = _savgol(coords, mask, window_size, polyorder, max_gap)
+    else:
+        smoothed = _one_euro(coords, mask, fps, min_cutoff, beta, d_cutoff, max_gap)
+
+    out[mask, :, :3] = smoothed[mask]
+    if smooth_visibility:
+        vis_weights = np.broadcast_to(mask[:, None], visibility.shape)
+        out[mask, :, 3] = _uniform(visibility[..., None], vis_weights, mask, window_size, max_gap)[mask, :, 0]
+    return out
@@ -0,0 +1,179 @@
+import math
+import logging
+import numpy as np
+from utils.keypoint_sequence import NUM_LANDMARKS, CHANNELS
+
+logging.basicConfig(level=logging.INFO)
+
+STREAM_FEATURES = (
+    "shoulder_x", "shoulder_y",
+    "elbow_x", "elbow_y",
+    "distal_x", "distal_y",  # Elbow, or wrist when the wrist fallback is used
+    "elbow_angle",
+    "used_wrist",
+)
+
+
+class StreamingSmoother:
+    """
+    Causal moving average over the last window_size frames.
+    Keeps a fixed ring buffer and running weighted sums, so each push is
+    O(landmarks) regardless of window size; results are written into the
+    preallocated buffers with out= arithmetic (only slice views are created).
+    """
+
+    def __init__(self, window_size=5, visibility_weighted=True, resync_interval=1024):
+        """
+        Args:
+            window_size: Number of past frames averaged (including the current one).
+            visibility_weighted: Weight frames by landmark visibility.
+            resync_interval: Recompute running sums from the buffer every N frames to bound float drift.
+        """
+        self.window_size = window_size
+        self.visibility_weighted = visibility_weighted
+        self.resync_interval = resync_interval
+        self._coords = np.zeros((window_size, NUM_LANDMARKS, 3))
+        self._weights = np.zeros((window_size, NUM_LANDMARKS))
+        self._weighted = np.zeros((window_size, NUM_LANDMARKS, 3))
+        self._sum_x = np.zeros((NUM_LANDMARKS, 3))
+        self._sum_w = np.zeros((NUM_LANDMARKS, 1))
+        self._safe_w = np.zeros((NUM_LANDMARKS, 1))
+        self.output = np.zeros((NUM_LANDMARKS, len(CHANNELS)), dtype=np.float32)
+        self.reset()
+
+    def reset(self):
+        self._coords.fill(0.0)
+        self._weights.fill(0.0)
+        self._weighted.fill(0.0)
+        self._sum_x.fill(0.0)
+        self._sum_w.fill(0.0)
+        self.output.fill(0.0)
+        self._slot = 0
+        self.frames = 0
+
+    def push(self, frame=None):
+        """
+        Add one frame and return the smoothed frame.
+        Args:
+            frame: (33, 4) x/y/z/visibility array, or None when no pose was detected.
+        Returns:
+            (33, 4) float32 view, overwritten by the next push. Visibility is passed through.
+        """
+        slot = self._slot
+        self._sum_x -= self._weighted[slot]
+        self._sum_w[:, 0] -= self._weights[slot]
+
+        if frame is None:
+            self._weights[slot].fill(0.0)
+            self._weighted[slot].fill(0.0)
+            self.output[:, 3] = 0.0
+        else:
+            self._coords[slot] = frame[:, :3]
+            if self.visibility_weighted:
+                self._weights[slot] = frame[:, 3]
+            else:
+                self._weights[slot].fill(1.0)
+            np.multiply(self._coords[slot], self._weights[slot][:, None], out=self._weighted[slot])
+            self._sum_x += self._weighted[slot]
+            self._sum_w[:, 0] += self._weights[slot]
+            self.output[:, 3] = frame[:, 3]
+
+        self.frames += 1
+        self._slot = (slot + 1) % self.window_size
+        if self.frames % self.resync_interval == 0:
+            np.sum(self._weighted, axis=0, out=self._sum_x)
+            np.sum(self._weights, axis=0, out=self._sum_w[:, 0])
+
+        np.maximum(self._sum_w, 1e-12, out=self._safe_w)
+        np.divide(self._sum_x, self._safe_w, out=self.output[:, :3], casting="unsafe")
+        return self.output
+
+
+class StreamingFeatureUpdater:
+    """
+    Per-frame elbow features for live capture, matching core.feature_extraction.
+    push(frame) smooths the frame causally and writes the features element by
+    element into a preallocated vector laid out as STREAM_FEATURES.
+    """
+
+    def __init__(self, config=None, smoother=None):
+        """
+        Args:
+            config: Configuration parameters (visibility thresholds, landmarks, elbow angle range).
+            smoother: Optional StreamingSmoother; defaults to a window of config "frame_window_size".
+        """
+        self.config = config or {}
+        landmarks = self.config.get("landmarks", {}).get("elbow_angle", {})
+        self.shoulder = landmarks.get("shoulder", 11)
+        self.elbow = landmarks.get("elbow", 13)
+        self.wrist = landmarks.get("wrist", 14)
+        self.visibility_threshold = self.config.get("visibility_threshold", 0.6)
+        self.wrist_visibility_threshold = self.config.get("wrist_visibility_threshold", 0.6)
+        self.angle_min = self.config.get("elbow_angle_min", 90)
+        self.angle_max = self.config.get("elbow_angle_max", 180)
+        self.smoother = smoother or StreamingSmoother(self.config.get("frame_window_size", 3))
+        self.features = np.zeros(len(STREAM_FEATURES), dtype=np.float32)
+
+    def reset(self):
+        self.smoother.reset()
+        self.features.fill(0.0)
+
+    def push(self, frame=None):
+        """
+        Args:
+            frame: (33, 4) x/y/z/visibility array, or None when no pose was detected.
+        Returns:
+            Feature vector (STREAM_FEATURES), overwritten by the next push.
+        """
+        features = self.features
+        kp = self.smoother.push(frame)
+        if frame is None:
+            features.fill(0.0)
+            return features
+
+        item = kp.item
+        sv, ev, wv = item(self.shoulder, 3), item(self.elbow, 3), item(self.wrist, 3)
+        threshold = self.visibility_threshold
+
+        if sv >= threshold and ev >= threshold:
+            distal = self.elbow
+            angle = 0.0
+            if wv >= threshold:
+                angle = self._angle_at(item, self.elbow)
+            features[7] = 0.0
+        elif sv >= threshold and wv >= threshold:
+            distal = self.wrist
+            angle = 0.0
+            if sv >= self.wrist_visibility_threshold and wv >= self.wrist_visibility_threshold:
+                # Elbow approximated at the shoulder-wrist midpoint, as in compute_wrist_fallback_angle
+                angle = self._angle_at(item, None)
+                if angle < self.angle_min or angle > self.angle_max:
+                    angle = 0.0
+            features[7] = 1.0
+        else:
+            features.fill(0.0)
+            return features
+        features[0] = item(self.shoulder, 0)
+        features[1] = item(self.shoulder, 1)
+        features[2] = item(self.elbow, 0)
+        features[3] = item(self.elbow, 1)
+        features[4] = item(distal, 0)
+        features[5] = item(distal, 1)
+        features[6] = angle
+        return features
+
+    def _angle_at(self, item, vertex):
+        """Shoulder-vertex-wrist angle; vertex None uses the shoulder-wrist midpoint."""
+        sx, sy = item(self.shoulder, 0), item(self.shoulder, 1)
+        wx, wy = item(self.wrist, 0), item(self.wrist, 1)
+        if vertex is None:
+            vx, vy = (sx + wx) / 2, (sy + wy) / 2
+        else:
+            vx, vy = item(vertex, 0), item(vertex, 1)
+        return _angle(sx - vx, sy - vy, wx - vx, wy - vy)
+
+def _angle(ax, ay, bx, by):
+    norms = math.hypot(ax, ay) * math.hypot(bx, by)
+    if norms == 0:
+        return 0.0
+    return math.degrees(math.acos(max(-1.0, min(1.0, (ax * bx + ay * by) / norms))))
@@ -2,19 +2,22 @@ import os
 import numpy as np
 import logging
 from hmmlearn import hmm
-from core.feature_extraction import extract_features
+from core.feature_extraction import video_elbow_features
+from core.hmm_training import train_hmm_restarts
+from utils.keypoint_store import keypoints_file
 
 logging.basicConfig(level=logging.INFO)
 
-def train_hmm(keypoints_dir, assessments, action_type, pitch_angles, config=None):
+def train_hmm(keypoints_dir, assessments, action_type, pitch_angles, config=None, cache=None):
     """
     Train HMM to detect BFC, FFC, UAH, and Release frames.
     Args:
-        keypoints_dir (str): Directory with keypoint JSONs.
+        keypoints_dir (str): Directory with keypoint files.
         assessments (dict): Dict of video assessments from training_labels.json or bowliverse.db.
         action_type (str): 'fast' or 'spin'.
         pitch_angles (dict): Pitch angle data for each video.
-        config (dict): Configuration parameters (e.g., n_components, n_iter).
+        config (dict): Configuration parameters (e.g., n_components, n_iter, hmm_restarts, hmm_workers).
+        cache (FeatureCache): Optional feature cache shared with prepare_hmm_data.
     Returns:
         Trained HMM model or None if training fails.
     """
@@ -35,18 +38,20 @@ def train_hmm(keypoints_dir, assessments, action_type, pitch_angles, config=None
 
     # Collect features for all videos
     for video_id, labels in assessments.items():
-        keypoint_file = os.path.join(keypoints_dir, f"{config.get('keypoints_prefix', 'bowling_analysis')}_{video_id}.json")
+        keypoint_file = keypoints_file(keypoints_dir, video_id, config.get('keypoints_prefix', 'bowling_analysis'))
         if not os.path.exists(keypoint_file):
             logging.warning(f"Missing keypoints for {video_id}")
             continue
 
-        # Extract features with pitch adjustment
-        features, _, elbow_angles, _ = extract_features(keypoint_file, action_type, pitch_angles.get(video_id, 0))
+        # Pitch correction is applied on load
+        pitch_angle = pitch_angles.get(video_id)
+        pitch_ref = {"pitch_angle": pitch_angle} if pitch_angle is not None else None
+        features, elbow_angles, _ = video_elbow_features(keypoints_dir, video_id, config, pitch_ref, cache)
         if features is None or len(features) == 0:
             logging.warning(f"No valid features for {video_id}")
             continue
 
-        X_hmm.extend(features)
+        X_hmm.append(features)
         lengths.append(len(features))
         logging.info(f"Processed {video_id}: {len(features)} frames")
 
@@ -56,9 +61,16 @@ def train_hmm(keypoints_dir, assessments, action_type, pitch_angles, config=None
 
     # Train HMM
     try:
-        X_array = np.array(X_hmm)
+        X_array = np.concatenate(X_hmm)
+        if config.get("hmm_restarts", 1) > 1:
+            # Parallel restarts scored on held-out videos; keeps the best
+            model, _ = train_hmm_restarts(
+                X_array, lengths, config["hmm_restarts"], config.get("hmm_workers"),
+                n_components, n_iter, config.get("hmm_holdout_fraction", 0.2), random_state
+            )
+            return model
         model.fit(X_array, lengths)
-        logging.info(f"HMM trained with {n_components} components, {len(X_hmm)} total frames")
+        logging.info(f"HMM trained with {n_components} components, {len(X_array)} total frames")
         return model
     except Exception as e:
         logging.error(f"HMM training failed: {e}")
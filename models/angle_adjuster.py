@@ -1,9 +1,29 @@
 import numpy as np
 import logging
 from sklearn.linear_model import LinearRegression
+from core.feature_extraction import elbow_landmarks
+from utils.keypoint_sequence import KeypointSequence
+from utils.feature_cache import array_sha256
 
 logging.basicConfig(level=logging.INFO)
 
+# Input features: image x/y of the shoulder, elbow and wrist landmarks of the key frame
+ANGLE_FEATURE_NAMES = ("shoulder_x", "shoulder_y", "elbow_x", "elbow_y", "wrist_x", "wrist_y")
+
+def angle_features(array, frames, config=None):
+    """
+    AngleAdjuster inputs (ANGLE_FEATURE_NAMES) for many frames with one gather.
+    Args:
+        array: (frames, 33, 4) keypoint array; several videos can be concatenated.
+        frames: Index array of rows to featurize.
+        config: Configuration parameters (elbow_angle landmark indices).
+    Returns:
+        (len(frames), 6) float64 array.
+    """
+    landmarks = list(elbow_landmarks(config))
+    frames = np.asarray(frames, dtype=np.int64)
+    return np.asarray(array[frames][:, landmarks, :2], dtype=np.float64).reshape(len(frames), len(ANGLE_FEATURE_NAMES))
+
 class AngleAdjuster:
     def __init__(self, action_type, config=None):
         """
@@ -25,35 +45,37 @@ class AngleAdjuster:
         """
         try:
             self.model.fit(X, y)
+            self.training_hash = array_sha256(np.asarray(X), np.asarray(y))
             logging.info(f"AngleAdjuster trained for {self.action_type}")
         except Exception as e:
             logging.error(f"Failed to train AngleAdjuster: {e}")
     
-    def predict(self, keypoints, frame_idx):
+    def predict(self, keypoints, frames):
         """
-        Predict adjusted elbow angle for a specific frame.
+        Predict adjusted elbow angles for many frames in one model call.
         Args:
-            keypoints: List of keypoint dictionaries.
-            frame_idx: Index of the frame to analyze.
+            keypoints: KeypointSequence, list of keypoint dictionaries or (frames, 33, 4)
+                array (videos may be concatenated, with frames indexing the combined rows).
+            frames: Frame index, or index array (e.g. key frames or a whole delivery window).
         Returns:
-            Adjusted elbow angle.
+            Adjusted angle (float) for a scalar index, else an array aligned with frames;
+            out-of-range or undetected frames get 0.0.
         """
+        scalar = np.ndim(frames) == 0
+        frames = np.atleast_1d(np.asarray(frames, dtype=np.int64))
+        angles = np.zeros(len(frames))
         try:
-            if frame_idx >= len(keypoints) or frame_idx < 0 or not keypoints[frame_idx]:
-                logging.warning(f"Invalid frame index {frame_idx}")
-                return 0.0
-            
-            kp = keypoints[frame_idx].get("keypoints", {})
-            features = []
-            for i in range(33):
-                lm = f"landmark_{i}"
-                features.extend([
-                    kp.get(lm, {"x": 0})["x"],
-                    kp.get(lm, {"y": 0})["y"],
-                    kp.get(lm, {"visibility": 0})["visibility"]
-                ])
-            features = np.array([features])
-            return float(self.model.predict(features)[0])
+            if isinstance(keypoints, np.ndarray):
+                array, mask = keypoints, np.ones(len(keypoints), dtype=bool)
+            else:
+                seq = KeypointSequence.from_frames(keypoints)
+                array, mask = seq.array, seq.mask
+            valid = (frames >= 0) & (frames < len(array))
+            valid[valid] &= mask[frames[valid]]
+            if not valid.all():
+                logging.warning(f"Invalid frame indices {frames[~valid].tolist()}")
+            if valid.any():
+                angles[valid] = self.model.predict(angle_features(array, frames[valid], self.config))
         except Exception as e:
             logging.error(f"AngleAdjuster prediction failed: {e}")
-            return 0.0
+        return float(angles[0]) if scalar else angles
@@ -0,0 +1,229 @@
+import os
+import json
+import struct
+import logging
+import numpy as np
+from core.feature_extraction import LANDMARK_FEATURE_NAMES
+from utils.alignment_data import descriptor_names
+from models.frame_detector import FrameDetector
+from models.angle_adjuster import AngleAdjuster, ANGLE_FEATURE_NAMES
+from models.biomechanics_refiner import BiomechanicsRefiner
+from models.forest_engine import forest_arrays, sklearn_forest, node_table, NODE_DTYPE
+
+logging.basicConfig(level=logging.INFO)
+
+ARTIFACT_EXTENSION = ".bvm"
+ARTIFACT_MAGIC = b"BVMODEL\x00"
+ARTIFACT_VERSION = 2
+# Version 1 stored forests as flat global node tables; still readable
+READABLE_VERSIONS = (1, ARTIFACT_VERSION)
+_HEADER_LEN = struct.Struct("<I")
+_ALIGNMENT = 64
+
+# Model kind -> (wrapper class, input feature names or a function of the model's config returning them)
+ARTIFACT_KINDS = {
+    "frame_detector": (FrameDetector, LANDMARK_FEATURE_NAMES),
+    "angle_adjuster": (AngleAdjuster, ANGLE_FEATURE_NAMES),
+    "biomechanics_refiner": (BiomechanicsRefiner, descriptor_names),
+}
+
+
+def write_artifact(path, arrays, header):
+    """
+    Write named arrays to the model artifact format.
+    Layout: magic, little-endian uint32 header length, JSON header padded to a
+    64-byte boundary, then every array's raw little-endian bytes, each starting
+    on a 64-byte boundary. The header records each array's dtype, shape and
+    offset from the start of the data section.
+    Args:
+        path: Output path (conventionally <kind>_<action_type>.bvm).
+        arrays: Dict of name to numpy array.
+        header: JSON-serializable metadata.
+    """
+    arrays = {name: np.ascontiguousarray(a, dtype=np.asarray(a).dtype.newbyteorder("<")) for name, a in arrays.items()}
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        layout[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset += array.nbytes + (-array.nbytes % _ALIGNMENT)
+    header = dict(header, version=ARTIFACT_VERSION, arrays=layout)
+    header_bytes = json.dumps(header).encode("utf-8")
+    prefix_len = len(ARTIFACT_MAGIC) + _HEADER_LEN.size
+    header_bytes += b" " * (-(prefix_len + len(header_bytes)) % _ALIGNMENT)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(ARTIFACT_MAGIC)
+        f.write(_HEADER_LEN.pack(len(header_bytes)))
+        f.write(header_bytes)
+        for array in arrays.values():
+            f.write(array.tobytes())
+            f.write(b"\x00" * (-array.nbytes % _ALIGNMENT))
+    os.replace(tmp_path, path)
+
+
+def read_artifact(path, mmap=True):
+    """
+    Read a model artifact.
+    Args:
+        path: Path to .bvm file.
+        mmap: Memory-map the arrays (read-only, shared between processes) instead of reading them.
+    Returns:
+        Tuple of (dict of name to array, header).
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(ARTIFACT_MAGIC)) != ARTIFACT_MAGIC:
+            raise ValueError(f"{path} is not a model artifact")
+        (header_len,) = _HEADER_LEN.unpack(f.read(_HEADER_LEN.size))
+        header = json.loads(f.read(header_len).decode("utf-8"))
+    if header.get("version") not in READABLE_VERSIONS:
+        raise ValueError(f"Unsupported model artifact version {header.get('version')} in {path}")
+
+    data_offset = len(ARTIFACT_MAGIC) + _HEADER_LEN.size + header_len
+    arrays = {}
+    with open(path, 'rb') as f:
+        for name, spec in header["arrays"].items():
+            shape = tuple(spec["shape"])
+            count = int(np.prod(shape))
+            if mmap and count > 0:
+                arrays[name] = np.memmap(path, dtype=spec["dtype"], mode='r', offset=data_offset + spec["offset"], shape=shape)
+            else:
+                f.seek(data_offset + spec["offset"])
+                arrays[name] = np.fromfile(f, dtype=spec["dtype"], count=count).reshape(shape)
+    return arrays, header
+
+
+def _v1_forest_arrays(arrays):
+    """Convert version 1 flat node tables (global child ids, -1 for leaves) to forest_arrays() layout."""
+    offsets = np.asarray(arrays["tree_offsets"], dtype=np.int64)
+    left = np.asarray(arrays["children_left"], dtype=np.int64)
+    right = np.asarray(arrays["children_right"], dtype=np.int64)
+    leaf = left < 0
+    shift = np.repeat(offsets[:-1], np.diff(offsets))
+    nodes = np.zeros(len(left), dtype=NODE_DTYPE)
+    nodes["left_child"] = np.where(leaf, -1, left - shift)
+    nodes["right_child"] = np.where(leaf, -1, right - shift)
+    nodes["feature"] = np.where(leaf, -2, arrays["feature"])
+    nodes["threshold"] = np.where(leaf, -2.0, arrays["threshold"])
+    depth = np.zeros(len(left), dtype=np.int64)
+    level, frontier = 0, offsets[:-1]
+    while frontier.size:
+        depth[frontier] = level
+        frontier = frontier[left[frontier] >= 0]
+        frontier = np.concatenate([left[frontier], right[frontier]])
+        level += 1
+    return {
+        "tree_offsets": offsets,
+        "nodes": nodes,
+        "values": np.asarray(arrays["leaf_proba"], dtype=np.float64),
+        "max_depth": np.maximum.reduceat(depth, offsets[:-1]) if len(left) else np.zeros(0, dtype=np.int64),
+        "classes": np.asarray(arrays["classes"]),
+    }
+
+
+class LinearArrays:
+    """Linear regression evaluated from exported coefficients."""
+
+    def __init__(self, arrays):
+        self.coef_ = arrays["coef"]
+        self.intercept_ = float(arrays["intercept"][0])
+        self.n_features_in_ = len(self.coef_)
+
+    def predict(self, X):
+        return np.asarray(X, dtype=np.float64) @ self.coef_ + self.intercept_
+
+
+def feature_schema(kind, config=None):
+    """
+    Args:
+        kind: Key of ARTIFACT_KINDS.
+        config: Configuration the model was trained with.
+    Returns:
+        Tuple of input feature names.
+    """
+    names = ARTIFACT_KINDS[kind][1]
+    return tuple(names(config) if callable(names) else names)
+
+
+def _model_kind(model):
+    for kind, (wrapper, _) in ARTIFACT_KINDS.items():
+        if isinstance(model, wrapper):
+            return kind
+    raise TypeError(f"Cannot export {type(model).__name__}; expected one of {[w.__name__ for w, _ in ARTIFACT_KINDS.values()]}")
+
+
+def export_model(model, path):
+    """
+    Export a fitted FrameDetector, BiomechanicsRefiner or AngleAdjuster to a model artifact.
+    Args:
+        model: Fitted model wrapper.
+        path: Output .bvm path.
+    Returns:
+        True if the artifact was written, False if the model is not fitted.
+    """
+    kind = _model_kind(model)
+    feature_names = feature_schema(kind, model.config)
+    if not hasattr(model.model, "n_features_in_"):
+        logging.error(f"Cannot export unfitted {kind}")
+        return False
+    n_features = int(model.model.n_features_in_)
+    if n_features != len(feature_names):
+        raise ValueError(f"{kind} was fitted on {n_features} features, schema has {len(feature_names)}")
+    if kind == "angle_adjuster":
+        arrays = {
+            "coef": np.asarray(model.model.coef_, dtype=np.float64),
+            "intercept": np.array([model.model.intercept_], dtype=np.float64),
+        }
+    else:
+        arrays = forest_arrays(model.model)
+        # Node records are stored as raw bytes; the header keeps their field layout
+        nodes = arrays["nodes"]
+        arrays["nodes"] = np.ascontiguousarray(nodes).view(np.uint8).reshape(len(nodes), nodes.dtype.itemsize)
+        node_dtype = nodes.dtype.descr
+    header = {
+        "kind": kind,
+        "action_type": model.action_type,
+        "feature_names": list(feature_names),
+        "n_features": n_features,
+        "training_hash": getattr(model, "training_hash", None),
+        "config": model.config,
+    }
+    if kind != "angle_adjuster":
+        header["node_dtype"] = node_dtype
+    write_artifact(path, arrays, header)
+    logging.info(f"Exported {kind} for {model.action_type} to {path}")
+    return True
+
+
+def load_model(path, mmap=True):
+    """
+    Load a model wrapper from a model artifact; arrays are memory-mapped by default.
+    Forests are stored in scikit-learn's node layout and rebuilt as scikit-learn
+    estimators (models.forest_engine.sklearn_forest), so inference is the same
+    as with the pickled model.
+    Args:
+        path: Path to .bvm file.
+        mmap: Memory-map the model arrays.
+    Returns:
+        FrameDetector, BiomechanicsRefiner or AngleAdjuster whose .model evaluates
+        the stored arrays; header metadata is kept on .artifact_header.
+    """
+    arrays, header = read_artifact(path, mmap=mmap)
+    kind = header.get("kind")
+    if kind not in ARTIFACT_KINDS:
+        raise ValueError(f"Unknown model kind {kind!r} in {path}")
+    wrapper = ARTIFACT_KINDS[kind][0]
+    if header["feature_names"] != list(feature_schema(kind, header.get("config"))):
+        raise ValueError(f"{path} was exported with a different {kind} feature schema; re-export it")
+    model = wrapper(header["action_type"], header.get("config"))
+    if kind == "angle_adjuster":
+        model.model = LinearArrays(arrays)
+    else:
+        if header["version"] == 1:
+            arrays = _v1_forest_arrays(arrays)
+        else:
+            arrays = dict(arrays, nodes=node_table(arrays["nodes"], header.get("node_dtype")))
+        model.model = sklearn_forest(arrays, header["n_features"])
+    model.training_hash = header.get("training_hash")
+    model.artifact_header = header
+    return model
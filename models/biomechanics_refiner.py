@@ -1,7 +1,9 @@
 import numpy as np
 import logging
 from sklearn.ensemble import RandomForestClassifier
-from utils.alignment_data import prepare_alignment_data
+from utils.alignment_data import alignment_descriptor
+from utils.feature_cache import array_sha256
+from models.forest_engine import compile_forest
 
 logging.basicConfig(level=logging.INFO)
 
@@ -14,27 +16,40 @@ class BiomechanicsRefiner:
     def fit(self, X, y):
         try:
             self.model.fit(X, y)
+            self.training_hash = array_sha256(np.asarray(X), np.asarray(y))
             logging.info(f"BiomechanicsRefiner trained for {self.action_type}")
         except Exception as e:
             logging.error(f"Failed to train BiomechanicsRefiner: {e}")
+
+    def compile(self):
+        """
+        Switch inference to the vectorized all-trees engine (models.forest_engine.CompiledForest),
+        which keeps the forest for large batches. Call this on trained models only.
+        Returns:
+            self
+        """
+        self.model = compile_forest(self.model)
+        return self
     
     def predict(self, keypoints, config=None, pitch_ref=None):
         """
-        Predict action type from keypoints.
+        Predict action type from a video's alignment descriptor (one row).
         Args:
             keypoints: List of keypoint dictionaries.
             config: Configuration parameters.
-            pitch_ref: Pitch reference data.
+            pitch_ref: Unused; pitch correction is applied when keypoints are loaded.
         Returns:
             Predicted action type ('fast' or 'spin').
         """
         try:
             config = config or self.config
-            pitch_ref = pitch_ref or {"pitch_angle": 0}
-            X, _ = prepare_alignment_data(keypoints_dir=None, assessments=None, action_type=self.action_type, config=config, pitch_refs={None: pitch_ref}, keypoints=keypoints)
-            if X.size == 0:
+            if not keypoints:
                 logging.warning("No features for BiomechanicsRefiner prediction")
                 return self.action_type
+            X = alignment_descriptor(keypoints, config)[None, :]
+            if X.shape[1] != self.model.n_features_in_:
+                logging.error(f"Descriptor has {X.shape[1]} features, model expects {self.model.n_features_in_}; check refiner_phase_samples or retrain")
+                return self.action_type
             return 'fast' if self.model.predict(X)[0] == 1 else 'spin'
         except Exception as e:
             logging.error(f"BiomechanicsRefiner prediction failed: {e}")
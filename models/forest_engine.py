@@ -0,0 +1,219 @@
+import logging
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.tree import DecisionTreeClassifier
+from sklearn.tree._tree import Tree, NODE_DTYPE
+
+logging.basicConfig(level=logging.INFO)
+
+# Rows evaluated together; bounds the (rows * trees) cursor arrays
+DEFAULT_BATCH_ROWS = 2048
+# Largest batch evaluated by the NumPy traversal; larger batches go to scikit-learn's C
+# traversal, which is faster from about 300 rows up (see scripts/benchmark_forest.py)
+DEFAULT_MAX_ROWS = 256
+# Levels advanced between compactions of the finished cursors
+COMPACT_EVERY = 4
+
+
+def forest_arrays(forest):
+    """
+    Node tables of a fitted RandomForestClassifier in scikit-learn's own layout,
+    concatenated over trees: tree t owns rows tree_offsets[t]:tree_offsets[t + 1]
+    of nodes and values, and its child indices are local to the tree.
+    Args:
+        forest: Fitted sklearn RandomForestClassifier (single output), or a
+            CompiledForest (its node tables are returned).
+    Returns:
+        Dict of arrays: tree_offsets, nodes (NODE_DTYPE records), values
+        (nodes, classes), max_depth (per tree), classes.
+    """
+    if hasattr(forest, "arrays"):
+        return dict(forest.arrays)
+    trees = [estimator.tree_ for estimator in forest.estimators_]
+    states = [tree.__getstate__() for tree in trees]
+    return {
+        "tree_offsets": np.r_[0, np.cumsum([tree.node_count for tree in trees])].astype(np.int64),
+        "nodes": np.concatenate([state["nodes"] for state in states]).astype(NODE_DTYPE),
+        "values": np.concatenate([state["values"][:, 0, :] for state in states]).astype(np.float64),
+        "max_depth": np.array([tree.max_depth for tree in trees], dtype=np.int64),
+        "classes": np.asarray(forest.classes_),
+    }
+
+
+def node_table(nodes, dtype_descr=None):
+    """
+    View stored node records as this scikit-learn version's NODE_DTYPE.
+    Args:
+        nodes: NODE_DTYPE array, or (nodes, itemsize) uint8 bytes of one.
+        dtype_descr: numpy dtype description the bytes were written with (default NODE_DTYPE).
+    Returns:
+        NODE_DTYPE array (a view when the layouts match, else a field-by-field copy).
+    """
+    stored = NODE_DTYPE if dtype_descr is None else np.lib.format.descr_to_dtype([tuple(field) for field in dtype_descr])
+    if nodes.dtype == np.uint8:
+        nodes = nodes.reshape(-1).view(stored)
+    if nodes.dtype == NODE_DTYPE:
+        return nodes
+    converted = np.zeros(len(nodes), dtype=NODE_DTYPE)
+    for name in NODE_DTYPE.names:
+        if name in nodes.dtype.names:
+            converted[name] = nodes[name]
+    return converted
+
+
+def sklearn_forest(arrays, n_features):
+    """
+    Rebuild a scikit-learn RandomForestClassifier from forest_arrays() node tables.
+    Args:
+        arrays: Node tables (may be memory-mapped; each tree copies its slice).
+        n_features: Number of input features.
+    Returns:
+        Fitted RandomForestClassifier, identical in predictions to the exported forest.
+    """
+    offsets = np.asarray(arrays["tree_offsets"], dtype=np.int64)
+    nodes = node_table(arrays["nodes"])
+    values = np.asarray(arrays["values"], dtype=np.float64)
+    classes = np.asarray(arrays["classes"])
+    n_classes = np.array([len(classes)], dtype=np.intp)
+    estimators = []
+    for t in range(len(offsets) - 1):
+        lo, hi = offsets[t], offsets[t + 1]
+        tree = Tree(int(n_features), n_classes, 1)
+        tree.__setstate__({
+            "max_depth": int(arrays["max_depth"][t]),
+            "node_count": int(hi - lo),
+            "nodes": np.ascontiguousarray(nodes[lo:hi]),
+            "values": np.ascontiguousarray(values[lo:hi])[:, None, :],
+        })
+        estimator = DecisionTreeClassifier()
+        estimator.tree_ = tree
+        estimator.n_features_in_ = int(n_features)
+        estimator.n_outputs_ = 1
+        estimator.classes_ = classes
+        estimator.n_classes_ = len(classes)
+        estimator.max_features_ = int(n_features)
+        estimators.append(estimator)
+    forest = RandomForestClassifier(n_estimators=len(estimators))
+    forest.estimator_ = DecisionTreeClassifier()
+    forest.estimators_ = estimators
+    forest.n_features_in_ = int(n_features)
+    forest.n_outputs_ = 1
+    forest.classes_ = classes
+    forest.n_classes_ = len(classes)
+    return forest
+
+
+class CompiledForest:
+    """
+    Random forest classifier evaluated over all trees at once with NumPy gathers.
+    Every (row, tree) pair is a cursor into the contiguous node tables; each
+    pass advances all cursors one level with a few gathers (leaves point to
+    themselves, so finished cursors are only dropped every few levels), with
+    no per-tree Python loop. This wins on small batches, where scikit-learn's
+    per-tree overhead dominates; batches above max_rows are handed to the
+    scikit-learn forest, whose C traversal is faster there.
+    """
+
+    def __init__(self, arrays, n_features, batch_rows=DEFAULT_BATCH_ROWS, max_rows=DEFAULT_MAX_ROWS, estimator=None):
+        """
+        Args:
+            arrays: Node tables from forest_arrays().
+            n_features: Number of input features.
+            batch_rows: Rows evaluated per pass.
+            max_rows: Largest batch evaluated here; larger ones use the scikit-learn forest.
+            estimator: Fitted scikit-learn forest for large batches (rebuilt from
+                arrays on first use if not given).
+        """
+        self.arrays = arrays
+        self.classes_ = np.asarray(arrays["classes"])
+        self.n_features_in_ = int(n_features)
+        self.n_estimators = len(arrays["tree_offsets"]) - 1
+        self.batch_rows = batch_rows
+        self.max_rows = max_rows
+        self.estimator = estimator
+        nodes = node_table(arrays["nodes"])
+        offsets = np.asarray(arrays["tree_offsets"], dtype=np.int64)
+        self._leaf = nodes["left_child"] < 0
+        # Global node ids: tree-local children shifted by their tree's offset; leaves point to themselves
+        node = np.arange(len(nodes), dtype=np.int64)
+        shift = np.repeat(offsets[:-1], np.diff(offsets))
+        left = np.where(self._leaf, node, nodes["left_child"] + shift)
+        right = np.where(self._leaf, node, nodes["right_child"] + shift)
+        # Children interleaved so one gather at 2 * node + went_right finds the next node
+        self._children = np.stack([left, right], axis=1).ravel().astype(np.int32)
+        self._feature = np.where(self._leaf, 0, nodes["feature"]).astype(np.int32)
+        # sklearn compares float32 features against float64 thresholds; rounding each
+        # threshold down to float32 gives the same comparisons on half the bytes
+        threshold = nodes["threshold"].astype(np.float64)
+        threshold32 = threshold.astype(np.float32)
+        self._threshold = np.where(threshold32 > threshold, np.nextafter(threshold32, np.float32(-np.inf)), threshold32)
+        values = np.asarray(arrays["values"], dtype=np.float64)
+        totals = values.sum(axis=1, keepdims=True)
+        self._leaf_proba = values / np.where(totals > 0, totals, 1.0)
+        self._roots = offsets[:-1].astype(np.int32)
+
+    def _sklearn(self):
+        if self.estimator is None:
+            self.estimator = sklearn_forest(self.arrays, self.n_features_in_)
+        return self.estimator
+
+    def apply(self, X):
+        """
+        Args:
+            X: (n_samples, n_features) array.
+        Returns:
+            (n_samples, n_trees) global leaf node indices.
+        """
+        X = np.asarray(X, dtype=np.float32)
+        leaves = np.empty((len(X), self.n_estimators), dtype=np.int32)
+        for start in range(0, len(X), self.batch_rows):
+            block = X[start:start + self.batch_rows]
+            flat = block.ravel()
+            node = np.tile(self._roots, len(block))
+            # Offset of each cursor's row in the flattened block
+            row_base = np.repeat(np.arange(len(block), dtype=np.int64) * block.shape[1], self.n_estimators)
+            active = np.flatnonzero(~self._leaf[node])
+            current = node[active]
+            base = row_base[active]
+            level = 0
+            while active.size:
+                went_right = ~(flat[base + self._feature[current]] <= self._threshold[current])
+                current = self._children[2 * current + went_right]
+                level += 1
+                if level % COMPACT_EVERY == 0:
+                    inner = ~self._leaf[current]
+                    if not inner.all():
+                        node[active[~inner]] = current[~inner]
+                        active, current, base = active[inner], current[inner], base[inner]
+            leaves[start:start + len(block)] = node.reshape(len(block), self.n_estimators)
+        return leaves
+
+    def predict_proba(self, X):
+        """
+        Args:
+            X: (n_samples, n_features) array.
+        Returns:
+            (n_samples, n_classes) class probabilities averaged over trees.
+        """
+        if len(X) > self.max_rows:
+            return self._sklearn().predict_proba(X)
+        leaves = self.apply(X)
+        return self._leaf_proba[leaves].sum(axis=1) / max(self.n_estimators, 1)
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+def compile_forest(forest, batch_rows=DEFAULT_BATCH_ROWS, max_rows=DEFAULT_MAX_ROWS):
+    """
+    Build a CompiledForest from a fitted forest.
+    Args:
+        forest: sklearn RandomForestClassifier, or a CompiledForest (returned as is).
+        batch_rows: Rows evaluated per pass.
+        max_rows: Largest batch evaluated by the NumPy traversal (see CompiledForest).
+    Returns:
+        CompiledForest.
+    """
+    if isinstance(forest, CompiledForest):
+        return forest
+    return CompiledForest(forest_arrays(forest), forest.n_features_in_, batch_rows, max_rows, estimator=forest)
@@ -1,9 +1,17 @@
 import numpy as np
 import logging
 from sklearn.ensemble import RandomForestClassifier
+from core.feature_extraction import flatten_landmarks
+from utils.keypoint_sequence import KeypointSequence
+from utils.feature_cache import array_sha256
+from models.forest_engine import compile_forest
 
 logging.basicConfig(level=logging.INFO)
 
+# Training labels: 0 is "no event", 1-4 are the key frames in delivery order
+EVENT_NAMES = ("bfc_frame", "ffc_frame", "uah_frame", "release_frame")
+EVENT_CLASSES = (1, 2, 3, 4)
+
 class FrameDetector:
     def __init__(self, action_type, config=None):
         self.action_type = action_type
@@ -19,36 +27,43 @@ class FrameDetector:
         """
         try:
             self.model.fit(X, y)
+            self.training_hash = array_sha256(np.asarray(X), np.asarray(y))
             logging.info(f"FrameDetector trained for {self.action_type}")
         except Exception as e:
             logging.error(f"Failed to train FrameDetector: {e}")
+
+    def compile(self):
+        """
+        Switch inference to the vectorized all-trees engine (models.forest_engine.CompiledForest),
+        which keeps the forest for large batches. Call this on trained models only.
+        Returns:
+            self
+        """
+        self.model = compile_forest(self.model)
+        return self
     
-    def predict_proba(self, keypoints):
+    def predict_proba(self, keypoints, frames=None):
         """
-        Predict probabilities for key frames.
+        Predict per-frame key-frame probabilities with a single model pass.
         Args:
-            keypoints: List of keypoint dictionaries.
+            keypoints: KeypointSequence or list of keypoint dictionaries.
+            frames: Optional frame indices to score; defaults to every frame.
         Returns:
-            List of probability arrays for each frame type.
+            (len(frames), 4) array of BFC, FFC, UAH and release probabilities (columns follow
+            EVENT_NAMES; events absent from training are 0), or None on failure.
         """
         try:
-            from utils.frame_data import prepare_frame_data
-            X = []
-            for kp in keypoints:
-                frame_kp = kp.get("keypoints", {})
-                features = []
-                for i in range(33):
-                    lm = f"landmark_{i}"
-                    features.extend([
-                        frame_kp.get(lm, {"x": 0})["x"],
-                        frame_kp.get(lm, {"y": 0})["y"],
-                        frame_kp.get(lm, {"visibility": 0})["visibility"]
-                    ])
-                X.append(features)
-            X = np.array(X)
-            probs = []
-            for i in range(4):  # BFC, FFC, UAH, Release
-                probs.append(self.model.predict_proba(X)[:, i])
+            if frames is not None:
+                seq = KeypointSequence.from_frames(keypoints)
+                frames = np.asarray(frames, dtype=int)
+                keypoints = KeypointSequence(seq.array[frames], seq.mask[frames])
+            X = flatten_landmarks(keypoints)
+            proba = self.model.predict_proba(X)
+            probs = np.zeros((len(X), len(EVENT_CLASSES)), dtype=np.float64)
+            class_columns = {int(c): i for i, c in enumerate(self.model.classes_)}
+            for j, event_class in enumerate(EVENT_CLASSES):
+                if event_class in class_columns:
+                    probs[:, j] = proba[:, class_columns[event_class]]
             return probs
         except Exception as e:
             logging.error(f"FrameDetector prediction failed: {e}")
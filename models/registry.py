@@ -0,0 +1,196 @@
+import os
+import re
+import copy
+import pickle
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from core.feature_extraction import FEATURE_NAMES
+from models.artifact import ARTIFACT_EXTENSION, load_model, feature_schema
+
+logging.basicConfig(level=logging.INFO)
+
+# Artifact file stem per model kind ("<stem>_<action_type>[_v<N>].pkl" or .bvm, as saved by
+# scripts.train_models); sklearn-backed kinds take their feature schema from models.artifact,
+# and forest kinds can be served by the compiled engine (models.forest_engine)
+MODEL_KINDS = {
+    "frame_detector": {"stem": "frame_detector", "forest": True},
+    "angle_adjuster": {"stem": "angle_adjuster"},
+    "biomechanics_refiner": {"stem": "biomechanics_refiner", "forest": True},
+    "hmm": {"stem": "hmm_release_elbow", "n_features": len(FEATURE_NAMES)},
+}
+FOREST_ENGINES = ("sklearn", "compiled")
+
+
+def model_n_features(model):
+    """Number of input features a loaded model was fitted on (None if unknown)."""
+    estimator = getattr(model, "model", model)
+    n_features = getattr(estimator, "n_features_in_", None)
+    if n_features is None:
+        n_features = getattr(estimator, "n_features", None)
+    return None if n_features is None else int(n_features)
+
+
+def check_schema(kind, model, action_type=None):
+    """
+    Verify a loaded model matches the feature schema of its kind.
+    Args:
+        kind: Key of MODEL_KINDS.
+        model: Loaded model.
+        action_type: Expected action type ('fast' or 'spin'), checked when the model records one.
+    Raises:
+        ValueError: The model was fitted on a different number of features.
+    """
+    expected = MODEL_KINDS[kind].get("n_features")
+    if expected is None:
+        expected = len(feature_schema(kind, getattr(model, "config", None)))
+    n_features = model_n_features(model)
+    if n_features is not None and n_features != expected:
+        raise ValueError(f"{kind} expects {expected} features but was fitted on {n_features}; retrain it")
+    model_action = getattr(model, "action_type", None)
+    if action_type and model_action and model_action != action_type:
+        logging.warning(f"{kind} was trained for {model_action!r}, loaded for {action_type!r}")
+
+
+class ModelRegistry:
+    def __init__(self, models_dir, max_workers=4):
+        """
+        Cache of trained models resolved by kind, action type and version.
+        Models are loaded on first use (.bvm model artifacts, else pickles)
+        and kept in memory; an entry is reloaded when its file's mtime or size changes.
+        Args:
+            models_dir: Directory the models were saved to.
+            max_workers: Threads used to load several models at once.
+        """
+        self.models_dir = models_dir
+        self.max_workers = max_workers
+        self._entries = {}
+        self._path_locks = {}
+        self._lock = threading.Lock()
+
+    def versions(self, kind, action_type):
+        """
+        Args:
+            kind: Key of MODEL_KINDS.
+            action_type: 'fast' or 'spin'.
+        Returns:
+            Sorted list of saved versions (None stands for the unversioned file).
+        """
+        stem = f"{MODEL_KINDS[kind]['stem']}_{action_type}"
+        pattern = re.compile(rf"^{re.escape(stem)}(?:_v(\d+))?(?:\.pkl|{re.escape(ARTIFACT_EXTENSION)})$")
+        found = set()
+        if os.path.isdir(self.models_dir):
+            for name in os.listdir(self.models_dir):
+                match = pattern.match(name)
+                if match:
+                    found.add(int(match.group(1)) if match.group(1) else None)
+        return sorted(found, key=lambda v: -1 if v is None else v)
+
+    def resolve(self, kind, action_type, version=None):
+        """
+        Path of a model artifact.
+        Args:
+            kind: Key of MODEL_KINDS.
+            action_type: 'fast' or 'spin'.
+            version: Integer version; None picks the highest saved version, or the unversioned file.
+        Returns:
+            Path to the memory-mappable .bvm artifact unless the .pkl is newer or the only file.
+        Raises:
+            FileNotFoundError: No matching artifact exists.
+        """
+        if kind not in MODEL_KINDS:
+            raise ValueError(f"Unknown model kind {kind!r}; expected one of {tuple(MODEL_KINDS)}")
+        available = self.versions(kind, action_type)
+        if version is None and available:
+            version = available[-1]
+        if version not in available:
+            raise FileNotFoundError(f"No {kind} model for {action_type!r} (version {version}) in {self.models_dir}")
+        suffix = "" if version is None else f"_v{version}"
+        base = os.path.join(self.models_dir, f"{MODEL_KINDS[kind]['stem']}_{action_type}{suffix}")
+        artifact, pickled = base + ARTIFACT_EXTENSION, base + ".pkl"
+        if os.path.exists(artifact) and (not os.path.exists(pickled) or os.path.getmtime(artifact) >= os.path.getmtime(pickled)):
+            return artifact
+        return pickled
+
+    def _path_lock(self, key):
+        with self._lock:
+            return self._path_locks.setdefault(key, threading.Lock())
+
+    def get(self, kind, action_type, version=None, path=None, engine="sklearn"):
+        """
+        Load a model, or return the cached one if its file is unchanged.
+        Args:
+            kind: Key of MODEL_KINDS.
+            action_type: 'fast' or 'spin'.
+            version: Optional version (see resolve()).
+            path: Explicit artifact path, overriding resolution.
+            engine: Forest inference engine ('sklearn' or 'compiled'); ignored for non-forest kinds.
+        Returns:
+            The model. Each engine is cached separately; a compiled model is a copy,
+            so the sklearn-backed model stays unmodified.
+        """
+        if engine not in FOREST_ENGINES:
+            raise ValueError(f"Unknown forest engine {engine!r}; expected one of {FOREST_ENGINES}")
+        path = os.path.abspath(path or self.resolve(kind, action_type, version))
+        if not MODEL_KINDS[kind].get("forest"):
+            engine = "sklearn"
+        key = (path, engine)
+        with self._path_lock(key):
+            st = os.stat(path)
+            signature = (st.st_mtime_ns, st.st_size)
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == signature:
+                return entry[1]
+            if engine == "compiled":
+                model = copy.copy(self.get(kind, action_type, path=path)).compile()
+            elif path.endswith(ARTIFACT_EXTENSION):
+                model = load_model(path)
+            else:
+                with open(path, 'rb') as f:
+                    model = pickle.load(f)
+            if engine == "sklearn":
+                check_schema(kind, model, action_type)
+            self._entries[key] = (signature, model)
+            logging.info(f"Loaded {kind} for {action_type} from {path} ({engine})")
+            return model
+
+    def get_many(self, action_type, kinds=None, version=None, paths=None, engine="sklearn"):
+        """
+        Load several models concurrently.
+        Args:
+            action_type: 'fast' or 'spin'.
+            kinds: Model kinds to load (default all of MODEL_KINDS).
+            version: Optional version applied to every kind.
+            paths: Optional dict of kind to explicit artifact path.
+            engine: Forest inference engine for forest kinds (see get()).
+        Returns:
+            Dict of kind to model.
+        """
+        kinds = list(kinds or MODEL_KINDS)
+        paths = paths or {}
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(kinds)))) as pool:
+            futures = {kind: pool.submit(self.get, kind, action_type, version, paths.get(kind), engine) for kind in kinds}
+            return {kind: future.result() for kind, future in futures.items()}
+
+    def invalidate(self, path=None):
+        """Drop one cached artifact (by path, every engine), or every cached model."""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                path = os.path.abspath(path)
+                for key in [key for key in self._entries if key[0] == path]:
+                    del self._entries[key]
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_registry(models_dir):
+    """Process-wide ModelRegistry for a models directory."""
+    key = os.path.abspath(models_dir)
+    with _registries_lock:
+        if key not in _registries:
+            _registries[key] = ModelRegistry(key)
+        return _registries[key]
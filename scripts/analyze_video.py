@@ -1,48 +1,54 @@
 import os
 import sys
 import json
-import pickle
 import logging
 import cv2
 import numpy as np
 from core.keypoints import smooth_keypoints
+from utils.keypoint_store import keypoints_file, load_video_keypoints, pitch_reference_file
 from core.biomechanics import analyze_biomechanics
 from core.frame_selection import select_key_frames
-from models.frame_detector import FrameDetector
-from models.angle_adjuster import AngleAdjuster
-from models.biomechanics_refiner import BiomechanicsRefiner
+from models.registry import get_registry
 
 logging.basicConfig(level=logging.INFO)
 
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), "..", "config.json")
+_config_cache = {}
+
+def load_config(config_path=CONFIG_PATH):
+    """
+    Read config.json, reusing the parsed copy while the file is unchanged.
+    Args:
+        config_path: Path to the JSON config.
+    Returns:
+        Config dict.
+    """
+    mtime = os.stat(config_path).st_mtime_ns
+    cached = _config_cache.get(config_path)
+    if cached is None or cached[0] != mtime:
+        with open(config_path, "r") as f:
+            cached = (mtime, json.load(f))
+        _config_cache[config_path] = cached
+    return cached[1]
+
 def analyze_video(video_path, videos_dir, output_dir, hmm_path, action_type="fast"):
     """
     Analyze a bowling video and produce biomechanical assessment.
     Args:
         video_path: Path to the video file.
-        videos_dir: Directory containing pitch reference and keypoints JSONs.
+        videos_dir: Directory containing pitch reference JSONs and keypoint files.
         output_dir: Directory to save the assessment JSON.
-        hmm_path: Path to the trained HMM model.
+        hmm_path: Path to the trained HMM model (None resolves it from output_dir).
         action_type: 'fast' or 'spin'.
+    Models are loaded through models.registry, so repeated calls in one
+    process reuse them until their files change.
     """
-    # Load config
-    config_path = os.path.join(os.path.dirname(__file__), "..", "config.json")
-    with open(config_path, "r") as f:
-        config = json.load(f)
+    config = load_config()
 
     # Extract video ID
     video_id = os.path.splitext(os.path.basename(video_path))[0].replace(f"{action_type}_", "")
-    keypoints_path = os.path.join(videos_dir, f"bowling_analysis_{video_id}.json")
-    pitch_ref_path = os.path.join(videos_dir, f"pitch_reference_{video_id}.json")
-
-    # Load keypoints
-    if not os.path.exists(keypoints_path):
-        logging.error(f"Keypoints file not found: {keypoints_path}")
-        sys.exit(1)
-    with open(keypoints_path, 'r') as f:
-        keypoints = json.load(f)
-
-    # Smooth keypoints
-    keypoints = smooth_keypoints(keypoints, window_size=config.get("smoothing_window", 3))
+    keypoints_path = keypoints_file(videos_dir, video_id)
+    pitch_ref_path = pitch_reference_file(videos_dir, video_id)
 
     # Load pitch reference
     pitch_ref = {"pitch_angle": 0, "crease_y": 0.8, "crease_direction": [1, 0]}
@@ -50,26 +56,30 @@ def analyze_video(video_path, videos_dir, output_dir, hmm_path, action_type="fas
         with open(pitch_ref_path, 'r') as f:
             pitch_ref = json.load(f)
 
-    # Load models
-    frame_detector_path = os.path.join(output_dir, f"frame_detector_{action_type}.pkl")
-    angle_adjuster_path = os.path.join(output_dir, f"angle_adjuster_elbow_{action_type}.pkl")
-    biomechanics_refiner_path = os.path.join(output_dir, f"biomechanics_refiner_{action_type}.pkl")
+    # Load keypoints (raw stores are pitch-corrected on load)
+    if not os.path.exists(keypoints_path):
+        logging.error(f"Keypoints file not found: {keypoints_path}")
+        sys.exit(1)
+    keypoints = load_video_keypoints(videos_dir, video_id, pitch_ref)
+
+    # Smooth keypoints
+    keypoints = smooth_keypoints(keypoints, window_size=config.get("smoothing_window", 3), config=config)
 
+    # Load models (concurrently on first use, cached per forest engine afterwards)
     try:
-        with open(frame_detector_path, 'rb') as f:
-            frame_detector = pickle.load(f)
-        with open(angle_adjuster_path, 'rb') as f:
-            angle_adjuster = pickle.load(f)
-        with open(biomechanics_refiner_path, 'rb') as f:
-            biomechanics_refiner = pickle.load(f)
-        with open(hmm_path, 'rb') as f:
-            hmm = pickle.load(f)
+        models = get_registry(output_dir).get_many(
+            action_type, paths={"hmm": hmm_path} if hmm_path else None, engine=config.get("forest_engine", "sklearn")
+        )
     except Exception as e:
         logging.error(f"Failed to load models: {e}")
         sys.exit(1)
+    frame_detector = models["frame_detector"]
+    angle_adjuster = models["angle_adjuster"]
+    biomechanics_refiner = models["biomechanics_refiner"]
+    hmm = models["hmm"]
 
     # Select key frames
-    key_frames = select_key_frames(keypoints, frame_detector, action_type, config, pitch_ref)
+    key_frames = select_key_frames(keypoints, frame_detector, action_type, config, pitch_ref, hmm_model=hmm)
 
     # Analyze biomechanics
     results = analyze_biomechanics(keypoints, key_frames, config, pitch_ref)
@@ -78,21 +88,11 @@ def analyze_video(video_path, videos_dir, output_dir, hmm_path, action_type="fas
     action_type_pred = biomechanics_refiner.predict(keypoints, config, pitch_ref)
     results["alignment"]["action_type_pred"] = action_type_pred
 
-    # Adjust angles
-    for frame_type in ["bfc_frame", "ffc_frame", "uah_frame", "release_frame"]:
-        frame_idx = key_frames.get(frame_type, 0)
-        if frame_idx < len(keypoints):
-            kp = keypoints[frame_idx]["keypoints"]
-            features = [
-                kp.get(f"landmark_{config.get('landmarks', {}).get('elbow_angle', {}).get('shoulder', 11)}", {"x": 0})["x"],
-                kp.get(f"landmark_{config.get('landmarks', {}).get('elbow_angle', {}).get('shoulder', 11)}", {"y": 0})["y"],
-                kp.get(f"landmark_{config.get('landmarks', {}).get('elbow_angle', {}).get('elbow', 13)}", {"x": 0})["x"],
-                kp.get(f"landmark_{config.get('landmarks', {}).get('elbow_angle', {}).get('elbow', 13)}", {"y": 0})["y"],
-                kp.get(f"landmark_{config.get('landmarks', {}).get('elbow_angle', {}).get('wrist', 14)}", {"x": 0})["x"],
-                kp.get(f"landmark_{config.get('landmarks', {}).get('elbow_angle', {}).get('wrist', 14)}", {"y": 0})["y"]
-            ]
-            adjusted_angle = angle_adjuster.predict([features])[0]
-            results["metrics"][f"{frame_type}_adjusted_angle"] = adjusted_angle
+    # Adjust angles (one batched call for all key frames)
+    frame_types = [ft for ft in ("bfc_frame", "ffc_frame", "uah_frame", "release_frame") if key_frames.get(ft, 0) < len(keypoints)]
+    adjusted = angle_adjuster.predict(keypoints, [key_frames.get(ft, 0) for ft in frame_types])
+    for frame_type, adjusted_angle in zip(frame_types, adjusted):
+        results["metrics"][f"{frame_type}_adjusted_angle"] = float(adjusted_angle)
 
     # Save results
     os.makedirs(output_dir, exist_ok=True)
@@ -0,0 +1,78 @@
+import time
+import pickle
+import argparse
+import logging
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from models.forest_engine import compile_forest, DEFAULT_MAX_ROWS
+
+logging.basicConfig(level=logging.INFO)
+
+def _best_time(fn, X, repeats):
+    fn(X)
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(X)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def benchmark_forest(model=None, batch_sizes=(1, 30, 100, 300, 3000), repeats=5, seed=42):
+    """
+    Compare scikit-learn and compiled forest inference latency and outputs.
+    "compiled" is the engine as used for inference (batches above
+    DEFAULT_MAX_ROWS go to scikit-learn); "traversal" always runs the NumPy
+    traversal and shows where that threshold should sit.
+    Args:
+        model: FrameDetector/BiomechanicsRefiner or RandomForestClassifier; None trains a
+            FrameDetector-sized forest (100 trees, 99 features) on random data.
+        batch_sizes: Rows per predict_proba call (a video is a few hundred frames).
+        repeats: Timed calls per batch size (best is reported).
+        seed: Random seed for the synthetic data.
+    Returns:
+        List of dicts with rows, sklearn_ms, compiled_ms, traversal_ms, speedup and max_abs_diff.
+    """
+    rng = np.random.default_rng(seed)
+    forest = getattr(model, "model", model)
+    if forest is None:
+        X = rng.random((20000, 99)).astype(np.float32)
+        forest = RandomForestClassifier(n_estimators=100, random_state=seed).fit(X, rng.integers(0, 5, len(X)))
+
+    start = time.perf_counter()
+    compiled = compile_forest(forest)
+    logging.info(f"Compiled {compiled.n_estimators} trees in {(time.perf_counter() - start) * 1000:.1f} ms "
+                 f"(NumPy traversal up to {DEFAULT_MAX_ROWS} rows)")
+    traversal = compile_forest(forest, max_rows=float("inf"))
+
+    results = []
+    for rows in batch_sizes:
+        X = rng.random((rows, forest.n_features_in_)).astype(np.float32)
+        sklearn_s = _best_time(forest.predict_proba, X, repeats)
+        compiled_s = _best_time(compiled.predict_proba, X, repeats)
+        traversal_s = _best_time(traversal.predict_proba, X, repeats)
+        diff = float(np.abs(forest.predict_proba(X) - traversal.predict_proba(X)).max())
+        results.append({
+            "rows": rows,
+            "sklearn_ms": sklearn_s * 1000,
+            "compiled_ms": compiled_s * 1000,
+            "traversal_ms": traversal_s * 1000,
+            "speedup": sklearn_s / compiled_s,
+            "max_abs_diff": diff,
+        })
+        logging.info(
+            f"{rows:>6} rows: sklearn {sklearn_s * 1000:8.2f} ms, compiled {compiled_s * 1000:8.2f} ms "
+            f"({sklearn_s / compiled_s:5.1f}x), traversal {traversal_s * 1000:8.2f} ms, max |diff| {diff:.2e}"
+        )
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark compiled random-forest inference against scikit-learn.")
+    parser.add_argument("model_path", nargs="?", help="Pickled FrameDetector/BiomechanicsRefiner (default: synthetic forest)")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1, 30, 100, 300, 3000], help="Batch sizes")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+    model = None
+    if args.model_path:
+        with open(args.model_path, 'rb') as f:
+            model = pickle.load(f)
+    benchmark_forest(model, args.rows, args.repeats)
@@ -1,54 +1,183 @@
 import os
 import sys
+import time
 import logging
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from utils.keypoints_utils2 import extract_keypoints
+import cv2
+from utils.keypoints_utils2 import extract_keypoints, create_pose
 from core.pitch_calibrator import extract_pitch_reference
+from utils.keypoint_store import STORE_EXTENSION, keypoints_file, pitch_reference_file
 
 logging.basicConfig(level=logging.INFO)
 
-def process_videos(video_dir, action_type="fast"):
-    """Process videos to extract 3D keypoints and pitch references."""
+EXTRACTOR_CONFIG = {"min_detection_confidence": 0.6, "min_tracking_confidence": 0.6}
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "NUMEXPR_NUM_THREADS")
+
+_worker_pose = None
+
+def process_video(video_path, video_id, output_dir, action_type="fast", pose=None):
+    """
+    Extract raw 3D keypoints once, then derive the pitch reference from them.
+    Pitch correction is applied when keypoints are loaded, so the video is
+    decoded and run through MediaPipe exactly once.
+    Args:
+        video_path: Path to video file.
+        video_id: Video identifier.
+        output_dir: Directory for keypoint and pitch reference files.
+        action_type: 'fast' or 'spin'.
+        pose: Optional warm Pose graph reused across videos.
+    Returns:
+        Dict with video_id, frames and detected frame counts.
+    """
+    keypoints_path = os.path.join(output_dir, f"bowling_analysis_{video_id}.kps")
+    pitch_json = pitch_reference_file(output_dir, video_id)
+    logging.info(f"Processing {video_id} with utils.keypoints_utils2")
+    keypoints = extract_keypoints(video_path, keypoints_path, config=EXTRACTOR_CONFIG, pose=pose)
+    if not len(keypoints):
+        raise RuntimeError(f"No frames extracted from {video_path}")
+    if not os.path.exists(pitch_json):
+        extract_pitch_reference(video_path, keypoints_path, pitch_json, action_type)
+    return {"video_id": video_id, "frames": len(keypoints), "detected": int(keypoints.mask.sum())}
+
+def recalibrate_videos(video_dir, action_type="fast"):
+    """
+    Recompute pitch references from stored raw keypoints without re-running pose estimation.
+    Args:
+        video_dir: Directory with videos and keypoint stores.
+        action_type: 'fast' or 'spin'.
+    Returns:
+        Number of videos recalibrated.
+    """
+    count = 0
+    for video_path, video_id in list_videos(video_dir, action_type):
+        keypoints_path = keypoints_file(video_dir, video_id)
+        if not keypoints_path.endswith(STORE_EXTENSION) or not os.path.exists(keypoints_path):
+            logging.warning(f"No raw keypoint store for {video_id}; run extraction first")
+            continue
+        extract_pitch_reference(video_path, keypoints_path, pitch_reference_file(video_dir, video_id), action_type)
+        count += 1
+    logging.info(f"Recalibrated {count} videos")
+    return count
+
+def _init_worker(threads_per_worker):
+    """Pool initializer: cap OpenCV threads and build one warm Pose graph per worker."""
+    global _worker_pose
+    cv2.setNumThreads(threads_per_worker)
+    _worker_pose = create_pose(EXTRACTOR_CONFIG)
+
+def _process_in_worker(video_path, video_id, output_dir, action_type):
+    start = time.perf_counter()
+    result = process_video(video_path, video_id, output_dir, action_type, pose=_worker_pose)
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+def list_videos(video_dir, action_type="fast"):
+    """
+    List videos to process.
+    Args:
+        video_dir: Directory with <action_type>_<id>.mp4 files.
+        action_type: 'fast' or 'spin'.
+    Returns:
+        Sorted list of (video_path, video_id).
+    """
+    videos = []
+    for filename in sorted(os.listdir(video_dir)):
+        if filename.startswith(f"{action_type}_") and filename.endswith(".mp4"):
+            videos.append((os.path.join(video_dir, filename), filename[len(action_type)+1:-4]))
+    return videos
+
+def process_videos(video_dir, action_type="fast", workers=1, threads_per_worker=1):
+    """
+    Process videos to extract 3D keypoints and pitch references.
+    Args:
+        video_dir: Directory with videos; outputs are written alongside.
+        action_type: 'fast' or 'spin'.
+        workers: Number of worker processes; 1 processes videos in this process.
+        threads_per_worker: OpenCV/BLAS thread budget per worker.
+    Returns:
+        Dict with lists of completed results and (video_id, error) failures.
+    """
     if not os.path.exists(video_dir):
         logging.error(f"Video directory {video_dir} does not exist")
         sys.exit(1)
     output_dir = video_dir
-    for filename in os.listdir(video_dir):
-        if filename.startswith(f"{action_type}_") and filename.endswith(".mp4"):
-            video_id = filename[len(action_type)+1:-4]
-            video_path = os.path.join(output_dir, filename)
-            keypoints_json = os.path.join(output_dir, f"bowling_analysis_{video_id}.json")
-            pitch_json = os.path.join(output_dir, f"pitch_reference_{video_id}.json")
-            logging.info(f"Processing {video_id} with utils.keypoints_utils2")
-            keypoints = extract_keypoints(
-                video_path,
-                keypoints_json,
-                pitch_json if os.path.exists(pitch_json) else None,
-                config={"min_detection_confidence": 0.6, "min_tracking_confidence": 0.6}
-            )
-            if keypoints and any("z" in lm for frame in keypoints for lm in frame.get("keypoints", {}).values()):
-                logging.info("Confirmed 3D keypoints with z-coordinates")
-            else:
-                logging.warning("No z-coordinates detected in keypoints")
-            if not os.path.exists(pitch_json):
-                extract_pitch_reference(video_path, keypoints_json, pitch_json, action_type)
-                if os.path.exists(pitch_json):
-                    keypoints = extract_keypoints(
-                        video_path,
-                        keypoints_json,
-                        pitch_json,
-                        config={"min_detection_confidence": 0.6, "min_tracking_confidence": 0.6}
-                    )
-                    if keypoints and any("z" in lm for frame in keypoints for lm in frame.get("keypoints", {}).values()):
-                        logging.info("Confirmed pitch-corrected 3D keypoints with z-coordinates")
-                    else:
-                        logging.warning("No z-coordinates in pitch-corrected keypoints")
-    logging.info("Video processing complete")
+    videos = list_videos(video_dir, action_type)
+    completed = []
+    failures = []
+    start = time.perf_counter()
+
+    if workers <= 1:
+        pose = create_pose(EXTRACTOR_CONFIG)
+        try:
+            for i, (video_path, video_id) in enumerate(videos, 1):
+                video_start = time.perf_counter()
+                try:
+                    result = process_video(video_path, video_id, output_dir, action_type, pose=pose)
+                    result["seconds"] = time.perf_counter() - video_start
+                    completed.append(result)
+                    logging.info(f"[{i}/{len(videos)}] {video_id}: {result['frames']} frames in {result['seconds']:.1f}s")
+                except Exception as e:
+                    failures.append((video_id, str(e)))
+                    logging.error(f"[{i}/{len(videos)}] {video_id} failed: {e}")
+        finally:
+            pose.close()
+    else:
+        # Spawned workers inherit these before importing numpy/OpenCV
+        saved_env = {var: os.environ.get(var) for var in THREAD_ENV_VARS}
+        os.environ.update({var: str(threads_per_worker) for var in THREAD_ENV_VARS})
+        try:
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(threads_per_worker,)
+            ) as pool:
+                futures = {
+                    pool.submit(_process_in_worker, video_path, video_id, output_dir, action_type): video_id
+                    for video_path, video_id in videos
+                }
+                for i, future in enumerate(as_completed(futures), 1):
+                    video_id = futures[future]
+                    try:
+                        result = future.result()
+                        completed.append(result)
+                        logging.info(f"[{i}/{len(videos)}] {video_id}: {result['frames']} frames in {result['seconds']:.1f}s")
+                    except Exception as e:
+                        failures.append((video_id, str(e)))
+                        logging.error(f"[{i}/{len(videos)}] {video_id} failed: {e}")
+        finally:
+            for var, value in saved_env.items():
+                if value is None:
+                    os.environ.pop(var, None)
+                else:
+                    os.environ[var] = value
+
+    elapsed = time.perf_counter() - start
+    total_frames = sum(r["frames"] for r in completed)
+    logging.info(
+        f"Video processing complete: {len(completed)} succeeded, {len(failures)} failed, "
+        f"{total_frames} frames in {elapsed:.1f}s ({total_frames / elapsed if elapsed > 0 else 0.0:.1f} fps) "
+        f"with {max(workers, 1)} worker(s)"
+    )
+    for video_id, error in failures:
+        logging.warning(f"Failed: {video_id}: {error}")
+    return {"completed": completed, "failures": failures}
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python process_videos.py <video_dir> [action_type]")
-        sys.exit(1)
-    process_videos(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else "fast")
+    parser = argparse.ArgumentParser(description="Extract 3D keypoints and pitch references for videos.")
+    parser.add_argument("video_dir")
+    parser.add_argument("action_type", nargs="?", default="fast")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes")
+    parser.add_argument("--threads-per-worker", type=int, default=1, help="OpenCV/BLAS threads per worker")
+    parser.add_argument("--recalibrate", action="store_true", help="Recompute pitch references from stored keypoints only")
+    args = parser.parse_args()
+    if args.recalibrate:
+        recalibrate_videos(args.video_dir, args.action_type)
+        sys.exit(0)
+    summary = process_videos(args.video_dir, args.action_type, args.workers, args.threads_per_worker)
+    sys.exit(1 if summary["failures"] else 0)
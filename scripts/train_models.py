@@ -1,19 +1,171 @@
 import os
 import json
+import time
 import pickle
 import logging
+import argparse
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from core.data import load_assessments
-from core.hmm_training import train_hmm, prepare_hmm_data
+from core.hmm_training import train_hmm, train_hmm_restarts, prepare_hmm_data, train_phase_hmm, prepare_phase_hmm_data
+from core.hmm_incremental import labelled_statistics, expected_statistics, update_hmm, save_statistics, load_statistics
+from core.hmm_predict import is_phase_model
 from models.frame_detector import FrameDetector
 from models.angle_adjuster import AngleAdjuster
 from models.biomechanics_refiner import BiomechanicsRefiner
+from models.artifact import ARTIFACT_EXTENSION, export_model
 from utils.frame_data import prepare_frame_data
-from utils.angle_data import prepare_angle_data
+from utils.angle_data import prepare_angle_dataset
 from utils.alignment_data import prepare_alignment_data
+from utils.feature_cache import create_feature_cache, config_fingerprint, KeypointCorpus
 
 logging.basicConfig(level=logging.INFO)
 
-def train_models(keypoints_dir, output_dir, action_type, config=None, pitch_refs=None):
+def prepare_release_hmm(keypoints_dir, output_dir, assessments, action_type, config=None, pitch_refs=None, cache=None, incremental=False):
+    """
+    Load and featurize everything the release HMM fit needs (see train_release_hmm).
+    With incremental=True and a saved model and statistics of the same mode,
+    only assessments whose videos are not yet in the statistics are featurized.
+    Phase HMMs refined by EM ("hmm_em_iterations" > 0) are always retrained.
+    Args:
+        keypoints_dir: Directory with keypoint files.
+        output_dir: Directory with/for the trained models.
+        assessments: Dict of video_id to assessment data.
+        action_type: 'fast' or 'spin'.
+        config: Configuration parameters.
+        pitch_refs: Dict of video_id to pitch reference.
+        cache: Optional FeatureCache.
+        incremental: Update the saved model instead of retraining it.
+    Returns:
+        Dict with the saved "model" and "stats" (None unless updating) and the
+        prepared "data" (None when there is nothing to fit).
+    """
+    config = config or {}
+    phase_mode = config.get("hmm_mode", "left_to_right") == "left_to_right"
+    model_path = os.path.join(output_dir, f"hmm_release_elbow_{action_type}.pkl")
+    stats_path = os.path.join(output_dir, f"hmm_release_elbow_{action_type}_stats.npz")
+    prepare = prepare_phase_hmm_data if phase_mode else prepare_hmm_data
+
+    if incremental and phase_mode and config.get("hmm_em_iterations", 0) > 0:
+        # The saved statistics are the supervised estimate; folding new videos into
+        # them would silently drop the EM refinement, so retrain instead
+        logging.warning("Incremental HMM updates need hmm_em_iterations 0; retraining from scratch")
+        incremental = False
+    hmm_model = None
+    stats = load_statistics(stats_path) if incremental and os.path.exists(model_path) else None
+    if stats is not None:
+        with open(model_path, 'rb') as f:
+            hmm_model = pickle.load(f)
+        if is_phase_model(hmm_model) != phase_mode:
+            logging.warning("Saved HMM was trained in a different hmm_mode; retraining from scratch")
+            hmm_model, stats = None, None
+
+    if stats is not None:
+        known = set(stats["video_ids"])
+        assessments = {video_id: a for video_id, a in assessments.items() if video_id not in known}
+        if not assessments:
+            logging.info(f"HMM for {action_type} is up to date ({len(known)} videos)")
+            return {"model": hmm_model, "stats": stats, "data": None}
+    data = prepare(keypoints_dir, assessments, action_type, config, pitch_refs, cache, return_ids=True)
+    if data is None and stats is not None:
+        logging.info(f"No usable new sequences for the {action_type} HMM")
+    return {"model": hmm_model, "stats": stats, "data": data}
+
+def fit_release_hmm(prepared, output_dir, action_type, config=None):
+    """
+    Fit (or incrementally update) the release HMM from prepare_release_hmm() output
+    and store it with its sufficient statistics.
+    Args:
+        prepared: Dict from prepare_release_hmm().
+        output_dir: Directory with/for the trained models.
+        action_type: 'fast' or 'spin'.
+        config: Configuration parameters ("hmm_workers" caps the restart processes).
+    Returns:
+        Trained HMM, or None.
+    """
+    config = config or {}
+    phase_mode = config.get("hmm_mode", "left_to_right") == "left_to_right"
+    hmm_model, stats, data = prepared["model"], prepared["stats"], prepared["data"]
+    if data is None:
+        return hmm_model
+
+    if stats is not None:
+        X_hmm, lengths, states, video_ids = data if phase_mode else (data[0], data[1], None, data[2])
+        hmm_model, stats = update_hmm(
+            hmm_model, stats, X_hmm, lengths, states, video_ids, n_iter=config.get("hmm_incremental_iterations", 3)
+        )
+    elif phase_mode:
+        X_hmm, lengths, states, video_ids = data
+        hmm_model = train_phase_hmm(X_hmm, lengths, states, n_iter=config.get("hmm_em_iterations", 0))
+        if hmm_model is None:
+            return None
+        stats = labelled_statistics(X_hmm, lengths, states, hmm_model.n_components, video_ids)
+    else:
+        X_hmm, lengths, video_ids = data
+        if config.get("hmm_restarts", 1) > 1:
+            hmm_model, diagnostics = train_hmm_restarts(
+                X_hmm, lengths, config["hmm_restarts"], config.get("hmm_workers"),
+                holdout_fraction=config.get("hmm_holdout_fraction", 0.2)
+            )
+            with open(os.path.join(output_dir, f"hmm_release_elbow_{action_type}_restarts.json"), 'w') as f:
+                json.dump(diagnostics, f, indent=2)
+        else:
+            hmm_model = train_hmm(X_hmm, lengths=lengths)
+        if hmm_model is None:
+            return None
+        stats, _ = expected_statistics(hmm_model, X_hmm, lengths, video_ids)
+
+    with open(os.path.join(output_dir, f"hmm_release_elbow_{action_type}.pkl"), 'wb') as f:
+        pickle.dump(hmm_model, f)
+    save_statistics(os.path.join(output_dir, f"hmm_release_elbow_{action_type}_stats.npz"), stats)
+    logging.info(f"HMM model saved for {action_type} ({len(stats['video_ids'])} videos)")
+    return hmm_model
+
+def train_release_hmm(keypoints_dir, output_dir, assessments, action_type, config=None, pitch_refs=None, cache=None, incremental=False):
+    """
+    Train the release HMM and store its sufficient statistics next to it.
+    With incremental=True and a saved model and statistics of the same mode,
+    only assessments whose videos are not yet in the statistics are featurized
+    and folded in (core.hmm_incremental.update_hmm), so the cost scales with
+    the new data instead of the corpus. Phase HMMs refined by EM
+    ("hmm_em_iterations" > 0) are always retrained.
+    Args:
+        keypoints_dir: Directory with keypoint files.
+        output_dir: Directory with/for the trained models.
+        assessments: Dict of video_id to assessment data.
+        action_type: 'fast' or 'spin'.
+        config: Configuration parameters.
+        pitch_refs: Dict of video_id to pitch reference.
+        cache: Optional FeatureCache.
+        incremental: Update the saved model instead of retraining it.
+    Returns:
+        Trained HMM, or None.
+    """
+    prepared = prepare_release_hmm(keypoints_dir, output_dir, assessments, action_type, config, pitch_refs, cache, incremental)
+    return fit_release_hmm(prepared, output_dir, action_type, config)
+
+def save_model(model, output_dir, stem, action_type, config=None):
+    """
+    Pickle a trained model and, unless "export_model_artifacts" is false, export its .bvm artifact.
+    Args:
+        model: Trained FrameDetector, AngleAdjuster or BiomechanicsRefiner.
+        output_dir: Directory to save to.
+        stem: File stem (e.g. 'frame_detector').
+        action_type: 'fast' or 'spin'.
+        config: Configuration parameters.
+    Returns:
+        List of written file names.
+    """
+    files = [f"{stem}_{action_type}.pkl"]
+    with open(os.path.join(output_dir, files[0]), 'wb') as f:
+        pickle.dump(model, f)
+    if (config or {}).get("export_model_artifacts", True):
+        if export_model(model, os.path.join(output_dir, f"{stem}_{action_type}{ARTIFACT_EXTENSION}")):
+            files.append(f"{stem}_{action_type}{ARTIFACT_EXTENSION}")
+    return files
+
+def train_models(keypoints_dir, output_dir, action_type, config=None, pitch_refs=None, incremental=False):
     """
     Train FrameDetector, AngleAdjuster, BiomechanicsRefiner, and HMM models.
     Args:
@@ -22,6 +174,11 @@ def train_models(keypoints_dir, output_dir, action_type, config=None, pitch_refs
         action_type: 'fast' or 'spin'.
         config: Configuration parameters.
         pitch_refs: Dict of video_id to pitch reference.
+        incremental: Fold only new videos into the saved HMM (see train_release_hmm).
+    Features are cached per video under config "feature_cache_dir" (default
+    <keypoints_dir>/feature_cache), so retraining only featurizes new or
+    changed keypoint files; videos that do miss the cache are loaded once
+    and shared by all four datasets.
     """
     config = config or {}
     pitch_refs = pitch_refs or {}
@@ -33,46 +190,208 @@ def train_models(keypoints_dir, output_dir, action_type, config=None, pitch_refs
         return
     
     os.makedirs(output_dir, exist_ok=True)
+    cache = create_feature_cache(config, os.path.join(keypoints_dir, "feature_cache"))
+    corpus = KeypointCorpus(keypoints_dir, config.get("keypoints_prefix", "bowling_analysis"))
     
     # Train FrameDetector
     frame_detector = FrameDetector(action_type, config)
-    X_frame, y_frame = prepare_frame_data(keypoints_dir, assessments, action_type, config, pitch_refs)
+    X_frame, y_frame = prepare_frame_data(corpus, assessments, action_type, config, pitch_refs, cache=cache)
     if X_frame.size > 0:
         frame_detector.fit(X_frame, y_frame)
-        with open(os.path.join(output_dir, f"frame_detector_{action_type}.pkl"), 'wb') as f:
-            pickle.dump(frame_detector, f)
+        save_model(frame_detector, output_dir, "frame_detector", action_type, config)
         logging.info(f"FrameDetector saved for {action_type}")
     
     # Train AngleAdjuster
     angle_adjuster = AngleAdjuster(action_type, config)
-    X_angle, y_angle = prepare_angle_data(keypoints_dir, assessments, action_type, config, pitch_refs)
+    X_angle, y_angle = prepare_angle_dataset(corpus, assessments, action_type, config, pitch_refs, cache)
     if X_angle.size > 0:
         angle_adjuster.fit(X_angle, y_angle)
-        with open(os.path.join(output_dir, f"angle_adjuster_{action_type}.pkl"), 'wb') as f:
-            pickle.dump(angle_adjuster, f)
+        save_model(angle_adjuster, output_dir, "angle_adjuster", action_type, config)
         logging.info(f"AngleAdjuster saved for {action_type}")
     
     # Train BiomechanicsRefiner
     biomechanics_refiner = BiomechanicsRefiner(action_type, config)
-    X_align, y_align = prepare_alignment_data(keypoints_dir, assessments, action_type, config, pitch_refs)
+    X_align, y_align = prepare_alignment_data(corpus, assessments, action_type, config, pitch_refs, cache=cache)
     if X_align.size > 0:
         biomechanics_refiner.fit(X_align, y_align)
-        with open(os.path.join(output_dir, f"biomechanics_refiner_{action_type}.pkl"), 'wb') as f:
-            pickle.dump(biomechanics_refiner, f)
+        save_model(biomechanics_refiner, output_dir, "biomechanics_refiner", action_type, config)
         logging.info(f"BiomechanicsRefiner saved for {action_type}")
     
-    # Train HMM
-    X_hmm = prepare_hmm_data(keypoints_dir, assessments, action_type, config, pitch_refs)
-    if X_hmm is not None:
-        hmm_model = train_hmm(X_hmm)
-        if hmm_model:
-            with open(os.path.join(output_dir, f"hmm_release_elbow_{action_type}.pkl"), 'wb') as f:
-                pickle.dump(hmm_model, f)
-            logging.info(f"HMM model saved for {action_type}")
+    # Train HMM: left-to-right phase model by default, unconstrained with "hmm_mode": "unconstrained"
+    train_release_hmm(corpus, output_dir, assessments, action_type, config, pitch_refs, cache, incremental)
+
+    if cache is not None:
+        logging.info(f"Feature cache: {cache.stats()}")
+
+class CpuBudget:
+    """
+    Cores shared by concurrent fits. A fit reserves cores before it starts and
+    uses exactly that many (forest n_jobs threads or HMM restart processes),
+    so the sum over running fits never exceeds the budget.
+    """
+
+    def __init__(self, cpus):
+        self.total = max(1, int(cpus))
+        self.free = self.total
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def reserve(self, cpus):
+        """Block until `cpus` cores (capped at the budget) are free; yields the number reserved."""
+        cpus = max(1, min(int(cpus), self.total))
+        with self._cond:
+            self._cond.wait_for(lambda: self.free >= cpus)
+            self.free -= cpus
+        try:
+            yield cpus
+        finally:
+            with self._cond:
+                self.free += cpus
+                self._cond.notify_all()
+
+def _fit_forest(model, X, y, budget, cpus):
+    """Fit a forest-backed wrapper with as many tree-building threads as cores reserved."""
+    with budget.reserve(cpus) as reserved:
+        model.model.set_params(n_jobs=reserved)
+        start = time.perf_counter()
+        model.fit(X, y)
+        # Single-video inference should not spin up a thread pool
+        model.model.set_params(n_jobs=None)
+        return {"cpus": reserved, "seconds": time.perf_counter() - start}
+
+def _forest_cpus(budget, work, total_work):
+    """Cores for a forest in proportion to its share of the total forest work."""
+    return max(1, round(budget.total * work / total_work)) if total_work else 1
+
+def train_all_models(keypoints_dir, output_dir, action_types=("fast", "spin"), config=None, pitch_refs=None,
+                     cpus=None, incremental=False):
+    """
+    Orchestrated training of all four models for one or more action types.
+    Keypoints are loaded once into a shared KeypointCorpus and every dataset of
+    every action type is built from it (through the feature cache). The fits
+    then run concurrently under one CPU budget: random forests get tree-level
+    threads (n_jobs) and HMM restarts get worker processes, sized so the
+    cores in use never exceed the budget. A combined training_manifest.json
+    lists every artifact written.
+    Args:
+        keypoints_dir: Directory with keypoint files.
+        output_dir: Directory to save trained models.
+        action_types: Action types to train ('fast', 'spin').
+        config: Configuration parameters ("train_cpus" is the default budget).
+        pitch_refs: Dict of video_id to pitch reference.
+        cpus: CPU budget (default config "train_cpus", else all cores).
+        incremental: Fold only new videos into saved HMMs.
+    Returns:
+        Manifest dict.
+    """
+    config = config or {}
+    pitch_refs = pitch_refs or {}
+    budget = CpuBudget(cpus or config.get("train_cpus") or os.cpu_count() or 1)
+    os.makedirs(output_dir, exist_ok=True)
+    cache = create_feature_cache(config, os.path.join(keypoints_dir, "feature_cache"))
+    corpus = KeypointCorpus(keypoints_dir, config.get("keypoints_prefix", "bowling_analysis"))
+    start = time.perf_counter()
+
+    # Build every dataset first; videos missing from the cache are read once for all of them
+    datasets = {}
+    for action_type in action_types:
+        assessments = load_assessments(action_type, db_path="bowliverse.db")
+        if not assessments:
+            logging.error(f"No assessments available for {action_type}")
+            continue
+        datasets[action_type] = {
+            "assessments": assessments,
+            "frame_detector": prepare_frame_data(corpus, assessments, action_type, config, pitch_refs, cache=cache),
+            "angle_adjuster": prepare_angle_dataset(corpus, assessments, action_type, config, pitch_refs, cache),
+            "biomechanics_refiner": prepare_alignment_data(corpus, assessments, action_type, config, pitch_refs, cache=cache),
+            "hmm": prepare_release_hmm(corpus, output_dir, assessments, action_type, config, pitch_refs, cache, incremental),
+        }
+    prepare_seconds = time.perf_counter() - start
+    logging.info(f"Prepared datasets for {list(datasets)} in {prepare_seconds:.1f}s ({corpus.loads} videos loaded)")
+
+    wrappers = {"frame_detector": FrameDetector, "angle_adjuster": AngleAdjuster, "biomechanics_refiner": BiomechanicsRefiner}
+    # Both forests have the same number of trees, so training rows measure their relative cost
+    forest_work = {
+        (action_type, kind): len(data[kind][0])
+        for action_type, data in datasets.items() for kind in ("frame_detector", "biomechanics_refiner")
+    }
+    total_forest_work = sum(forest_work.values())
+
+    def fit_job(action_type, kind):
+        X, y = datasets[action_type][kind]
+        if X.size == 0:
+            logging.warning(f"No training data for {kind} ({action_type})")
+            return {}
+        model = wrappers[kind](action_type, config)
+        if kind == "angle_adjuster":
+            with budget.reserve(1):
+                job_start = time.perf_counter()
+                model.fit(X, y)
+                entry = {"cpus": 1, "seconds": time.perf_counter() - job_start}
+        else:
+            entry = _fit_forest(model, X, y, budget, _forest_cpus(budget, forest_work[(action_type, kind)], total_forest_work))
+        entry.update(files=save_model(model, output_dir, kind, action_type, config), rows=int(len(X)),
+                     training_hash=getattr(model, "training_hash", None))
+        return entry
+
+    def hmm_job(action_type):
+        restarts = config.get("hmm_restarts", 1) if config.get("hmm_mode", "left_to_right") != "left_to_right" else 1
+        with budget.reserve(restarts) as reserved:
+            job_start = time.perf_counter()
+            model = fit_release_hmm(datasets[action_type]["hmm"], output_dir, action_type, dict(config, hmm_workers=reserved))
+            entry = {"cpus": reserved, "seconds": time.perf_counter() - job_start}
+        if model is not None:
+            entry["files"] = [f"hmm_release_elbow_{action_type}.pkl", f"hmm_release_elbow_{action_type}_stats.npz"]
+        return entry
+
+    # Largest fits first so they get cores before the small ones fill the gaps
+    jobs = sorted(
+        [(action_type, kind) for action_type in datasets for kind in (*wrappers, "hmm")],
+        key=lambda job: -forest_work.get(job, 0)
+    )
+    models = {action_type: {} for action_type in datasets}
+    with ThreadPoolExecutor(max_workers=max(1, len(jobs))) as pool:
+        futures = {
+            pool.submit(hmm_job, action_type) if kind == "hmm" else pool.submit(fit_job, action_type, kind): (action_type, kind)
+            for action_type, kind in jobs
+        }
+        for future in as_completed(futures):
+            action_type, kind = futures[future]
+            try:
+                models[action_type][kind] = future.result()
+                logging.info(f"Trained {kind} for {action_type}: {models[action_type][kind]}")
+            except Exception as e:
+                logging.error(f"Failed to train {kind} for {action_type}: {e}")
+                models[action_type][kind] = {"error": str(e)}
+
+    manifest = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config_fingerprint": config_fingerprint(config),
+        "cpu_budget": budget.total,
+        "corpus": {"videos_loaded": corpus.loads, "bytes": corpus.nbytes()},
+        "feature_cache": cache.stats() if cache is not None else None,
+        "prepare_seconds": prepare_seconds,
+        "total_seconds": time.perf_counter() - start,
+        "models": models,
+    }
+    tmp_path = os.path.join(output_dir, "training_manifest.json.tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(output_dir, "training_manifest.json"))
+    logging.info(f"Trained {sum(len(m) for m in models.values())} models in {manifest['total_seconds']:.1f}s")
+    return manifest
 
 if __name__ == "__main__":
-    import sys
-    if len(sys.argv) != 4:
-        print("Usage: python -m scripts.train_models <keypoints_dir> <output_dir> <action_type>")
-        sys.exit(1)
-    train_models(sys.argv[1], sys.argv[2], sys.argv[3])
+    parser = argparse.ArgumentParser(description="Train FrameDetector, AngleAdjuster, BiomechanicsRefiner and HMM models.")
+    parser.add_argument("keypoints_dir")
+    parser.add_argument("output_dir")
+    parser.add_argument("action_type", choices=["fast", "spin", "all"])
+    parser.add_argument("--incremental", action="store_true", help="Fold only new videos into the saved HMM")
+    parser.add_argument("--parallel", action="store_true", help="Orchestrated training: shared corpus load, concurrent fits")
+    parser.add_argument("--cpus", type=int, default=None, help="CPU budget for --parallel (default: all cores)")
+    args = parser.parse_args()
+    if args.parallel or args.action_type == "all":
+        action_types = ("fast", "spin") if args.action_type == "all" else (args.action_type,)
+        train_all_models(args.keypoints_dir, args.output_dir, action_types, cpus=args.cpus, incremental=args.incremental)
+    else:
+        train_models(args.keypoints_dir, args.output_dir, args.action_type, incremental=args.incremental)
@@ -0,0 +1,35 @@
+import numpy as np
+import core.frame_selection as frame_selection
+from utils.keypoint_sequence import KeypointSequence
+
+
+class _PeakDetector:
+    """Frame detector with fixed per-event probability peaks."""
+
+    def __init__(self, n_frames, peaks):
+        self.probs = np.full((n_frames, 4), 0.01)
+        for j, frames in peaks.items():
+            for frame, p in frames.items():
+                self.probs[frame, j] = p
+
+    def predict_proba(self, seq, frames=None):
+        return self.probs if frames is None else self.probs[frames]
+
+
+def _sequence(n_frames):
+    return KeypointSequence(np.zeros((n_frames, 33, 4), dtype=np.float32), np.ones(n_frames, dtype=bool), {})
+
+
+def test_detector_fills_events_after_hmm_frames(monkeypatch):
+    monkeypatch.setattr(frame_selection, "_hmm_key_frames", lambda *args: ({"bfc_frame": 40, "ffc_frame": 50}, "phase not entered in HMM decoding"))
+    # UAH and release peak before the HMM's FFC; on their own they would be decoded there
+    detector = _PeakDetector(100, {0: {10: 0.9}, 1: {15: 0.9}, 2: {20: 0.9, 60: 0.3}, 3: {30: 0.9, 70: 0.3}})
+    key_frames = frame_selection.select_key_frames(_sequence(100), detector, "fast", {"use_foot_candidates": False}, hmm_model=object())
+    assert key_frames == {"bfc_frame": 40, "ffc_frame": 50, "uah_frame": 60, "release_frame": 70}
+
+
+def test_decode_without_hmm_frames():
+    detector = _PeakDetector(100, {0: {10: 0.9}, 1: {15: 0.9}, 2: {20: 0.9, 60: 0.3}, 3: {30: 0.9, 70: 0.3}})
+    key_frames, reasons = frame_selection._detector_key_frames(_sequence(100), detector, ["bfc_frame", "ffc_frame", "uah_frame", "release_frame"], {"use_foot_candidates": False}, None)
+    assert key_frames == {"bfc_frame": 10, "ffc_frame": 15, "uah_frame": 20, "release_frame": 30}
+    assert reasons == {}
@@ -0,0 +1,58 @@
+import numpy as np
+from core.hmm_predict import PHASES
+from core.hmm_training import train_phase_hmm
+from core.hmm_incremental import labelled_statistics, update_hmm
+
+
+def _phase_sequences(n_videos, seed=0, skip_video=None):
+    """Synthetic labelled sequences; skip_video jumps over one phase."""
+    rng = np.random.default_rng(seed)
+    X, lengths, states = [], [], []
+    for v in range(n_videos):
+        phases = list(range(len(PHASES)))
+        if v == skip_video:
+            phases.remove(2)
+        seq = np.concatenate([np.full(rng.integers(3, 9), k) for k in phases])
+        X.append(rng.normal(seq[:, None], 1.0, (len(seq), 4)))
+        lengths.append(len(seq))
+        states.append(seq)
+    return np.concatenate(X), np.array(lengths), np.concatenate(states)
+
+
+def _split(X, lengths, states, n_first):
+    rows = lengths[:n_first].sum()
+    return (X[:rows], lengths[:n_first], states[:rows]), (X[rows:], lengths[n_first:], states[rows:])
+
+
+def _assert_same_parameters(a, b):
+    np.testing.assert_allclose(a.startprob_, b.startprob_)
+    np.testing.assert_allclose(a.transmat_, b.transmat_)
+    np.testing.assert_allclose(a.means_, b.means_)
+    np.testing.assert_allclose(a.covars_, b.covars_)
+
+
+def test_incremental_update_matches_retrain():
+    X, lengths, states = _phase_sequences(8)
+    first, new = _split(X, lengths, states, 5)
+    model = train_phase_hmm(*first)
+    stats = labelled_statistics(*first, model.n_components)
+    updated, _ = update_hmm(model, stats, new[0], new[1], new[2])
+    _assert_same_parameters(updated, train_phase_hmm(X, lengths, states))
+
+
+def test_incremental_update_matches_retrain_with_skipped_phase():
+    X, lengths, states = _phase_sequences(8, seed=1, skip_video=6)
+    first, new = _split(X, lengths, states, 5)
+    model = train_phase_hmm(*first)
+    stats = labelled_statistics(*first, model.n_components)
+    updated, _ = update_hmm(model, stats, new[0], new[1], new[2])
+    retrained = train_phase_hmm(X, lengths, states)
+    _assert_same_parameters(updated, retrained)
+    # The skip from phase 1 to 3 counts as an advance out of phase 1 (one pseudo-count each)
+    starts = np.r_[0, np.cumsum(lengths)[:-1]]
+    stay = advance = 1
+    for start, length in zip(starts, lengths):
+        seq = states[start:start + length]
+        stay += np.sum((seq[:-1] == 1) & (seq[1:] == 1))
+        advance += np.sum((seq[:-1] == 1) & (seq[1:] > 1))
+    np.testing.assert_allclose(retrained.transmat_[1, 2], advance / (stay + advance))
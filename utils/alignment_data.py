@@ -1,19 +1,121 @@
 import numpy as np
 import logging
-from core.feature_extraction import extract_features
+from core.kinematics import compute_kinematics, ANGLE_NAMES, KINEMATICS_CONFIG_FIELDS
+from utils.feature_cache import video_features
 
 logging.basicConfig(level=logging.INFO)
 
-def prepare_alignment_data(keypoints_dir, assessments, action_type, config=None, pitch_refs=None, keypoints=None):
+# Bump when the descriptor layout changes so cached descriptors are recomputed
+DESCRIPTOR_VERSION = 1
+DESCRIPTOR_CONFIG_FIELDS = KINEMATICS_CONFIG_FIELDS + (
+    "refiner_window_before", "refiner_window_after", "refiner_phase_samples",
+)
+
+# Landmarks whose speed is pooled: elbows, wrists, hips and ankles
+SPEED_LANDMARKS = {
+    "left_elbow": 13, "right_elbow": 14, "left_wrist": 15, "right_wrist": 16,
+    "left_hip": 23, "right_hip": 24, "left_ankle": 27, "right_ankle": 28,
+}
+POOLED_STATS = ("mean", "std", "min", "max")
+WRISTS = (SPEED_LANDMARKS["left_wrist"], SPEED_LANDMARKS["right_wrist"])
+
+
+def descriptor_names(config=None):
+    """
+    Args:
+        config: Configuration parameters ("refiner_phase_samples").
+    Returns:
+        Tuple of descriptor feature names, in alignment_descriptor() order.
+    """
+    config = config or {}
+    channels = ANGLE_NAMES + tuple(f"{name}_speed" for name in SPEED_LANDMARKS)
+    names = tuple(f"{channel}_{stat}" for channel in channels for stat in POOLED_STATS)
+    samples = config.get("refiner_phase_samples", 0)
+    names += tuple(f"{angle}_phase_{i}" for angle in ANGLE_NAMES for i in range(samples))
+    return names + ("window_coverage",)
+
+
+def delivery_window(kinematics, config=None):
     """
-    Prepare data for BiomechanicsRefiner training.
+    Frame range around the delivery: anchored on the peak wrist speed (release).
     Args:
-        keypoints_dir: Directory with keypoint JSONs (optional).
+        kinematics: Dict from core.kinematics.compute_kinematics().
+        config: Configuration parameters ("refiner_window_before", "refiner_window_after" frames).
+    Returns:
+        Tuple of (start, stop) frame indices, stop exclusive.
+    """
+    config = config or {}
+    n = len(kinematics["speed"])
+    speed = np.where(kinematics["velocity_valid"][:, WRISTS], kinematics["speed"][:, WRISTS], 0.0).max(axis=1)
+    peak = int(np.argmax(speed)) if n and speed.any() else n // 2
+    start = max(0, peak - config.get("refiner_window_before", 45))
+    stop = min(n, peak + config.get("refiner_window_after", 15) + 1)
+    return start, stop
+
+
+def _pooled_stats(values, valid):
+    """Per-column mean, std, min and max over valid rows, (columns, 4); columns without data are 0."""
+    count = valid.sum(axis=0)
+    safe = np.maximum(count, 1)
+    mean = np.where(valid, values, 0.0).sum(axis=0) / safe
+    std = np.sqrt(np.where(valid, (values - mean) ** 2, 0.0).sum(axis=0) / safe)
+    lo = np.where(valid, values, np.inf).min(axis=0, initial=np.inf)
+    hi = np.where(valid, values, -np.inf).max(axis=0, initial=-np.inf)
+    stats = np.stack([mean, std, lo, hi], axis=1)
+    stats[count == 0] = 0.0
+    return stats
+
+
+def _phase_samples(values, valid, samples):
+    """Each column linearly resampled at `samples` evenly spaced points over its valid rows, (columns, samples)."""
+    out = np.zeros((values.shape[1], samples))
+    positions = np.linspace(0, len(values) - 1, samples)
+    for k in range(values.shape[1]):
+        rows = np.flatnonzero(valid[:, k])
+        if len(rows):
+            out[k] = np.interp(positions, rows, values[rows, k])
+    return out
+
+
+def alignment_descriptor(keypoints, config=None):
+    """
+    Compact per-video descriptor for BiomechanicsRefiner: pooled statistics of joint
+    angles and landmark speeds over the delivery window, optionally followed by
+    angles resampled at "refiner_phase_samples" points across the window.
+    Args:
+        keypoints: KeypointSequence or list of keypoint frames.
+        config: Configuration parameters.
+    Returns:
+        (len(descriptor_names(config)),) float32 array.
+    """
+    config = config or {}
+    kinematics = compute_kinematics(keypoints, config)
+    start, stop = delivery_window(kinematics, config)
+    window = slice(start, stop)
+    landmarks = list(SPEED_LANDMARKS.values())
+    values = np.concatenate([kinematics["angles"][window], kinematics["speed"][window][:, landmarks]], axis=1)
+    valid = np.concatenate([kinematics["angle_valid"][window], kinematics["velocity_valid"][window][:, landmarks]], axis=1)
+    parts = [_pooled_stats(values.astype(np.float64), valid).ravel()]
+    samples = config.get("refiner_phase_samples", 0)
+    if samples:
+        angles = kinematics["angles"][window].astype(np.float64)
+        parts.append(_phase_samples(angles, kinematics["angle_valid"][window], samples).ravel())
+    coverage = float(kinematics["landmark_valid"][window].all(axis=1).mean()) if stop > start else 0.0
+    parts.append([coverage])
+    return np.concatenate(parts).astype(np.float32)
+
+
+def prepare_alignment_data(keypoints_dir, assessments, action_type, config=None, pitch_refs=None, keypoints=None, cache=None):
+    """
+    Prepare data for BiomechanicsRefiner: one alignment_descriptor() row per video.
+    Args:
+        keypoints_dir: Directory with keypoint files (optional).
         assessments: Dict of video_id to assessment data.
         action_type: 'fast' or 'spin'.
         config: Configuration parameters.
         pitch_refs: Dict of video_id to pitch reference.
         keypoints: Optional list of keypoints for single video.
+        cache: Optional FeatureCache for stored videos.
     Returns:
         Tuple of (X, y) for training.
     """
@@ -21,30 +123,26 @@ def prepare_alignment_data(keypoints_dir, assessments, action_type, config=None,
     pitch_refs = pitch_refs or {}
     X = []
     y = []
-    
+
     if keypoints:
         # Process single video
-        features, _, _, _ = extract_features(keypoints, action_type, pitch_refs.get(None, {"pitch_angle": 0})["pitch_angle"], config)
-        if features is not None:
-            X.extend(features)
-            y.extend([1 if action_type == 'fast' else 0] * len(features))
+        X.append(alignment_descriptor(keypoints, config))
+        y.append(1 if action_type == 'fast' else 0)
     else:
         for video_id, labels in assessments.items():
-            keypoints_path = os.path.join(keypoints_dir, f"bowling_analysis_{video_id}.json")
             try:
-                with open(keypoints_path, 'r') as f:
-                    keypoints = json.load(f)
+                arrays = video_features(
+                    keypoints_dir, video_id, lambda kps: {"descriptor": alignment_descriptor(kps, config)},
+                    "alignment_descriptor", DESCRIPTOR_VERSION, config, DESCRIPTOR_CONFIG_FIELDS,
+                    pitch_refs.get(video_id), cache, config.get("keypoints_prefix", "bowling_analysis")
+                )
             except Exception as e:
                 logging.error(f"Failed to load keypoints for {video_id}: {e}")
                 continue
-            
-            pitch_ref = pitch_refs.get(video_id, {"pitch_angle": 0})
-            features, _, _, _ = extract_features(keypoints, action_type, pitch_ref.get("pitch_angle", 0), config)
-            if features is not None:
-                X.extend(features)
-                y.extend([1 if labels["action_type"] == 'fast' else 0] * len(features))
-    
+            X.append(np.asarray(arrays["descriptor"]))
+            y.append(1 if labels["action_type"] == 'fast' else 0)
+
     if X and y:
-        return np.array(X), np.array(y)
+        return np.stack(X), np.array(y)
     logging.warning("No valid data for BiomechanicsRefiner training")
     return np.array([]), np.array([])
@@ -1,10 +1,16 @@
 import numpy as np
 import logging
 from core.frame_selection import select_key_frames
-from utils.angle_utils import compute_elbow_angle
+from utils.angle_utils import elbow_angle_array
+from utils.keypoint_sequence import KeypointSequence
+from models.angle_adjuster import ANGLE_FEATURE_NAMES, angle_features
+from utils.feature_cache import video_features
 
 logging.basicConfig(level=logging.INFO)
 
+# Bump when the angle feature layout changes so cached data is recomputed
+ANGLE_DATA_VERSION = 1
+
 def prepare_angle_data(keypoints, labels, action_type, config=None, pitch_ref=None):
     """
     Prepare angle data for training AngleAdjuster.
@@ -15,33 +21,72 @@ def prepare_angle_data(keypoints, labels, action_type, config=None, pitch_ref=No
         config: Configuration parameters.
         pitch_ref: Pitch reference data (pitch_angle, crease_y, crease_direction).
     Returns:
-        X_angle: Feature array.
+        X_angle: (key frames, len(ANGLE_FEATURE_NAMES)) feature array (see models.angle_adjuster.angle_features).
         y_angle: Angle labels.
     """
     config = config or {}
     pitch_ref = pitch_ref or {"pitch_angle": 0}
-    X_angle = []
-    y_angle = []
     
     # Select key frames
     selected_frames = select_key_frames(keypoints, None, action_type, config, pitch_ref)
+    seq = KeypointSequence.from_frames(keypoints)
     
+    frame_types = []
     for frame_type, frame_idx in selected_frames.items():
-        if frame_idx >= len(keypoints) or frame_idx < 0:
+        if frame_idx >= len(seq) or frame_idx < 0:
             logging.warning(f"Invalid {frame_type} index: {frame_idx}")
             continue
-        kp = keypoints[frame_idx]["keypoints"]
-        angle = compute_elbow_angle({"keypoints": kp}, config)
-        features = [
-            kp.get(f"landmark_{config.get('landmarks', {}).get('elbow_angle', {}).get('shoulder', 11)}", {"x": 0, "y": 0})["x"],
-            kp.get(f"landmark_{config.get('landmarks', {}).get('elbow_angle', {}).get('shoulder', 11)}", {"x": 0, "y": 0})["y"],
-            kp.get(f"landmark_{config.get('landmarks', {}).get('elbow_angle', {}).get('elbow', 13)}", {"x": 0, "y": 0})["x"],
-            kp.get(f"landmark_{config.get('landmarks', {}).get('elbow_angle', {}).get('elbow', 13)}", {"x": 0, "y": 0})["y"],
-            kp.get(f"landmark_{config.get('landmarks', {}).get('elbow_angle', {}).get('wrist', 14)}", {"x": 0, "y": 0})["x"],
-            kp.get(f"landmark_{config.get('landmarks', {}).get('elbow_angle', {}).get('wrist', 14)}", {"x": 0, "y": 0})["y"]
-        ]
-        X_angle.append(features)
-        y_angle.append(angle)
+        frame_types.append((frame_type, frame_idx))
+    if not frame_types:
+        return np.array([]), np.array([])
+    
+    frames = np.array([frame_idx for _, frame_idx in frame_types])
+    X_angle = angle_features(seq.array, frames, config)
+    y_angle, _ = elbow_angle_array(seq.array[frames], config)
+    for (frame_type, frame_idx), angle in zip(frame_types, y_angle):
         logging.info(f"Prepared {frame_type} (frame {frame_idx}): angle={angle:.2f}")
     
-    return np.array(X_angle) if X_angle else np.array([]), np.array(y_angle) if y_angle else np.array([])
+    return X_angle, y_angle
+
+def prepare_angle_dataset(keypoints_dir, assessments, action_type, config=None, pitch_refs=None, cache=None):
+    """
+    Prepare AngleAdjuster training data for every assessed video.
+    Args:
+        keypoints_dir: Directory with keypoint files.
+        assessments: Dict of video_id to assessment data.
+        action_type: 'fast' or 'spin'.
+        config: Configuration parameters.
+        pitch_refs: Dict of video_id to pitch reference.
+        cache: Optional FeatureCache.
+    Returns:
+        Tuple of (X_angle, y_angle) for training.
+    """
+    config = config or {}
+    pitch_refs = pitch_refs or {}
+    X = []
+    y = []
+
+    for video_id, labels in assessments.items():
+        pitch_ref = pitch_refs.get(video_id)
+
+        def compute(keypoints):
+            X_video, y_video = prepare_angle_data(keypoints, labels, action_type, config, pitch_ref)
+            return {"X": X_video.reshape(-1, len(ANGLE_FEATURE_NAMES)).astype(np.float32), "y": y_video.astype(np.float32)}
+
+        try:
+            # Key frame selection reads most of the config, so the whole config is fingerprinted
+            arrays = video_features(
+                keypoints_dir, video_id, compute, f"angle_data_{action_type}", ANGLE_DATA_VERSION,
+                config, None, pitch_ref, cache, config.get("keypoints_prefix", "bowling_analysis")
+            )
+        except Exception as e:
+            logging.error(f"Failed to prepare angle data for {video_id}: {e}")
+            continue
+        if len(arrays["X"]):
+            X.append(arrays["X"])
+            y.append(arrays["y"])
+
+    if X:
+        return np.concatenate(X), np.concatenate(y)
+    logging.warning("No valid data for AngleAdjuster training")
+    return np.array([]), np.array([])
@@ -1,8 +1,87 @@
 import numpy as np
 import logging
+from collections.abc import Mapping
 
 logging.basicConfig(level=logging.INFO)
 
+def vector_angles(v1, v2):
+    """
+    Angles between paired vectors.
+    Args:
+        v1, v2: (N, D) or (D,) vector arrays.
+    Returns:
+        Tuple of (angles in degrees, valid mask); invalid (zero-length) pairs are 0.
+    """
+    v1 = np.asarray(v1, dtype=np.float64)
+    v2 = np.asarray(v2, dtype=np.float64)
+    norms = np.linalg.norm(v1, axis=-1) * np.linalg.norm(v2, axis=-1)
+    valid = norms > 0
+    cos = np.einsum("...i,...i->...", v1, v2) / np.where(valid, norms, 1.0)
+    return np.where(valid, np.degrees(np.arccos(np.clip(cos, -1.0, 1.0))), 0.0), valid
+
+def joint_angles(p1, p2, p3, use_z=False):
+    """
+    Angles p1-p2-p3 at p2 for whole point arrays in one call.
+    Args:
+        p1, p2, p3: (N, 2) or (N, 3) point arrays (x, y[, z]).
+        use_z: Include z for true 3D angles; otherwise only x and y are used.
+    Returns:
+        Tuple of ((N,) angles in degrees, (N,) valid mask); invalid entries are 0.
+    """
+    dims = 3 if use_z else 2
+    p1 = np.asarray(p1, dtype=np.float64)[..., :dims]
+    p2 = np.asarray(p2, dtype=np.float64)[..., :dims]
+    p3 = np.asarray(p3, dtype=np.float64)[..., :dims]
+    return vector_angles(p1 - p2, p3 - p2)
+
+def _elbow_landmarks(config):
+    landmarks = config.get("landmarks", {}).get("elbow_angle", {})
+    return landmarks.get("shoulder", 11), landmarks.get("elbow", 13), landmarks.get("wrist", 14)
+
+def elbow_angle_array(array, config=None, use_z=False):
+    """
+    Shoulder-elbow-wrist angle for every frame of a (frames, 33, 4) keypoint array.
+    Args:
+        array: Keypoint array with x, y, z, visibility.
+        config: Configuration parameters (landmark indices, visibility threshold).
+        use_z: Use 3D angles.
+    Returns:
+        Tuple of ((frames,) angles in degrees, (frames,) valid mask).
+    """
+    config = config or {}
+    visibility_threshold = config.get("visibility_threshold", 0.6)
+    shoulder, elbow, wrist = _elbow_landmarks(config)
+    angles, valid = joint_angles(array[:, shoulder, :3], array[:, elbow, :3], array[:, wrist, :3], use_z)
+    valid &= (array[:, [shoulder, elbow, wrist], 3] >= visibility_threshold).all(axis=1)
+    return np.where(valid, angles, 0.0), valid
+
+def wrist_fallback_angle_array(array, config=None):
+    """
+    Elbow angle approximated with the elbow at the shoulder-wrist midpoint, for every frame.
+    Args:
+        array: Keypoint array (frames, 33, 4).
+        config: Configuration parameters.
+    Returns:
+        Tuple of ((frames,) angles in degrees, (frames,) valid mask); out-of-range angles are invalid.
+    """
+    config = config or {}
+    visibility_threshold = config.get("wrist_visibility_threshold", 0.6)
+    shoulder, _, wrist = _elbow_landmarks(config)
+    p1 = array[:, shoulder, :2]
+    p3 = array[:, wrist, :2]
+    angles, valid = joint_angles(p1, (p1 + p3) / 2, p3)
+    valid &= (array[:, shoulder, 3] >= visibility_threshold) & (array[:, wrist, 3] >= visibility_threshold)
+    valid &= (angles >= config.get("elbow_angle_min", 90)) & (angles <= config.get("elbow_angle_max", 180))
+    return np.where(valid, angles, 0.0), valid
+
+def _point_array(keypoints, landmarks):
+    """(1, 33, 4)-style array holding just the requested landmarks of one frame dict."""
+    array = np.zeros((1, max(landmarks) + 1, 4))
+    for lm in landmarks:
+        p = keypoints.get(f"landmark_{lm}", {})
+        array[0, lm] = [p.get("x", 0), p.get("y", 0), p.get("z", 0), p.get("visibility", 0)]
+    return array
+
 def compute_elbow_angle(kps, config=None):
     """
     Compute elbow angle from keypoints (landmark_11–13–14).
@@ -13,34 +92,14 @@ def compute_elbow_angle(kps, config=None):
         Angle in degrees.
     """
     config = config or {}
-    visibility_threshold = config.get("visibility_threshold", 0.6)
-    landmarks = config.get("landmarks", {}).get("elbow_angle", {"shoulder": 11, "elbow": 13, "wrist": 14})
-    
     keypoints = kps.get("keypoints", kps)
-    if not isinstance(keypoints, dict):
+    if not isinstance(keypoints, Mapping):
         logging.debug("Invalid keypoint data")
         return 0.0
-    
-    p1 = keypoints.get(f"landmark_{landmarks['shoulder']}", {"x": 0, "y": 0, "visibility": 0})
-    p2 = keypoints.get(f"landmark_{landmarks['elbow']}", {"x": 0, "y": 0, "visibility": 0})
-    p3 = keypoints.get(f"landmark_{landmarks['wrist']}", {"x": 0, "y": 0, "visibility": 0})
-    
-    if (p1["visibility"] < visibility_threshold or 
-        p2["visibility"] < visibility_threshold or 
-        p3["visibility"] < visibility_threshold):
-        logging.debug("Low visibility for elbow angle")
-        return 0.0
-    
-    v1 = np.array([p1["x"] - p2["x"], p1["y"] - p2["y"]])
-    v2 = np.array([p3["x"] - p2["x"], p3["y"] - p2["y"]])
-    dot_product = np.dot(v1, v2)
-    norms = np.linalg.norm(v1) * np.linalg.norm(v2)
-    if norms == 0:
-        logging.debug("Zero-length vector in elbow angle")
-        return 0.0
-    
-    angle = np.degrees(np.arccos(np.clip(dot_product / norms, -1.0, 1.0))) % 360
-    return angle
+    angles, valid = elbow_angle_array(_point_array(keypoints, _elbow_landmarks(config)), config)
+    if not valid[0]:
+        logging.debug("Low visibility or zero-length vector for elbow angle")
+    return float(angles[0])
 
 def compute_wrist_fallback_angle(kps, config=None):
     """
@@ -52,38 +111,11 @@ def compute_wrist_fallback_angle(kps, config=None):
         Angle in degrees.
     """
     config = config or {}
-    visibility_threshold = config.get("wrist_visibility_threshold", 0.6)
-    landmarks = config.get("landmarks", {}).get("elbow_angle", {"shoulder": 11, "wrist": 14})
-    
     keypoints = kps.get("keypoints", kps)
-    if not isinstance(keypoints, dict):
+    if not isinstance(keypoints, Mapping):
         logging.debug("Invalid keypoint data")
         return 0.0
-    
-    p1 = keypoints.get(f"landmark_{landmarks['shoulder']}", {"x": 0, "y": 0, "visibility": 0})
-    p3 = keypoints.get(f"landmark_{landmarks['wrist']}", {"x": 0, "y": 0, "visibility": 0})
-    
-    if p1["visibility"] < visibility_threshold or p3["visibility"] < visibility_threshold:
-        logging.debug("Low visibility for wrist fallback angle")
-        return 0.0
-    
-    # Approximate elbow position (midpoint or assume fixed offset)
-    p2_approx = {
-        "x": (p1["x"] + p3["x"]) / 2,
-        "y": (p1["y"] + p3["y"]) / 2
-    }
-    
-    v1 = np.array([p1["x"] - p2_approx["x"], p1["y"] - p2_approx["y"]])
-    v2 = np.array([p3["x"] - p2_approx["x"], p3["y"] - p2_approx["y"]])
-    dot_product = np.dot(v1, v2)
-    norms = np.linalg.norm(v1) * np.linalg.norm(v2)
-    if norms == 0:
-        logging.debug("Zero-length vector in wrist fallback angle")
-        return 0.0
-    
-    angle = np.degrees(np.arccos(np.clip(dot_product / norms, -1.0, 1.0))) % 360
-    if angle < config.get("elbow_angle_min", 90) or angle > config.get("elbow_angle_max", 180):
-        logging.debug(f"Wrist fallback angle {angle:.2f} out of range")
-        return 0.0
-    
-    return angle
+    angles, valid = wrist_fallback_angle_array(_point_array(keypoints, _elbow_landmarks(config)), config)
+    if not valid[0]:
+        logging.debug("Low visibility, zero-length vector or out-of-range wrist fallback angle")
+    return float(angles[0])
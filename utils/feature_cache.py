@@ -0,0 +1,357 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from utils.keypoint_store import keypoints_file, load_video_keypoints, load_pitch_reference
+
+logging.basicConfig(level=logging.INFO)
+
+DEFAULT_CACHE_DIR = "feature_cache"
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+CACHE_VERSION = 1
+
+_hash_memo = {}
+_hash_lock = threading.Lock()
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """
+    SHA-256 of a file's content, memoized per (path, mtime, size) within the process.
+    Args:
+        path: File path.
+        chunk_size: Read size in bytes.
+    Returns:
+        Hex digest.
+    """
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    with _hash_lock:
+        digest = _hash_memo.get(memo_key)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        with _hash_lock:
+            _hash_memo[memo_key] = digest
+    return digest
+
+
+def array_sha256(*arrays):
+    """
+    SHA-256 over the dtype, shape and bytes of arrays (e.g. a training set).
+    Args:
+        arrays: Arrays to hash, in order.
+    Returns:
+        Hex digest.
+    """
+    h = hashlib.sha256()
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        h.update(f"{array.dtype.str}{array.shape}".encode("utf-8"))
+        h.update(array.tobytes())
+    return h.hexdigest()
+
+
+def config_fingerprint(config, fields=None):
+    """
+    Stable fingerprint of the config fields a featurizer depends on.
+    Args:
+        config: Configuration parameters.
+        fields: Keys to include; None includes the whole config.
+    Returns:
+        Hex digest.
+    """
+    config = config or {}
+    if fields is not None:
+        config = {key: config.get(key) for key in fields}
+    payload = json.dumps(config, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class FeatureCache:
+    """
+    On-disk store of per-video feature arrays.
+    Each entry is a directory of .npy files named after the arrays, keyed by
+    the keypoint file's content hash, the pitch angle applied on load, the
+    featurizer name and version and a fingerprint of the config fields it
+    reads. Changing any of them yields a new key, so stale entries are never
+    returned; they age out through LRU eviction (entry mtime is the access time).
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, mmap=True):
+        """
+        Args:
+            cache_dir: Cache directory (created on demand).
+            max_bytes: Total size limit; least recently used entries are evicted past it.
+            mmap: Return read-only memory-mapped arrays instead of loading them.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.mmap = mmap
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, keypoints_path, name, version, config=None, config_fields=None, pitch_angle=None):
+        """
+        Args:
+            keypoints_path: Keypoint file the features are computed from.
+            name: Featurizer name.
+            version: Featurizer version; bump it when its output changes.
+            config: Configuration parameters.
+            config_fields: Config keys the featurizer reads (None for all).
+            pitch_angle: Pitch correction applied on load, if any.
+        Returns:
+            Cache key (hex digest).
+        """
+        parts = [
+            str(CACHE_VERSION), file_sha256(keypoints_path), name, str(version),
+            config_fingerprint(config, config_fields), repr(None if pitch_angle is None else float(pitch_angle))
+        ]
+        return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def get(self, key):
+        """
+        Args:
+            key: Cache key.
+        Returns:
+            Dict of array name to array, or None on a miss.
+        """
+        entry = self._entry_dir(key)
+        if not os.path.isdir(entry):
+            return None
+        try:
+            arrays = {
+                filename[:-4]: np.load(os.path.join(entry, filename), mmap_mode="r" if self.mmap else None)
+                for filename in os.listdir(entry) if filename.endswith(".npy")
+            }
+            os.utime(entry)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Discarding unreadable feature cache entry {key}: {e}")
+            shutil.rmtree(entry, ignore_errors=True)
+            return None
+        return arrays
+
+    def put(self, key, arrays):
+        """
+        Store arrays atomically under key, then evict to the size limit.
+        Args:
+            key: Cache key.
+            arrays: Dict of array name to array.
+        Returns:
+            Dict of the stored arrays as get() would return them.
+        """
+        entry = self._entry_dir(key)
+        tmp = f"{entry}.tmp{os.getpid()}_{threading.get_ident()}"
+        os.makedirs(tmp, exist_ok=True)
+        try:
+            for name, array in arrays.items():
+                np.save(os.path.join(tmp, f"{name}.npy"), np.ascontiguousarray(array))
+            try:
+                os.replace(tmp, entry)
+            except OSError:
+                # Another writer stored the same key first; its content is identical
+                shutil.rmtree(tmp, ignore_errors=True)
+        except Exception:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        self.evict()
+        stored = self.get(key)
+        return stored if stored is not None else arrays
+
+    def get_or_compute(self, key, compute):
+        """
+        Args:
+            key: Cache key.
+            compute: Zero-argument callable returning a dict of arrays.
+        Returns:
+            Dict of array name to array.
+        """
+        arrays = self.get(key)
+        if arrays is not None:
+            with self._lock:
+                self.hits += 1
+            return arrays
+        with self._lock:
+            self.misses += 1
+        return self.put(key, compute())
+
+    def evict(self):
+        """
+        Remove least recently used entries until the cache fits max_bytes.
+        Returns:
+            Number of entries removed.
+        """
+        entries = []
+        total = 0
+        for shard in os.listdir(self.cache_dir):
+            shard_dir = os.path.join(self.cache_dir, shard)
+            if not os.path.isdir(shard_dir):
+                continue
+            for key in os.listdir(shard_dir):
+                entry = os.path.join(shard_dir, key)
+                if ".tmp" in key or not os.path.isdir(entry):
+                    continue
+                try:
+                    size = sum(f.stat().st_size for f in os.scandir(entry))
+                    entries.append((os.stat(entry).st_mtime, size, entry))
+                except OSError:
+                    continue
+                total += size
+        removed = 0
+        for _, size, entry in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            removed += 1
+        if removed:
+            logging.info(f"Feature cache evicted {removed} entries ({total / 1e6:.1f} MB kept)")
+        return removed
+
+    def clear(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / max(self.hits + self.misses, 1)}
+
+
+class KeypointCorpus:
+    """
+    Pitch-corrected keypoints of many videos, each loaded at most once and shared
+    by every featurizer (and action type) that misses the feature cache. Pass it
+    wherever a keypoints_dir is expected by the dataset builders.
+    """
+
+    def __init__(self, keypoints_dir, prefix="bowling_analysis"):
+        """
+        Args:
+            keypoints_dir: Directory with keypoint files.
+            prefix: Keypoint filename prefix.
+        """
+        self.keypoints_dir = keypoints_dir
+        self.prefix = prefix
+        self._sequences = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def get(self, video_id, pitch_ref=None, prefix=None):
+        """
+        Args:
+            video_id: Video identifier.
+            pitch_ref: Pitch reference applied on load; None reads pitch_reference_<id>.json.
+            prefix: Keypoint filename prefix (defaults to the corpus prefix).
+        Returns:
+            KeypointSequence, loaded on first request.
+        """
+        prefix = prefix or self.prefix
+        if pitch_ref is None:
+            # Resolve the on-disk reference now so a recalibrated video gets a new memo key
+            pitch_ref = load_pitch_reference(self.keypoints_dir, video_id)
+        key = (video_id, prefix, (pitch_ref or {}).get("pitch_angle"))
+        with self._lock:
+            seq = self._sequences.get(key)
+        if seq is None:
+            seq = load_video_keypoints(self.keypoints_dir, video_id, pitch_ref, prefix)
+            with self._lock:
+                seq = self._sequences.setdefault(key, seq)
+                self.loads += 1
+        return seq
+
+    def preload(self, video_ids, pitch_refs=None, workers=4):
+        """
+        Load many videos concurrently (file reads and pitch correction release the GIL).
+        Args:
+            video_ids: Iterable of video identifiers.
+            pitch_refs: Dict of video_id to pitch reference.
+            workers: Loader threads.
+        Returns:
+            Number of videos available.
+        """
+        pitch_refs = pitch_refs or {}
+
+        def load(video_id):
+            try:
+                self.get(video_id, pitch_refs.get(video_id))
+            except Exception as e:
+                logging.error(f"Failed to load keypoints for {video_id}: {e}")
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            list(pool.map(load, list(video_ids)))
+        return len(self._sequences)
+
+    def nbytes(self):
+        """Memory held by the loaded keypoint arrays."""
+        with self._lock:
+            return sum(seq.array.nbytes + seq.mask.nbytes for seq in self._sequences.values())
+
+
+def keypoints_root(keypoints_dir):
+    """Directory behind a keypoints_dir argument (a path or a KeypointCorpus)."""
+    return keypoints_dir.keypoints_dir if isinstance(keypoints_dir, KeypointCorpus) else keypoints_dir
+
+
+def video_features(keypoints_dir, video_id, compute, name, version, config=None, config_fields=None,
+                   pitch_ref=None, cache=None, prefix="bowling_analysis"):
+    """
+    Features for one video, from the cache when possible.
+    Keypoints are only loaded (and pitch-corrected) on a cache miss.
+    Args:
+        keypoints_dir: Directory with keypoint files, or a KeypointCorpus to load through.
+        video_id: Video identifier.
+        compute: Callable(keypoints) returning a dict of arrays.
+        name: Featurizer name.
+        version: Featurizer version.
+        config: Configuration parameters.
+        config_fields: Config keys the featurizer reads (None for all).
+        pitch_ref: Pitch reference dict applied on load; None reads pitch_reference_<id>.json.
+        cache: Optional FeatureCache; None always computes.
+        prefix: Keypoint filename prefix.
+    Returns:
+        Dict of array name to array.
+    """
+    corpus = keypoints_dir if isinstance(keypoints_dir, KeypointCorpus) else None
+    keypoints_dir = keypoints_root(keypoints_dir)
+    if pitch_ref is None:
+        # The angle applied on load is part of the key, so read pitch_reference_<id>.json up front
+        pitch_ref = load_pitch_reference(keypoints_dir, video_id)
+
+    def load_and_compute():
+        if corpus is not None:
+            return compute(corpus.get(video_id, pitch_ref, prefix))
+        return compute(load_video_keypoints(keypoints_dir, video_id, pitch_ref, prefix))
+
+    if cache is None:
+        return load_and_compute()
+    path = keypoints_file(keypoints_dir, video_id, prefix)
+    pitch_angle = (pitch_ref or {}).get("pitch_angle")
+    key = cache.key(path, name, version, config, config_fields, pitch_angle)
+    return cache.get_or_compute(key, load_and_compute)
+
+
+def create_feature_cache(config=None, default_dir=DEFAULT_CACHE_DIR):
+    """
+    Build the cache described by config ("feature_cache_dir", "feature_cache_max_mb").
+    Args:
+        config: Configuration parameters; "feature_cache_dir": null disables caching.
+        default_dir: Directory used when config does not name one.
+    Returns:
+        FeatureCache or None.
+    """
+    config = config or {}
+    cache_dir = config.get("feature_cache_dir", default_dir)
+    if not cache_dir:
+        return None
+    max_mb = config.get("feature_cache_max_mb", DEFAULT_MAX_BYTES // (1024 ** 2))
+    return FeatureCache(cache_dir, max_bytes=int(max_mb * 1024 ** 2))
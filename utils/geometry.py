@@ -1,14 +1,19 @@
-import numpy as np
 import logging
+from utils.angle_utils import joint_angles
 
 logging.basicConfig(level=logging.INFO)
 
 def calculate_angle(p1, p2, p3, pitch_angle=0):
-    v1 = np.array([p1["x"] - p2["x"], p1["y"] - p2["y"]])
-    v2 = np.array([p3["x"] - p2["x"], p3["y"] - p2["y"]])
-    dot_product = np.dot(v1, v2)
-    norms = np.linalg.norm(v1) * np.linalg.norm(v2)
-    angle = np.degrees(np.arccos(dot_product / norms if norms > 0 else 1)) % 360
+    """
+    Angle p1-p2-p3 minus the pitch angle; use utils.angle_utils.joint_angles for arrays.
+    Args:
+        p1, p2, p3: Points with 'x' and 'y' coordinates.
+        pitch_angle: Angle in degrees subtracted from the result.
+    Returns:
+        Adjusted angle in degrees.
+    """
+    angles, _ = joint_angles(*([[p["x"], p["y"]]] for p in (p1, p2, p3)))
+    angle = float(angles[0])
     adjusted_angle = angle - pitch_angle
-    logging.info(f"Calculated angle: raw={angle:.2f}, pitch={pitch_angle:.2f}, adjusted={adjusted_angle:.2f}")
+    logging.debug(f"Calculated angle: raw={angle:.2f}, pitch={pitch_angle:.2f}, adjusted={adjusted_angle:.2f}")
     return adjusted_angle
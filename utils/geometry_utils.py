@@ -1,18 +1,13 @@
-import numpy as np
+from utils.angle_utils import joint_angles
 
 def calculate_angle(p1, p2, p3):
     """
     Calculate angle between three points (p1–p2–p3).
+    Thin wrapper over utils.angle_utils.joint_angles, which takes whole point arrays.
     Args:
         p1, p2, p3: Points with 'x' and 'y' coordinates.
     Returns:
         Angle in degrees.
     """
-    v1 = np.array([p1["x"] - p2["x"], p1["y"] - p2["y"]])
-    v2 = np.array([p3["x"] - p2["x"], p3["y"] - p2["y"]])
-    dot_product = np.dot(v1, v2)
-    norms = np.linalg.norm(v1) * np.linalg.norm(v2)
-    if norms == 0:
-        return 0.0
-    angle = np.degrees(np.arccos(np.clip(dot_product / norms, -1.0, 1.0))) % 360
-    return angle
+    angles, _ = joint_angles(*([[p["x"], p["y"]]] for p in (p1, p2, p3)))
+    return float(angles[0])
@@ -0,0 +1,175 @@
+import numpy as np
+from collections.abc import Mapping, Sequence
+
+NUM_LANDMARKS = 33
+CHANNELS = ("x", "y", "z", "visibility")
+_CHANNEL_INDEX = {c: i for i, c in enumerate(CHANNELS)}
+_LANDMARK_KEYS = tuple(f"landmark_{i}" for i in range(NUM_LANDMARKS))
+_LANDMARK_INDEX = {k: i for i, k in enumerate(_LANDMARK_KEYS)}
+
+
+class LandmarkView(Mapping):
+    """Read-only {"x", "y", "z", "visibility"} view of one landmark in one frame."""
+    __slots__ = ("_array", "_frame", "_landmark")
+
+    def __init__(self, array, frame, landmark):
+        self._array = array
+        self._frame = frame
+        self._landmark = landmark
+
+    def __getitem__(self, key):
+        return float(self._array[self._frame, self._landmark, _CHANNEL_INDEX[key]])
+
+    def __iter__(self):
+        return iter(CHANNELS)
+
+    def __len__(self):
+        return len(CHANNELS)
+
+
+class LandmarksView(Mapping):
+    """Read-only {"landmark_i": LandmarkView} view of one frame; empty when nothing was detected."""
+    __slots__ = ("_array", "_frame", "_detected")
+
+    def __init__(self, array, frame, detected):
+        self._array = array
+        self._frame = frame
+        self._detected = detected
+
+    def __getitem__(self, key):
+        if not self._detected:
+            raise KeyError(key)
+        return LandmarkView(self._array, self._frame, _LANDMARK_INDEX[key])
+
+    def __iter__(self):
+        return iter(_LANDMARK_KEYS if self._detected else ())
+
+    def __len__(self):
+        return NUM_LANDMARKS if self._detected else 0
+
+
+class FrameView(Mapping):
+    """Read-only {"keypoints": LandmarksView} view of one frame."""
+    __slots__ = ("_keypoints",)
+
+    def __init__(self, array, frame, detected):
+        self._keypoints = LandmarksView(array, frame, detected)
+
+    def __getitem__(self, key):
+        if key != "keypoints":
+            raise KeyError(key)
+        return self._keypoints
+
+    def __iter__(self):
+        return iter(("keypoints",))
+
+    def __len__(self):
+        return 1
+
+
+class KeypointSequence(Sequence):
+    """
+    Keypoint sequence backed by a (frames, 33, 4) array.
+    Indexing returns lazy views that support the legacy
+    seq[i]["keypoints"]["landmark_13"]["x"] access path, so code written for
+    list-of-dicts keypoints works unchanged. Vectorized code should use
+    array, mask, visibility or landmark(), which never copy.
+    """
+
+    def __init__(self, array, mask=None, header=None):
+        """
+        Args:
+            array: Array of shape (frames, 33, 4) with x, y, z, visibility.
+            mask: Per-frame detection mask; defaults to all frames detected.
+            header: Optional metadata (fps, source hash, extractor settings).
+        """
+        if array.ndim != 3 or array.shape[1:] != (NUM_LANDMARKS, len(CHANNELS)):
+            raise ValueError(f"Expected (frames, {NUM_LANDMARKS}, {len(CHANNELS)}) keypoints, got {array.shape}")
+        self._array = array
+        self._mask = np.ones(len(array), dtype=bool) if mask is None else mask
+        self.header = header or {}
+
+    @classmethod
+    def from_frames(cls, frames, header=None):
+        """
+        Build a sequence from list-of-dicts keypoints (copies once).
+        Args:
+            frames: List of {"keypoints": {"landmark_i": {...}}} dicts, or a KeypointSequence.
+            header: Optional metadata.
+        Returns:
+            KeypointSequence.
+        """
+        if isinstance(frames, cls):
+            return frames
+        array = np.zeros((len(frames), NUM_LANDMARKS, len(CHANNELS)), dtype=np.float32)
+        mask = np.zeros(len(frames), dtype=bool)
+        for i, frame in enumerate(frames):
+            kp = frame.get("keypoints", {}) if isinstance(frame, Mapping) else {}
+            if not kp:
+                continue
+            mask[i] = True
+            for lm, key in enumerate(_LANDMARK_KEYS):
+                data = kp.get(key)
+                if data:
+                    array[i, lm] = [data.get(c, 0.0) for c in CHANNELS]
+        return cls(array, mask, header)
+
+    @property
+    def array(self):
+        return self._array
+
+    @property
+    def mask(self):
+        return self._mask
+
+    @property
+    def coords(self):
+        return self._array[..., :3]
+
+    @property
+    def visibility(self):
+        return self._array[..., 3]
+
+    @property
+    def fps(self):
+        return self.header.get("fps")
+
+    def landmark(self, index):
+        """
+        Args:
+            index: Landmark index (0-32).
+        Returns:
+            (frames, 4) view of one landmark across the sequence.
+        """
+        return self._array[:, index]
+
+    def to_frames(self):
+        """
+        Materialize list-of-dicts keypoints (for JSON export or code that mutates frames).
+        Returns:
+            List of keypoint frame dicts.
+        """
+        frames = []
+        for i in range(len(self._array)):
+            kp = {}
+            if self._mask[i]:
+                for lm, key in enumerate(_LANDMARK_KEYS):
+                    kp[key] = {c: float(self._array[i, lm, j]) for j, c in enumerate(CHANNELS)}
+            frames.append({"keypoints": kp})
+        return frames
+
+    def __len__(self):
+        return len(self._array)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return KeypointSequence(self._array[index], self._mask[index], self.header)
+        n = len(self._array)
+        if index < 0:
+            index += n
+        if not 0 <= index < n:
+            raise IndexError(f"Frame index {index} out of range for {n} frames")
+        return FrameView(self._array, index, bool(self._mask[index]))
+
+    def __repr__(self):
+        return f"KeypointSequence(frames={len(self)}, detected={int(np.count_nonzero(self._mask))})"
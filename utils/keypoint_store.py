@@ -0,0 +1,265 @@
+import os
+import json
+import struct
+import hashlib
+import logging
+import numpy as np
+from utils.keypoint_sequence import NUM_LANDMARKS, CHANNELS, KeypointSequence
+from core.rotation import CAMERA_TILT, rotate_keypoints
+
+logging.basicConfig(level=logging.INFO)
+
+STORE_EXTENSION = ".kps"
+STORE_MAGIC = b"BVKPSTR\x00"
+STORE_VERSION = 1
+_HEADER_LEN = struct.Struct("<I")
+_ALIGNMENT = 64
+
+
+def frames_to_array(frames):
+    """
+    Convert legacy list-of-dicts keypoints into a dense array.
+    Args:
+        frames: List of {"keypoints": {"landmark_i": {x, y, z, visibility}}} dicts.
+    Returns:
+        Tuple of (array, mask): float32 (frames, 33, 4) and bool (frames,) detection mask.
+    """
+    seq = KeypointSequence.from_frames(frames)
+    return seq.array, seq.mask
+
+
+def array_to_frames(array, mask):
+    """
+    Convert a dense keypoint array back into legacy list-of-dicts keypoints.
+    Args:
+        array: Array of shape (frames, 33, 4).
+        mask: Per-frame detection mask.
+    Returns:
+        List of keypoint frame dicts; undetected frames have empty "keypoints".
+    """
+    return KeypointSequence(array, mask).to_frames()
+
+
+def video_sha256(video_path, chunk_size=1 << 20):
+    """
+    Hash a video file so stored keypoints can be traced to their source.
+    Args:
+        video_path: Path to video file.
+        chunk_size: Read size in bytes.
+    Returns:
+        Hex digest, or None if the file cannot be read.
+    """
+    digest = hashlib.sha256()
+    try:
+        with open(video_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+    except OSError as e:
+        logging.error(f"Failed to hash {video_path}: {e}")
+        return None
+    return digest.hexdigest()
+
+
+def write_keypoint_store(path, array, mask, fps=None, video_sha256=None, extractor=None, pitch_corrected=False):
+    """
+    Write keypoints to the binary store format.
+    Layout: magic, little-endian uint32 header length, JSON header padded to a
+    64-byte boundary, float32 (frames, 33, 4) array, uint8 (frames,) mask.
+    Args:
+        path: Output path (conventionally bowling_analysis_<id>.kps).
+        array: Keypoint array of shape (frames, 33, 4).
+        mask: Per-frame detection mask.
+        fps: Source video frame rate.
+        video_sha256: Source video content hash.
+        extractor: Dict of extractor settings.
+        pitch_corrected: False for raw pose output (corrected on load), True if
+            already corrected, None if unknown (e.g. converted legacy JSON).
+    """
+    array = np.ascontiguousarray(array, dtype='<f4')
+    mask = np.ascontiguousarray(mask, dtype=np.uint8)
+    if array.ndim != 3 or array.shape[1:] != (NUM_LANDMARKS, len(CHANNELS)) or len(mask) != len(array):
+        raise ValueError(f"Expected ({len(mask)}, {NUM_LANDMARKS}, {len(CHANNELS)}) keypoints, got {array.shape}")
+
+    header = {
+        "version": STORE_VERSION,
+        "frames": int(array.shape[0]),
+        "landmarks": NUM_LANDMARKS,
+        "channels": list(CHANNELS),
+        "fps": float(fps) if fps else None,
+        "video_sha256": video_sha256,
+        "extractor": extractor or {},
+        "pitch_corrected": pitch_corrected,
+    }
+    header_bytes = json.dumps(header).encode("utf-8")
+    prefix_len = len(STORE_MAGIC) + _HEADER_LEN.size
+    padding = -(prefix_len + len(header_bytes)) % _ALIGNMENT
+    header_bytes += b" " * padding
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(STORE_MAGIC)
+        f.write(_HEADER_LEN.pack(len(header_bytes)))
+        f.write(header_bytes)
+        f.write(array.tobytes())
+        f.write(mask.tobytes())
+    os.replace(tmp_path, path)
+    logging.info(f"Saved {array.shape[0]} frames of keypoints to {path}")
+
+
+def read_keypoint_store(path, mmap=True):
+    """
+    Read keypoints from the binary store format.
+    Args:
+        path: Path to .kps file.
+        mmap: Memory-map the arrays instead of reading them into memory.
+    Returns:
+        Tuple of (array, mask, header); array is read-only when memory-mapped.
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(STORE_MAGIC)) != STORE_MAGIC:
+            raise ValueError(f"{path} is not a keypoint store")
+        (header_len,) = _HEADER_LEN.unpack(f.read(_HEADER_LEN.size))
+        header = json.loads(f.read(header_len).decode("utf-8"))
+    if header.get("version") != STORE_VERSION:
+        raise ValueError(f"Unsupported keypoint store version {header.get('version')} in {path}")
+
+    shape = (header["frames"], header["landmarks"], len(header["channels"]))
+    offset = len(STORE_MAGIC) + _HEADER_LEN.size + header_len
+    mask_offset = offset + int(np.prod(shape)) * 4
+    if mmap and shape[0] > 0:
+        array = np.memmap(path, dtype='<f4', mode='r', offset=offset, shape=shape)
+        mask = np.memmap(path, dtype=np.uint8, mode='r', offset=mask_offset, shape=(shape[0],)).view(bool)
+    else:
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            array = np.fromfile(f, dtype='<f4', count=int(np.prod(shape))).reshape(shape)
+            mask = np.fromfile(f, dtype=np.uint8, count=shape[0]).astype(bool)
+    return array, mask, header
+
+
+def keypoints_file(keypoints_dir, video_id, prefix="bowling_analysis"):
+    """
+    Resolve the keypoint file for a video, preferring the binary store over legacy JSON.
+    Args:
+        keypoints_dir: Directory with keypoint files.
+        video_id: Video identifier.
+        prefix: Keypoint file prefix.
+    Returns:
+        Path to the .kps file if present, otherwise the legacy .json path.
+    """
+    base = os.path.join(keypoints_dir, f"{prefix}_{video_id}")
+    if os.path.exists(base + STORE_EXTENSION):
+        return base + STORE_EXTENSION
+    return base + ".json"
+
+
+def load_keypoints(path, mmap=True):
+    """
+    Load keypoints from a binary store or legacy JSON file.
+    Args:
+        path: Path to .kps or .json keypoint file.
+        mmap: Memory-map store files instead of reading them into memory.
+    Returns:
+        KeypointSequence (usable wherever list-of-dicts keypoints are accepted).
+    """
+    if path.endswith(STORE_EXTENSION):
+        array, mask, header = read_keypoint_store(path, mmap=mmap)
+        return KeypointSequence(array, mask, header)
+    with open(path, 'r') as f:
+        return KeypointSequence.from_frames(json.load(f))
+
+
+def pitch_reference_file(keypoints_dir, video_id):
+    """
+    Args:
+        keypoints_dir: Directory with keypoint and pitch reference files.
+        video_id: Video identifier.
+    Returns:
+        Path to pitch_reference_<id>.json.
+    """
+    return os.path.join(keypoints_dir, f"pitch_reference_{video_id}.json")
+
+
+def load_pitch_reference(keypoints_dir, video_id):
+    """
+    Args:
+        keypoints_dir: Directory with keypoint and pitch reference files.
+        video_id: Video identifier.
+    Returns:
+        Pitch reference dict from pitch_reference_<id>.json, or None if there is none.
+    """
+    pitch_path = pitch_reference_file(keypoints_dir, video_id)
+    if not os.path.exists(pitch_path):
+        return None
+    with open(pitch_path, 'r') as f:
+        return json.load(f)
+
+
+def apply_pitch_correction(seq, pitch_angle):
+    """
+    Rotate keypoints about the X axis (Y-Z plane) to correct for camera tilt (see core.rotation).
+    Args:
+        seq: KeypointSequence of raw keypoints.
+        pitch_angle: Camera pitch in degrees.
+    Returns:
+        New KeypointSequence; the source (possibly memory-mapped) is not modified.
+    """
+    array = np.array(seq.array, dtype=np.float32)
+    if pitch_angle:
+        rotate_keypoints(array, pitch_angle, CAMERA_TILT, in_place=True)
+    header = dict(seq.header, pitch_corrected=True, pitch_angle=float(pitch_angle or 0))
+    return KeypointSequence(array, np.array(seq.mask), header)
+
+
+def load_video_keypoints(keypoints_dir, video_id, pitch_ref=None, prefix="bowling_analysis"):
+    """
+    Load keypoints for a video with pitch correction applied.
+    Raw stores are corrected on load using pitch_ref, or pitch_reference_<id>.json
+    from keypoints_dir when pitch_ref is not given. Files that are already
+    corrected (or of unknown provenance, like legacy JSON) are returned as stored.
+    Args:
+        keypoints_dir: Directory with keypoint and pitch reference files.
+        video_id: Video identifier.
+        pitch_ref: Optional pitch reference dict with "pitch_angle".
+        prefix: Keypoint file prefix.
+    Returns:
+        KeypointSequence.
+    """
+    seq = load_keypoints(keypoints_file(keypoints_dir, video_id, prefix))
+    if seq.header.get("pitch_corrected") is not False:
+        return seq
+    if pitch_ref is None:
+        pitch_ref = load_pitch_reference(keypoints_dir, video_id)
+        if pitch_ref is None:
+            logging.debug(f"No pitch reference for {video_id}; using raw keypoints")
+            return seq
+    return apply_pitch_correction(seq, pitch_ref.get("pitch_angle", 0))
+
+
+def convert_json_to_store(json_path, store_path=None, fps=None):
+    """
+    Convert a legacy keypoint JSON file to the binary store format.
+    Args:
+        json_path: Path to bowling_analysis_<id>.json.
+        store_path: Output path; defaults to the JSON path with a .kps extension.
+        fps: Source video frame rate, if known.
+    Returns:
+        Path to the written store.
+    """
+    store_path = store_path or os.path.splitext(json_path)[0] + STORE_EXTENSION
+    seq = load_keypoints(json_path)
+    write_keypoint_store(
+        store_path, seq.array, seq.mask, fps=fps,
+        extractor={"converted_from": os.path.basename(json_path)},
+        pitch_corrected=None
+    )
+    return store_path
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) < 2:
+        print("Usage: python -m utils.keypoint_store <keypoints_json> [<keypoints_json> ...]")
+        sys.exit(1)
+    for json_path in sys.argv[1:]:
+        convert_json_to_store(json_path)
@@ -1,7 +1,9 @@
 import cv2
 import mediapipe as mp
-import numpy as np
 import logging
+from utils.keypoint_sequence import KeypointSequence
+from utils.pose_pipeline import run_pose_pipeline
+from core.rotation import IMAGE_PLANE, adjust_landmark_dict
 
 logging.basicConfig(level=logging.INFO)
 
@@ -10,9 +12,9 @@ def extract_keypoints(video_path, config=None):
     Extract keypoints from a video using MediaPipe Pose.
     Args:
         video_path: Path to video file.
-        config: Configuration parameters (e.g., visibility threshold).
+        config: Configuration parameters (e.g., visibility threshold, pipelined, pipeline_queue_size).
     Returns:
-        List of keypoint dictionaries per frame.
+        KeypointSequence (usable as a list of keypoint dictionaries per frame).
     """
     config = config or {}
     mp_pose = mp.solutions.pose
@@ -25,38 +27,27 @@ def extract_keypoints(video_path, config=None):
     cap = cv2.VideoCapture(video_path)
     if not cap.isOpened():
         logging.error(f"Cannot open video {video_path}")
-        return []
-    
-    keypoints = []
-    
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-        
-        # Convert to RGB
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = pose.process(frame_rgb)
-        
-        frame_keypoints = {"keypoints": {}}
-        if results.pose_landmarks:
-            for i, lm in enumerate(results.pose_landmarks.landmark):
-                frame_keypoints["keypoints"][f"landmark_{i}"] = {
-                    "x": lm.x,
-                    "y": lm.y,
-                    "visibility": lm.visibility
-                }
-        keypoints.append(frame_keypoints)
-    
-    cap.release()
-    pose.close()
+        return KeypointSequence.from_frames([])
+    
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    try:
+        array, mask, _ = run_pose_pipeline(
+            cap,
+            pose,
+            pipelined=config.get("pipelined", True),
+            queue_size=config.get("pipeline_queue_size", 8)
+        )
+    finally:
+        cap.release()
+        pose.close()
+    keypoints = KeypointSequence(array, mask, {"fps": fps})
     
     logging.info(f"Extracted {len(keypoints)} frames of keypoints from {video_path}")
     return keypoints
 
 def adjust_keypoints(keypoints, pitch_angle):
     """
-    Adjust keypoints for pitch angle.
+    Adjust keypoints for pitch angle (image-plane rotation; see core.rotation).
     Args:
         keypoints: Dict of keypoints (landmark_i: {x, y, visibility}).
         pitch_angle: Angle in degrees.
@@ -66,24 +57,4 @@ def adjust_keypoints(keypoints, pitch_angle):
     if not keypoints:
         return {}
     
-    adjusted = {}
-    theta = np.radians(pitch_angle)
-    cos_theta = np.cos(theta)
-    sin_theta = np.sin(theta)
-    
-    for lm_key, lm_data in keypoints.items():
-        x = lm_data.get("x", 0)
-        y = lm_data.get("y", 0)
-        visibility = lm_data.get("visibility", 0)
-        
-        # Rotate coordinates counterclockwise
-        x_new = x * cos_theta + y * sin_theta
-        y_new = -x * sin_theta + y * cos_theta
-        
-        adjusted[lm_key] = {
-            "x": float(x_new),
-            "y": float(y_new),
-            "visibility": float(visibility)
-        }
-    
-    return adjusted
+    return adjust_landmark_dict(keypoints, pitch_angle, IMAGE_PLANE, include_z=False)
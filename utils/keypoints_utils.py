@@ -1,7 +1,9 @@
 import cv2
 import mediapipe as mp
-import numpy as np
 import logging
+from utils.keypoint_sequence import KeypointSequence
+from utils.pose_pipeline import run_pose_pipeline
+from core.rotation import IMAGE_PLANE, adjust_landmark_dict
 
 logging.basicConfig(level=logging.INFO)
 
@@ -10,15 +12,15 @@ def extract_keypoints(video_path, config=None):
     Extract 3D keypoints from a video using MediaPipe Pose.
     Args:
         video_path: Path to video file.
-        config: Configuration parameters (e.g., visibility threshold).
+        config: Configuration parameters (e.g., visibility threshold, pipelined, pipeline_queue_size).
     Returns:
-        List of keypoint dictionaries per frame with 3D coordinates.
+        KeypointSequence with 3D coordinates.
     """
     # Check MediaPipe version
     import mediapipe
     if mediapipe.__version__ < '0.8.9':
         logging.error("MediaPipe version >= 0.8.9 required for 3D pose estimation")
-        return []
+        return KeypointSequence.from_frames([])
 
     config = config or {}
     mp_pose = mp.solutions.pose
@@ -34,44 +36,27 @@ def extract_keypoints(video_path, config=None):
     if not cap.isOpened():
         logging.error(f"Cannot open video {video_path}")
         pose.close()
-        return []
+        return KeypointSequence.from_frames([])
     
-    keypoints = []
-    
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-        
-        # Convert to RGB
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = pose.process(frame_rgb)
-        
-        frame_keypoints = {"keypoints": {}}
-        if results.pose_landmarks:
-            for i, lm in enumerate(results.pose_landmarks.landmark):
-                frame_keypoints["keypoints"][f"landmark_{i}"] = {
-                    "x": float(lm.x),
-                    "y": float(lm.y),
-                    "z": float(lm.z),  # Include z-coordinate
-                    "visibility": float(lm.visibility)
-                }
-            logging.info(f"Frame {len(keypoints)}: Extracted 3D keypoints for {len(frame_keypoints['keypoints'])} landmarks")
-        else:
-            logging.warning(f"Frame {len(keypoints)}: No landmarks detected")
-            frame_keypoints["keypoints"] = {}
-        
-        keypoints.append(frame_keypoints)
-    
-    cap.release()
-    pose.close()
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    try:
+        array, mask, _ = run_pose_pipeline(
+            cap,
+            pose,
+            pipelined=config.get("pipelined", True),
+            queue_size=config.get("pipeline_queue_size", 8)
+        )
+    finally:
+        cap.release()
+        pose.close()
+    keypoints = KeypointSequence(array, mask, {"fps": fps})
     
     logging.info(f"Extracted {len(keypoints)} frames of 3D keypoints from {video_path}")
     return keypoints
 
 def adjust_keypoints(keypoints, pitch_angle):
     """
-    Adjust 3D keypoints for pitch angle.
+    Adjust 3D keypoints for pitch angle (image-plane rotation, z unchanged; see core.rotation).
     Args:
         keypoints: Dict of landmarks with x, y, z, visibility.
         pitch_angle: Angle in degrees.
@@ -82,25 +67,8 @@ def adjust_keypoints(keypoints, pitch_angle):
         logging.warning("No keypoints to adjust")
         return keypoints
     
-    adjusted = {}
     try:
-        angle_rad = np.radians(pitch_angle)
-        cos_a = np.cos(angle_rad)
-        sin_a = np.sin(angle_rad)
-        for lm, data in keypoints.items():
-            x, y, z = data.get("x", 0), data.get("y", 0), data.get("z", 0)
-            visibility = data.get("visibility", 0)
-            # Rotate x, y; z remains unchanged
-            x_new = x * cos_a + y * sin_a
-            y_new = -x * sin_a + y * cos_a
-            z_new = z
-            adjusted[lm] = {
-                "x": float(x_new),
-                "y": float(y_new),
-                "z": float(z_new),
-                "visibility": visibility
-            }
-        return adjusted
+        return adjust_landmark_dict(keypoints, pitch_angle, IMAGE_PLANE)
     except Exception as e:
         logging.error(f"Failed to adjust keypoints: {e}")
         return keypoints
@@ -1,25 +1,53 @@
 import mediapipe as mp
 import cv2
 import json
-import numpy as np
 import logging
 import os
 from packaging import version
+from utils.keypoint_store import write_keypoint_store, video_sha256, apply_pitch_correction
+from utils.keypoint_sequence import KeypointSequence
+from utils.pose_pipeline import run_pose_pipeline
+from core.rotation import CAMERA_TILT, adjust_landmark_dict
 
 mp_pose = mp.solutions.pose
 
 logging.basicConfig(level=logging.INFO)
 
-def extract_keypoints(video_path, output_json, pitch_json=None, config=None):
+def create_pose(config=None):
     """
-    Extract 3D MediaPipe keypoints, apply pitch correction, save to JSON.
+    Build the MediaPipe Pose graph used for keypoint extraction.
+    Args:
+        config: Configuration parameters (detection/tracking confidence).
+    Returns:
+        MediaPipe Pose instance.
+    """
+    config = config or {}
+    return mp_pose.Pose(
+        static_image_mode=False,
+        model_complexity=2,
+        min_detection_confidence=config.get("min_detection_confidence", 0.6),
+        min_tracking_confidence=config.get("min_tracking_confidence", 0.6),
+        smooth_landmarks=True
+    )
+
+def extract_keypoints(video_path, output_path, pitch_json=None, config=None, pose=None):
+    """
+    Extract 3D MediaPipe keypoints and save the raw pose output to the binary keypoint store.
+    Pitch correction is never baked into the store; it is applied on load
+    (see utils.keypoint_store.load_video_keypoints), so re-calibrating never
+    requires re-running pose estimation.
     Args:
         video_path: Path to video file.
-        output_json: Path to save keypoint JSON.
-        pitch_json: Path to pitch reference JSON.
-        config: Configuration parameters.
+        output_path: Path to save keypoint store (bowling_analysis_<id>.kps).
+        pitch_json: Optional pitch reference JSON applied to the returned keypoints only.
+        config: Configuration parameters (detection/tracking confidence,
+            pipelined, pipeline_queue_size).
+        pose: Optional warm Pose graph from create_pose(); it is reset before
+            use and left open for the caller.
     Returns:
-        List of keypoint frames with 3D coordinates.
+        KeypointSequence with 3D coordinates (empty if the video cannot be opened).
+    Raises:
+        Exception: Writing the keypoint store failed (logged, then re-raised).
     """
     import mediapipe
     mp_version = mediapipe.__version__
@@ -31,75 +59,64 @@ def extract_keypoints(video_path, output_json, pitch_json=None, config=None):
     min_detection_confidence = config.get("min_detection_confidence", 0.6)
     min_tracking_confidence = config.get("min_tracking_confidence", 0.6)
     
-    pose = mp_pose.Pose(
-        static_image_mode=False,
-        model_complexity=2,
-        min_detection_confidence=min_detection_confidence,
-        min_tracking_confidence=min_tracking_confidence,
-        smooth_landmarks=True
-    )
+    owns_pose = pose is None
+    if owns_pose:
+        pose = create_pose(config)
+    elif hasattr(pose, "reset"):
+        # Drop tracking state carried over from the previous video
+        pose.reset()
     
     cap = cv2.VideoCapture(video_path)
     if not cap.isOpened():
         logging.error(f"Cannot open video {video_path}")
-        pose.close()
-        return []
-    
-    keypoints_full = []
-    
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = pose.process(frame_rgb)
-        
-        frame_keypoints = {"keypoints": {}}
-        if results.pose_landmarks:
-            for i, lm in enumerate(results.pose_landmarks.landmark):
-                frame_keypoints["keypoints"][f"landmark_{i}"] = {
-                    "x": float(lm.x),
-                    "y": float(lm.y),
-                    "z": float(lm.z),
-                    "visibility": float(lm.visibility)
-                }
-            logging.info(f"Frame {len(keypoints_full)}: Extracted 3D keypoints for {len(frame_keypoints['keypoints'])} landmarks")
-        else:
-            logging.warning(f"Frame {len(keypoints_full)}: No landmarks detected")
-            frame_keypoints["keypoints"] = {}
-        
-        keypoints_full.append(frame_keypoints)
+        if owns_pose:
+            pose.close()
+        return KeypointSequence.from_frames([])
     
-    cap.release()
-    pose.close()
-    
-    if pitch_json and os.path.exists(pitch_json):
-        with open(pitch_json, 'r') as f:
-            pitch_data = json.load(f)
-            pitch_angle = pitch_data.get("pitch_angle", 0)
-            if pitch_angle == 0:
-                logging.warning(f"Zero pitch angle in {pitch_json}")
-            else:
-                logging.info(f"Applying pitch correction: {pitch_angle:.2f} degrees")
-                corrected_frames = 0
-                for kp in keypoints_full:
-                    if "keypoints" in kp:
-                        kp["keypoints"] = adjust_keypoints(kp["keypoints"], pitch_angle, config)
-                        corrected_frames += 1
-                logging.info(f"Applied pitch correction to {corrected_frames} frames")
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    try:
+        array, mask, _ = run_pose_pipeline(
+            cap,
+            pose,
+            pipelined=config.get("pipelined", True),
+            queue_size=config.get("pipeline_queue_size", 8)
+        )
+    finally:
+        cap.release()
+        if owns_pose:
+            pose.close()
+    logging.info(f"Extracted {len(array)} frames of 3D keypoints from {video_path} ({int(mask.sum())} with landmarks)")
     
+    extractor = {
+        "name": "utils.keypoints_utils2",
+        "mediapipe_version": mp_version,
+        "model_complexity": 2,
+        "min_detection_confidence": min_detection_confidence,
+        "min_tracking_confidence": min_tracking_confidence,
+        "smooth_landmarks": True,
+    }
     try:
-        with open(output_json, 'w') as f:
-            json.dump(keypoints_full, f, indent=4)
-        logging.info(f"Saved 3D keypoints to {output_json}")
+        write_keypoint_store(output_path, array, mask, fps=fps, video_sha256=video_sha256(video_path), extractor=extractor)
     except Exception as e:
-        logging.error(f"Failed to save keypoints to {output_json}: {e}")
+        # Callers derive pitch references from the stored file, so a missing store is a failure
+        logging.error(f"Failed to save keypoints to {output_path}: {e}")
+        raise
     
-    return keypoints_full
+    keypoints = KeypointSequence(array, mask, {"fps": fps, "extractor": extractor, "pitch_corrected": False})
+    if pitch_json and os.path.exists(pitch_json):
+        with open(pitch_json, 'r') as f:
+            pitch_angle = json.load(f).get("pitch_angle", 0)
+        if pitch_angle == 0:
+            logging.warning(f"Zero pitch angle in {pitch_json}")
+        else:
+            logging.info(f"Applying pitch correction to returned keypoints: {pitch_angle:.2f} degrees")
+        keypoints = apply_pitch_correction(keypoints, pitch_angle)
+    return keypoints
 
 def adjust_keypoints(keypoints, pitch_angle, config=None):
     """
     Rotate 3D keypoints around the X-axis (Y-Z plane) by pitch_angle to correct for camera tilt.
+    Whole sequences should use core.rotation.rotate_keypoints instead.
     Args:
         keypoints: Dict of keypoints with x, y, z, visibility.
         pitch_angle: Angle in degrees (Y-Z plane, vertical tilt).
@@ -107,29 +124,7 @@ def adjust_keypoints(keypoints, pitch_angle, config=None):
     Returns:
         Adjusted keypoints dict.
     """
-    config = config or {}
     if not keypoints:
         return keypoints
     
-    adjusted = {}
-    theta = np.radians(pitch_angle)
-    cos_theta = np.cos(theta)
-    sin_theta = np.sin(theta)
-    
-    for lm_key, lm_data in keypoints.items():
-        x, y, z = lm_data.get("x", 0), lm_data.get("y", 0), lm_data.get("z", 0)
-        visibility = lm_data.get("visibility", 0)
-        
-        # Rotate around X-axis (Y-Z plane)
-        y_new = y * cos_theta - z * sin_theta
-        z_new = y * sin_theta + z * cos_theta
-        x_new = x  # Unchanged
-        
-        adjusted[lm_key] = {
-            "x": float(x_new),
-            "y": float(y_new),
-            "z": float(z_new),
-            "visibility": float(visibility)
-        }
-    
-    return adjusted
+    return adjust_landmark_dict(keypoints, pitch_angle, CAMERA_TILT)
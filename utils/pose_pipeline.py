@@ -0,0 +1,183 @@
+import cv2
+import time
+import queue
+import logging
+import threading
+import numpy as np
+from utils.keypoint_sequence import NUM_LANDMARKS, CHANNELS
+
+logging.basicConfig(level=logging.INFO)
+
+_END = object()
+
+
+class StageStats:
+    """Frame count and busy time (excluding queue waits) for one pipeline stage."""
+
+    def __init__(self, name):
+        self.name = name
+        self.frames = 0
+        self.busy = 0.0
+
+    def add(self, seconds):
+        self.frames += 1
+        self.busy += seconds
+
+    @property
+    def fps(self):
+        return self.frames / self.busy if self.busy > 0 else 0.0
+
+
+class _KeypointBuffer:
+    """Growable (frames, 33, 4) array filled by the serializer stage."""
+
+    def __init__(self, capacity):
+        self.array = np.zeros((max(capacity, 1), NUM_LANDMARKS, len(CHANNELS)), dtype=np.float32)
+        self.mask = np.zeros(max(capacity, 1), dtype=bool)
+        self.count = 0
+
+    def write(self, index, landmarks):
+        if index >= len(self.array):
+            grow = max(len(self.array), index + 1 - len(self.array))
+            self.array = np.concatenate([self.array, np.zeros((grow,) + self.array.shape[1:], dtype=np.float32)])
+            self.mask = np.concatenate([self.mask, np.zeros(grow, dtype=bool)])
+        if landmarks is not None:
+            row = self.array[index]
+            for i, lm in enumerate(landmarks.landmark):
+                row[i, 0] = lm.x
+                row[i, 1] = lm.y
+                row[i, 2] = lm.z
+                row[i, 3] = lm.visibility
+            self.mask[index] = True
+        self.count = max(self.count, index + 1)
+
+
+def _decode(cap, buffers, free, frames_q, stats, stop, errors):
+    """Decoder stage: read BGR frames and convert into pooled RGB buffers."""
+    bgr = None
+    index = 0
+    try:
+        while not stop.is_set():
+            start = time.perf_counter()
+            ret, bgr = cap.read(bgr)
+            if not ret:
+                break
+            slot = free.get()
+            if buffers[slot] is None or buffers[slot].shape != bgr.shape:
+                buffers[slot] = np.empty_like(bgr)
+            cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB, dst=buffers[slot])
+            stats.add(time.perf_counter() - start)
+            frames_q.put((index, slot))
+            index += 1
+    except Exception as e:
+        errors.append(e)
+    finally:
+        frames_q.put(_END)
+
+
+def _serialize(results_q, output, stats, errors):
+    """Serializer stage: copy landmark results into the keypoint array."""
+    while True:
+        item = results_q.get()
+        if item is _END:
+            break
+        if errors:
+            # Keep draining so inference never blocks on a full queue
+            continue
+        start = time.perf_counter()
+        index, landmarks = item
+        try:
+            output.write(index, landmarks)
+        except Exception as e:
+            errors.append(e)
+        stats.add(time.perf_counter() - start)
+
+
+def run_pose_pipeline(cap, pose, pipelined=True, queue_size=8):
+    """
+    Run pose estimation over every frame of an opened video.
+    In pipelined mode decoding/colour conversion and serialization run on
+    their own threads around inference, connected by bounded queues; RGB
+    frames are written into a fixed pool of reused buffers. Inference stays
+    on the calling thread because MediaPipe graphs are not thread-safe.
+    Args:
+        cap: Opened cv2.VideoCapture.
+        pose: MediaPipe Pose instance.
+        pipelined: Overlap decode, inference and serialization.
+        queue_size: Maximum decoded frames waiting for inference.
+    Returns:
+        Tuple of (array, mask, stats): float32 (frames, 33, 4), bool (frames,),
+        and dict of stage name to StageStats.
+    """
+    stats = {name: StageStats(name) for name in ("decode", "inference", "serialize")}
+    output = _KeypointBuffer(int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0))
+    wall_start = time.perf_counter()
+
+    if not pipelined:
+        bgr = None
+        rgb = None
+        index = 0
+        while True:
+            start = time.perf_counter()
+            ret, bgr = cap.read(bgr)
+            if not ret:
+                break
+            rgb = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB, dst=rgb)
+            stats["decode"].add(time.perf_counter() - start)
+            start = time.perf_counter()
+            results = pose.process(rgb)
+            stats["inference"].add(time.perf_counter() - start)
+            start = time.perf_counter()
+            output.write(index, results.pose_landmarks)
+            stats["serialize"].add(time.perf_counter() - start)
+            index += 1
+    else:
+        # One buffer per queued frame, plus the one being converted and the one in inference
+        pool_size = queue_size + 2
+        buffers = [None] * pool_size
+        free = queue.Queue()
+        for slot in range(pool_size):
+            free.put(slot)
+        frames_q = queue.Queue(maxsize=queue_size)
+        results_q = queue.Queue(maxsize=queue_size)
+        stop = threading.Event()
+        errors = []
+
+        decoder = threading.Thread(target=_decode, args=(cap, buffers, free, frames_q, stats["decode"], stop, errors), daemon=True)
+        serializer = threading.Thread(target=_serialize, args=(results_q, output, stats["serialize"], errors), daemon=True)
+        decoder.start()
+        serializer.start()
+        try:
+            while True:
+                item = frames_q.get()
+                if item is _END:
+                    break
+                index, slot = item
+                start = time.perf_counter()
+                results = pose.process(buffers[slot])
+                stats["inference"].add(time.perf_counter() - start)
+                free.put(slot)
+                results_q.put((index, results.pose_landmarks))
+        finally:
+            stop.set()
+            # Unblock the decoder if it is waiting for a free buffer or queue slot
+            while decoder.is_alive():
+                free.put(0)
+                try:
+                    frames_q.get_nowait()
+                except queue.Empty:
+                    pass
+                decoder.join(timeout=0.01)
+            results_q.put(_END)
+            serializer.join()
+        if errors:
+            raise errors[0]
+
+    wall = time.perf_counter() - wall_start
+    frames = output.count
+    logging.info(
+        f"Pose pipeline ({'pipelined' if pipelined else 'serial'}): {frames} frames in {wall:.2f}s "
+        f"({frames / wall if wall > 0 else 0.0:.1f} fps); "
+        + ", ".join(f"{s.name} {s.fps:.1f} fps" for s in stats.values())
+    )
+    return output.array[:frames], output.mask[:frames], stats
@@ -1,7 +1,7 @@
 import numpy as np
 import logging
-import json
 import os
+from utils.keypoint_store import keypoints_file, load_video_keypoints
 
 logging.basicConfig(level=logging.INFO)
 
@@ -9,7 +9,7 @@ def prepare_stride_data(keypoints_dir, assessments, action_type, config=None, pi
     """
     Prepare stride data for StridePredictor training.
     Args:
-        keypoints_dir: Directory with keypoint JSONs.
+        keypoints_dir: Directory with keypoint files.
         assessments: Dict of video assessments.
         action_type: 'fast' or 'spin'.
         config: Configuration parameters.
@@ -24,14 +24,13 @@ def prepare_stride_data(keypoints_dir, assessments, action_type, config=None, pi
     y = []
     
     for video_id, labels in assessments.items():
-        keypoints_path = os.path.join(keypoints_dir, f"bowling_analysis_{video_id}.json")
+        keypoints_path = keypoints_file(keypoints_dir, video_id)
         if not os.path.exists(keypoints_path):
             logging.warning(f"Missing keypoints for {video_id}")
             continue
         
         try:
-            with open(keypoints_path, 'r') as f:
-                keypoints = json.load(f)
+            keypoints = load_video_keypoints(keypoints_dir, video_id, pitch_refs.get(video_id))
         except Exception as e:
             logging.error(f"Failed to load keypoints for {video_id}: {e}")
             continue